@@ -0,0 +1,91 @@
+"""
+任务名称
+name: 大振幅反转策略参数回测
+定时规则
+cron: 1 1 1 1 *
+说明：拉取历史K线（本地CSV缓存，只增量补齐），用向量化回测引擎扫描振幅/止盈/止损/滑点/委托有效期参数。
+用法：python amplitude_reversal_backtest.py [策略名]，策略名见 BACKTEST_PRESETS
+"""
+import os
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from amplitude_backtest import klines_to_ohlc, backtest_amplitude_reversal, sweep_parameters
+from kline_history import load_history
+
+# ============== 可配置参数区域 ==============
+HISTORY_DAYS = 365            # 回测的历史天数
+FEE_RATE = 0.0005             # 单边手续费率（吃单）
+TOP_N = 10                    # 输出收益最高的参数组合数量
+
+# 与线上策略参数保持一致，grid 为扫描范围；线上vine/ada委托无固定有效期，这里按1小时(12根5m)估算
+BACKTEST_PRESETS = {
+    "vine_5m_v2": {
+        "inst_id": "VINE-USDT-SWAP", "bar": "5m",
+        "params": {"amplitude_percent": 0.042, "take_profit_percent": 0.055, "stop_loss_percent": 0.017,
+                   "slippage": 0.005, "slippage_type": "percent", "expiry_bars": 12, "entry_mode": "midpoint"},
+        "grid": {"amplitude_percent": [0.03, 0.035, 0.042, 0.05, 0.06],
+                 "take_profit_percent": [0.03, 0.04, 0.055, 0.07],
+                 "stop_loss_percent": [0.01, 0.017, 0.025, 0.035]},
+    },
+    "ada_5m_v1": {
+        "inst_id": "ADA-USDT-SWAP", "bar": "5m",
+        "params": {"amplitude_percent": 0.021, "take_profit_percent": 0.012, "stop_loss_percent": 0.012,
+                   "slippage": 0.0, "slippage_type": "percent", "expiry_bars": 12, "entry_mode": "close"},
+        "grid": {"amplitude_percent": [0.015, 0.021, 0.03],
+                 "take_profit_percent": [0.008, 0.012, 0.02],
+                 "stop_loss_percent": [0.008, 0.012, 0.02]},
+    },
+    "trump_15m_v2": {
+        "inst_id": "TRUMP-USDT-SWAP", "bar": "15m",
+        "params": {"amplitude_percent": 0.06, "take_profit_percent": 0.048, "stop_loss_percent": 0.027,
+                   "slippage": 0.16, "slippage_type": "absolute", "expiry_bars": 4, "entry_mode": "midpoint"},
+        "grid": {"amplitude_percent": [0.04, 0.05, 0.06, 0.08],
+                 "take_profit_percent": [0.03, 0.048, 0.06],
+                 "stop_loss_percent": [0.015, 0.027, 0.04],
+                 "expiry_bars": [2, 4, 8]},
+    },
+}
+
+# ==========================================
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def format_stats(stats):
+    return (f"交易{stats['trades']}/{stats['signals']}信号 胜率{stats['win_rate']*100:.1f}% "
+            f"累计{stats['total_return']*100:.2f}% 单笔{stats['avg_return']*100:.3f}% "
+            f"盈亏比{stats['profit_factor']:.2f} 最大回撤{stats['max_drawdown']*100:.2f}%")
+
+def run_preset(name):
+    preset = BACKTEST_PRESETS[name]
+    klines = load_history(preset["inst_id"], preset["bar"], HISTORY_DAYS)
+    ohlc = klines_to_ohlc(klines)
+    print(f"[{get_beijing_time()}] [BACKTEST] {name} {preset['inst_id']} {preset['bar']} 共{len(ohlc)}根K线")
+
+    start = time.time()
+    result = backtest_amplitude_reversal(ohlc, fee_rate=FEE_RATE, **preset["params"])
+    print(f"[{get_beijing_time()}] [BACKTEST] 当前参数 ({time.time() - start:.3f}秒): {format_stats(result['stats'])}")
+
+    start = time.time()
+    fixed = {k: v for k, v in preset["params"].items() if k not in preset["grid"]}
+    results = sweep_parameters(ohlc, preset["grid"], fee_rate=FEE_RATE, **fixed)
+    print(f"[{get_beijing_time()}] [BACKTEST] 扫描{len(results)}组参数，耗时{time.time() - start:.3f}秒，前{TOP_N}名:")
+    for params, stats in results[:TOP_N]:
+        grid_params = {k: params[k] for k in preset["grid"]}
+        print(f"  {grid_params} -> {format_stats(stats)}")
+
+def main():
+    names = sys.argv[1:] or list(BACKTEST_PRESETS)
+    for name in names:
+        if name not in BACKTEST_PRESETS:
+            print(f"[{get_beijing_time()}] [ERROR] 未知策略: {name}，可选: {', '.join(BACKTEST_PRESETS)}")
+            continue
+        run_preset(name)
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,8 @@ cron: 1 */5 * * * *
 import os
 import sys
 import math
-import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional
 
 # 添加utils目录
@@ -16,10 +17,14 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 from okx_utils import (
     get_shanghai_time, build_order_params, send_bark_notification
 )
+from kline_cache import get_cached_klines
+from okx_clients import get_trade_api, get_public_api
+from order_batch import OrderBatch
+from order_state import get_order_state
+from rolling_bands import get_bollinger
 
 # 导入OKX API
 import okx.Trade as Trade
-import okx.MarketData as MarketData
 
 # ---------- 配置参数 ----------
 STRATEGY_PARAMS = {                  # 策略核心参数
@@ -33,6 +38,18 @@ STRATEGY_PARAMS = {                  # 策略核心参数
     'pyramiding': 10                 # 最大叠加仓位
 }
 
+SIGNAL_STATE_STRATEGY = "{symbol}-BB"  # 本地订单状态中的策略名（信号防重），按标的区分，如 DOGE-BB
+
+# ---------- 多标的扫描参数 ----------
+# BB_SCAN_MODE=1 时扫描多个永续合约，只对出现信号的标的下单
+SCAN_PARAMS = {
+    'universe': [s.strip() for s in os.getenv("BB_SCAN_INST_IDS", "").split(",") if s.strip()],  # 为空时扫描全部USDT永续
+    'settle_ccy': 'USDT',            # 全量扫描时的结算币种
+    'max_symbols': 200,              # 全量扫描的最大标的数量
+    'max_workers': 16,               # 并发拉取K线的线程数（共享同一HTTP连接池与限速器）
+    'wick_threshold_pct': 0.003,     # 扫描模式的影线阈值 (影线长度/收盘价 >= 0.3%)，标的价格量级不同，不用固定价格单位
+}
+
 # ========================
 # 数据管理模块 (已简化)
 # ========================
@@ -46,50 +63,52 @@ def filter_completed_klines(klines: list) -> list:
 
 def get_kline_data(inst_id: str, bar: str, limit: int, flag: str) -> list:
     """
-    从OKX实时获取K线数据 (使用标记价格)
+    通过K线缓存获取K线数据 (使用标记价格)，已完结K线只增量拉取
     :param inst_id: 交易品种 (如DOGE-USDT-SWAP)
     :param bar: K线周期 (如5m)
     :param limit: 获取数量
     :param flag: 账户类型 (0实盘/1模拟盘)
     :return: 已过滤的完结K线数据列表
     """
-    result = None  # 初始化result
     try:
-        print(f"[DEBUG] 准备初始化 MarketAPI, flag={flag}")
-        market_api = MarketData.MarketAPI(flag=flag)
-        print(f"[DEBUG] MarketAPI 初始化成功, 准备获取K线...")
-        # ⚠️ 使用 get_mark_price_candlesticks 替换旧接口
-        result = market_api.get_mark_price_candlesticks(instId=inst_id, bar=bar, limit=str(limit))
-        print(f"[DEBUG] OKX API 原始返回: {result}") # 打印完整原始返回
+        # ⚠️ 使用标记价格K线 (get_mark_price_candlesticks)
+        klines = get_cached_klines(inst_id, bar, limit, price_type="mark", flag=flag, include_unconfirmed=False)
     except Exception as e:
         import traceback
-        print(f"[ERROR] 调用OKX API时发生异常: {e}")
+        print(f"[ERROR] 获取K线数据时发生异常: {e}")
         print(traceback.format_exc())
         return []
 
-    if result and result.get('code') == '0':
-        completed_klines = filter_completed_klines(result['data'])
-        print(f"[DEBUG] API成功返回 {len(result['data'])} 条K线, 过滤后得到 {len(completed_klines)} 条已完结K线。")
-        return completed_klines
-    
-    # 如果代码不是'0'或result为空
-    err_msg = result.get('msg', '无有效错误信息') if result else 'API无返回'
-    print(f"[ERROR] 获取K线数据失败: {err_msg}")
-    return []
+    if not klines:
+        print(f"[ERROR] 获取K线数据失败")
+        return []
+
+    completed_klines = filter_completed_klines(klines)
+    print(f"[DEBUG] 获取到 {len(klines)} 条K线, 过滤后得到 {len(completed_klines)} 条已完结K线。")
+    return completed_klines
 
 # ========================
 # 核心策略类
 # ========================
 class BollingerStrategy:
-    def __init__(self):
-        self.inst_id = "DOGE-USDT-SWAP"  # 合约ID
+    def __init__(self, inst_id: str = "DOGE-USDT-SWAP", contract_face_value: float = 10,
+                 lot_size: float = 0.01, tick_size: Optional[float] = None, accounts: Optional[List[Dict]] = None,
+                 wick_threshold_pct: Optional[float] = None):
+        self.inst_id = inst_id           # 合约ID
+        self.symbol = inst_id.split('-')[0]  # 币种名，用于通知标题、clOrdId前缀与信号防重
         self.bar = "5m"                 # K线周期
         self.params = STRATEGY_PARAMS    # 策略参数
-        self.accounts = self._get_accounts()  # 加载账户配置
+        self.contract_face_value = contract_face_value  # 合约面值（DOGE-USDT-SWAP为10）
+        self.lot_size = lot_size         # 最小下单单位
+        self.tick_size = tick_size       # 价格精度，None时保留5位小数
+        self.wick_threshold_pct = wick_threshold_pct  # 影线比例阈值，None时按 wick_threshold 价格单位判断
+        self.accounts = accounts if accounts is not None else self._get_accounts()  # 加载账户配置
         self.position_counters = {acc['name']: 0 for acc in self.accounts}  # 初始化仓位计数器
-        self.last_signal_ts = 0          # 上次信号时间戳（防重）
+        self.signal_strategy = SIGNAL_STATE_STRATEGY.format(symbol=self.symbol)
+        self.last_signal_ts = get_order_state().get_signal_ts(self.signal_strategy, inst_id)  # 上次信号时间戳（防重，跨进程持久化）
 
-    def _get_accounts(self) -> List[Dict]:
+    @staticmethod
+    def _get_accounts() -> List[Dict]:
         """从环境变量加载OKX账户配置"""
         accounts = []
         # 账户1配置
@@ -114,13 +133,11 @@ class BollingerStrategy:
 
     def init_trade_api(self, account: Dict) -> Trade.TradeAPI:
         """初始化交易API对象"""
-        # 按照官方示例，使用位置参数以保证兼容性
-        # 参数顺序: api_key, secret_key, passphrase, debug, flag
-        return Trade.TradeAPI(
+        # 按账户复用客户端，共享HTTP连接池
+        return get_trade_api(
             account['api_key'],
             account['secret_key'],
             account['passphrase'],
-            False,  # debug
             account['flag']
         )
 
@@ -128,22 +145,18 @@ class BollingerStrategy:
         """记录带时间戳的日志"""
         timestamp = get_shanghai_time()
         prefix = f"[{account_name}] " if account_name else ""
-        print(f"[{timestamp}] {prefix}{message}")
+        print(f"[{timestamp}] [{self.inst_id}] {prefix}{message}")
 
     # ---------- 策略计算函数 ----------
-    def calculate_bollinger_bands(self, closes: List[float]) -> tuple:
+    def calculate_bollinger_bands(self, kline_data: list) -> tuple:
         """
-        计算布林带上轨、中轨、下轨
-        :param closes: 收盘价列表（最新数据在前）
+        计算布林带上轨、中轨、下轨（滚动窗口，只追加新完结的K线）
+        :param kline_data: K线数据（最新数据在前）
         :return: (上轨, 中轨, 下轨)
         """
-        if len(closes) < self.params['bb_length']:
-            return 0.0, 0.0, 0.0
-            
-        # 使用向量化计算提高性能
-        basis = np.mean(closes[-self.params['bb_length']:])  # 中轨(SMA)
-        dev = np.std(closes[-self.params['bb_length']:]) * self.params['bb_mult']
-        return basis + dev, basis, basis - dev  # (上轨, 中轨, 下轨)
+        bands = get_bollinger(self.inst_id, self.bar, "mark", self.params['bb_length'], self.params['bb_mult'])
+        bands.update_from_klines(kline_data)
+        return bands.bands() or (0.0, 0.0, 0.0)
 
     def adjust_quantity(self, raw_qty: float) -> float:
         """
@@ -151,9 +164,9 @@ class BollingerStrategy:
         :param raw_qty: 原始计算数量
         :return: 调整后的合约张数 (0.01的整数倍)
         """
-        min_lot = 0.01  # 最小交易单位
-        adjusted = math.ceil(raw_qty / min_lot) * min_lot  # 向上取整到最近0.01
-        return round(adjusted, 2)  # 保留两位小数
+        min_lot = self.lot_size  # 最小交易单位
+        adjusted = math.ceil(round(raw_qty / min_lot, 8)) * min_lot  # 向上取整到最小单位的整数倍
+        return round(adjusted, self._decimals(min_lot))
 
     def format_price(self, price: float) -> float:
         """
@@ -161,8 +174,16 @@ class BollingerStrategy:
         :param price: 原始价格
         :return: 格式化后价格
         """
+        if self.tick_size:
+            return round(round(price / self.tick_size) * self.tick_size, self._decimals(self.tick_size))
         return round(price, 5)
 
+    @staticmethod
+    def _decimals(step: float) -> int:
+        """精度步长对应的小数位数，如0.01 -> 2"""
+        text = f"{step:.10f}".rstrip('0')
+        return len(text.split('.')[1]) if '.' in text else 0
+
     def generate_signal(self, kline_data: list) -> Optional[dict]:
         """
         生成交易信号
@@ -184,22 +205,29 @@ class BollingerStrategy:
             return None
             
         # 计算布林带
-        closes = [float(k[4]) for k in kline_data]  # 提取收盘价
-        upper, basis, lower = self.calculate_bollinger_bands(closes)
+        upper, basis, lower = self.calculate_bollinger_bands(kline_data)
         
         # 计算影线与实体
         upper_wick = h - max(o, c)  # 上影线高度
         lower_wick = min(o, c) - l   # 下影线高度
         body = abs(c - o)            # K线实体高度
+        if self.wick_threshold_pct is not None:
+            # 扫描模式：影线按相对收盘价的比例与阈值比较
+            if c <= 0:
+                return None
+            upper_wick, lower_wick = upper_wick / c, lower_wick / c
+            wick_threshold = self.wick_threshold_pct
+        else:
+            wick_threshold = self.params['wick_threshold']
         
         # 信号条件判断
         short_signal = (
-            upper_wick >= self.params['wick_threshold'] and  # 上影线超过阈值
+            upper_wick >= wick_threshold and                # 上影线超过阈值
             h > upper and                                  # 最高价突破上轨
             max(o, c) < upper                              # 收盘价低于上轨
         )
         long_signal = (
-            lower_wick >= self.params['wick_threshold'] and  # 下影线超过阈值
+            lower_wick >= wick_threshold and                # 下影线超过阈值
             l < lower and                                  # 最低价突破下轨
             min(o, c) > lower                               # 收盘价高于下轨
         )
@@ -236,16 +264,16 @@ class BollingerStrategy:
         :return: 调整后的合约张数（0.01的整数倍）
         """
         # 计算公式：合约张数 = (保证金 × 杠杆) / (价格 × 合约面值)
-        # ⚠️ DOGE-USDT-SWAP合约面值 = 10（每张合约代表10 DOGE）
-        contract_face_value = 10
+        # ⚠️ DOGE-USDT-SWAP合约面值 = 10（每张合约代表10 DOGE），扫描模式下取自合约信息
+        contract_face_value = self.contract_face_value
         raw_size = (self.params['order_value'] * self.params['leverage']) / (entry_price * contract_face_value)
         
         # 精度调整
         adjusted_size = self.adjust_quantity(raw_size)
         
         # 检查是否低于最小交易量
-        if adjusted_size < 0.01:
-            self.log(f"计算数量{adjusted_size}小于0.01张，跳过下单", account_name)
+        if adjusted_size < self.lot_size:
+            self.log(f"计算数量{adjusted_size}小于{self.lot_size}张，跳过下单", account_name)
             return 0.0
             
         return adjusted_size
@@ -258,8 +286,13 @@ class BollingerStrategy:
             self.log("信号字典无效或不包含任何交易方向，跳过执行")
             return
             
-        # 更新信号时间戳（防重）
-        self.last_signal_ts = int(signal['timestamp']) // 1000
+        # 更新信号时间戳（防重）：原子占用，同一根K线被其他进程处理过则跳过
+        signal_ts = int(signal['timestamp']) // 1000
+        if not get_order_state().claim_signal(self.signal_strategy, self.inst_id, signal_ts):
+            self.log(f"信号 {signal_ts} 已被其他进程处理，跳过执行")
+            self.last_signal_ts = max(self.last_signal_ts, signal_ts)
+            return
+        self.last_signal_ts = signal_ts
         
         for account in self.accounts:  # 遍历所有账户
             acc_name = account['name']
@@ -269,8 +302,10 @@ class BollingerStrategy:
                     self.log(f"已达最大仓位数({self.params['pyramiding']})，跳过", acc_name)
                     continue
                     
-                # 初始化API
+                # 初始化API，本账户本根K线的多空订单合并为一次批量下单
                 trade_api = self.init_trade_api(account)
+                batch = OrderBatch(trade_api, f"[{self.inst_id}] [{acc_name}]", acc_name)
+                pending = {}  # clOrdId -> (方向, 入场价, 数量, 止盈, 止损)
                 
                 # 处理空单信号
                 if signal['short_signal']:
@@ -278,84 +313,65 @@ class BollingerStrategy:
                     entry = self.format_price(signal['entry_short'])
                     size = self.calculate_position_size(entry, acc_name)
                     if size > 0:
-                        self.place_order(
-                            trade_api,
-                            acc_name,
-                            "sell",  # 方向
-                            "short", # 仓位
-                            entry,
-                            self.format_price(signal['tp_short']),
-                            self.format_price(signal['sl_short']),
-                            size,
-                            account['flag']  # 传递flag
-                        )
+                        tp, sl = self.format_price(signal['tp_short']), self.format_price(signal['sl_short'])
+                        order_params = self.build_order(entry, "sell", "short", tp, sl, size)
+                        pending[batch.add(order_params)] = ("sell", entry, size, tp, sl)
                         
                 # 处理多单信号
                 if signal['long_signal']:
                     entry = self.format_price(signal['entry_long'])
                     size = self.calculate_position_size(entry, acc_name)
                     if size > 0:
-                        self.place_order(
-                            trade_api,
-                            acc_name,
-                            "buy", 
-                            "long",
-                            entry,
-                            self.format_price(signal['tp_long']),
-                            self.format_price(signal['sl_long']),
-                            size,
-                            account['flag']  # 传递flag
-                        )
+                        tp, sl = self.format_price(signal['tp_long']), self.format_price(signal['sl_long'])
+                        order_params = self.build_order(entry, "buy", "long", tp, sl, size)
+                        pending[batch.add(order_params)] = ("buy", entry, size, tp, sl)
+
+                if pending:
+                    self.submit_orders(batch, pending, acc_name, account['flag'])
             except Exception as e:
                 self.log(f"账户处理异常: {str(e)}", acc_name)
 
-    def place_order(
-        self, 
-        api: Trade.TradeAPI, 
-        acc_name: str, 
-        side: str, 
-        pos_side: str, 
-        entry: float, 
-        tp: float, 
-        sl: float,
-        size: float,
-        flag: str
-    ):
-        """
-        ⚠️ 下单执行函数
-        :param size: 已调整的合约张数
-        :param flag: 账户模式 ('0'实盘, '1'模拟盘)
-        """
-        # 构建订单参数
-        order_params = build_order_params(
-            instId=self.inst_id,
+    def build_order(self, entry: float, side: str, pos_side: str, tp: float, sl: float, size: float) -> dict:
+        """构建带止盈止损的限价开仓订单参数"""
+        return build_order_params(
+            inst_id=self.inst_id,
             side=side,
             pos_side=pos_side,
             entry_price=entry,
             size=size,
             take_profit=tp,
             stop_loss=sl,
-            prefix="DOGE-BB"
+            prefix=f"{''.join(ch for ch in self.symbol if ch.isalnum())[:6]}BB"  # clOrdId只允许字母和数字，最长32位
         )
-        
+
+    def submit_orders(self, batch: OrderBatch, pending: Dict[str, tuple], acc_name: str, flag: str):
+        """
+        ⚠️ 下单执行函数：一次请求提交本账户的全部订单，按clOrdId逐笔处理结果
+        :param pending: clOrdId -> (方向, 入场价, 数量, 止盈, 止损)
+        :param flag: 账户模式 ('0'实盘, '1'模拟盘)
+        """
         # 根据flag决定执行方式
-        if flag == '0':  # 实盘模式
-            result = api.place_order(**order_params)
+        if flag != '0':  # 模拟盘模式
+            for side, entry, size, tp, sl in pending.values():
+                self.log(f"[SIM] 忽略下单: {side} {size}张 @ {entry}", acc_name)
+                self.send_notification(acc_name, side, entry, size, tp, sl)  # 模拟盘也发通知
+            return
+
+        results = batch.submit()
+        for cl_ord_id, (side, entry, size, tp, sl) in pending.items():
+            result = results.get(cl_ord_id)
             if result and result.get('code') == '0':
                 self.position_counters[acc_name] += 1  # 更新仓位计数
-                self.log(f"{side}单成功: 数量={size}张 @ {entry}", acc_name)
+                self.log(f"{side}单成功: 数量={size}张 @ {entry} clOrdId={cl_ord_id}", acc_name)
                 self.send_notification(acc_name, side, entry, size, tp, sl)
             else:
                 err = result.get('msg', '未知错误') if result else '无响应'
-                self.log(f"下单失败: {err}", acc_name)
-        else:  # 模拟盘模式
-            self.log(f"[SIM] 忽略下单: {side} {size}张 @ {entry}", acc_name)
-            self.send_notification(acc_name, side, entry, size, tp, sl) # 模拟盘也发通知
+                self.log(f"{side}单下单失败: {err} clOrdId={cl_ord_id}", acc_name)
 
     def send_notification(self, acc_name: str, side: str, price: float, size: float, tp: float, sl: float):
         """发送Bark通知"""
         mode = "实盘" if os.getenv('TRADE_MODE') == 'real' else "模拟"
-        title = f"DOGE {side.upper()}信号触发 ({mode})"
+        title = f"{self.symbol} {side.upper()}信号触发 ({mode})"
         content = f"""账户: {acc_name}
 操作: {'做空' if side=='sell' else '做多'}
 价格: {price:.6f}
@@ -365,11 +381,80 @@ class BollingerStrategy:
 时间: {get_shanghai_time()}"""
         send_bark_notification(title, content)
 
+# ========================
+# 多标的扫描
+# ========================
+_scan_strategies: Dict[str, BollingerStrategy] = {}  # 常驻进程内复用，保留各标的的防重时间戳与仓位计数
+
+def load_swap_universe(flag: str) -> Dict[str, Dict]:
+    """获取扫描的永续合约及其面值/精度"""
+    result = get_public_api(flag).get_instruments(instType="SWAP")
+    if not result or result.get('code') != '0':
+        print(f"[{get_shanghai_time()}] [SCAN] 获取合约列表失败: {result.get('msg', '') if result else '无响应'}")
+        return {}
+    universe = {}
+    for inst in result.get('data', []):
+        inst_id = inst.get('instId')
+        if SCAN_PARAMS['universe']:
+            if inst_id not in SCAN_PARAMS['universe']:
+                continue
+        elif inst.get('settleCcy') != SCAN_PARAMS['settle_ccy'] or inst.get('state') != 'live':
+            continue
+        universe[inst_id] = {
+            'contract_face_value': float(inst.get('ctVal') or 1),
+            'lot_size': float(inst.get('lotSz') or 1),
+            'tick_size': float(inst.get('tickSz') or 0) or None,
+        }
+        if len(universe) >= SCAN_PARAMS['max_symbols']:
+            break
+    return universe
+
+def scan_symbol(strategy: BollingerStrategy, flag: str) -> Optional[dict]:
+    """拉取单个标的的K线（经共享缓存增量获取）并生成信号"""
+    klines = get_kline_data(strategy.inst_id, strategy.bar, strategy.params['bb_length'], flag)
+    if not klines:
+        return None
+    return strategy.generate_signal(klines)
+
+def scan_main():
+    """扫描入口：并发评估全部标的，只对有信号的标的执行交易"""
+    start = time.time()
+    accounts = BollingerStrategy._get_accounts()
+    if not accounts:
+        print(f"[{get_shanghai_time()}] [SCAN] 未配置OKX账户，请设置环境变量")
+        return
+    flag = accounts[0]['flag']
+    universe = load_swap_universe(flag)
+    for inst_id, spec in universe.items():
+        if inst_id not in _scan_strategies:
+            _scan_strategies[inst_id] = BollingerStrategy(inst_id, accounts=accounts,
+                                                         wick_threshold_pct=SCAN_PARAMS['wick_threshold_pct'], **spec)
+    print(f"[{get_shanghai_time()}] [SCAN] 开始扫描{len(universe)}个标的")
+
+    signals = []
+    with ThreadPoolExecutor(max_workers=SCAN_PARAMS['max_workers']) as executor:
+        futures = {executor.submit(scan_symbol, _scan_strategies[inst_id], flag): inst_id for inst_id in universe}
+        for future in as_completed(futures):
+            inst_id = futures[future]
+            try:
+                signal = future.result()
+            except Exception as e:
+                print(f"[{get_shanghai_time()}] [SCAN] {inst_id} 扫描异常: {e}")
+                continue
+            if signal:
+                signals.append((_scan_strategies[inst_id], signal))
+    print(f"[{get_shanghai_time()}] [SCAN] 扫描完成，耗时{time.time() - start:.2f}秒，{len(signals)}个标的出现信号")
+
+    for strategy, signal in signals:
+        strategy.execute_trade(signal)
+
 # ========================
 # 主执行流程
 # ========================
 def main():
     """策略主入口"""
+    if os.getenv("BB_SCAN_MODE") == "1":
+        return scan_main()
     strategy = BollingerStrategy()
     if not strategy.accounts:
         strategy.log("未配置OKX账户，请设置环境变量")
@@ -383,7 +468,7 @@ def main():
     klines = get_kline_data(
         inst_id=strategy.inst_id,
         bar=strategy.bar,
-        limit=100,  # 获取100根K线，确保足够计算
+        limit=strategy.params['bb_length'],  # 布林带窗口所需数量，新K线由缓存增量提供
         flag=active_account['flag']
     )
     
@@ -112,6 +112,7 @@ def main():
         orders = get_orders_pending(trade_api, INST_ID)
         need_skip = False
         if orders:
+            cancel_ids = []
             for order in orders:
                 side_ = order.get('side')
                 pos_side_ = order.get('posSide')
@@ -124,13 +125,15 @@ def main():
                 if side_ == 'buy' and pos_side_ == 'long' and tp_price:
                     if close >= tp_price:
                         print(f"[{get_shanghai_time()}] [INFO] 多单委托止盈已到，撤销委托: {order['ordId']}")
-                        cancel_pending_open_orders(trade_api, INST_ID, order_ids=order['ordId'])
-                        need_skip = True
+                        cancel_ids.append(order['ordId'])
                 if side_ == 'sell' and pos_side_ == 'short' and tp_price:
                     if close <= tp_price:
                         print(f"[{get_shanghai_time()}] [INFO] 空单委托止盈已到，撤销委托: {order['ordId']}")
-                        cancel_pending_open_orders(trade_api, INST_ID, order_ids=order['ordId'])
-                        need_skip = True
+                        cancel_ids.append(order['ordId'])
+            if cancel_ids:
+                # 本账户需要撤销的委托合并为一次批量撤单
+                cancel_pending_open_orders(trade_api, INST_ID, order_ids=cancel_ids)
+                need_skip = True
             # 撤单后不再 continue，直接进入下单逻辑
         if orders and not need_skip:
             print(f"[{get_shanghai_time()}] [INFO] 存在未成交委托，跳过本轮: {account_name}")
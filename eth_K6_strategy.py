@@ -131,14 +131,14 @@ def main():
             if ord_type == 'limit' and side == 'buy' and pos_side == 'long' and tp_px:
                 if latest_close >= tp_px:
                     print(f"[{get_shanghai_time()}] {account_prefix} [INFO] 多单委托止盈已到，撤销委托: {order['ordId']}")
-                    cancel_pending_open_orders(trade_api, INST_ID)
                     cancel_flag = True
             if ord_type == 'limit' and side == 'sell' and pos_side == 'short' and tp_px:
                 if latest_close <= tp_px:
                     print(f"[{get_shanghai_time()}] {account_prefix} [INFO] 空单委托止盈已到，撤销委托: {order['ordId']}")
-                    cancel_pending_open_orders(trade_api, INST_ID)
                     cancel_flag = True
         if cancel_flag:
+            # 任一委托止盈已到时撤销全部开仓委托，合并为一次批量撤单
+            cancel_pending_open_orders(trade_api, INST_ID, account_prefix=account_prefix)
             print(f"[{get_shanghai_time()}] {account_prefix} [INFO] 已撤销委托，重新获取K线与信号，继续尝试开仓")
             if TEST_MODE:
                 klines = FAKE_KLINES_SHORT
@@ -0,0 +1,21 @@
+"""
+任务名称
+name: 交易日志列式压缩
+定时规则
+cron: 10 0 * * *
+说明：把 logs/journal/ 下已结束日期的 JSON Lines 交易日志转换为 Parquet，保存到 logs/journal/parquet/。
+用法：python journal_compact.py [--keep]，--keep 时保留原 .jsonl 文件
+"""
+import os
+import sys
+
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from trade_journal import compact_journal, get_beijing_time
+
+def main():
+    outputs = compact_journal(keep_jsonl="--keep" in sys.argv[1:])
+    print(f"[{get_beijing_time()}] [JOURNAL] 压缩完成，共生成{len(outputs)}个Parquet文件")
+
+if __name__ == "__main__":
+    main()
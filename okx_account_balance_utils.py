@@ -5,12 +5,13 @@ name: OKX 账户资产检查
 cron: 1 17 * * *
 """
 import os
+import sys
 import json
 import time
 from datetime import datetime, timezone, timedelta
-import okx.Account as Account
-import okx.Trade as Trade
-import okx.MarketData as MarketData
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from okx_clients import get_account_api, get_trade_api, get_market_api
 
 # 尝试导入本地配置，如果不存在则使用环境变量
 try:
@@ -76,9 +77,9 @@ def init_api(account_suffix=""):
         passphrase_str = str(passphrase) if passphrase else ""
         flag_str = str(flag) if flag else "0"
         
-        account_api = Account.AccountAPI(api_key_str, secret_key_str, passphrase_str, False, flag_str)
-        trade_api = Trade.TradeAPI(api_key_str, secret_key_str, passphrase_str, False, flag_str)
-        market_api = MarketData.MarketAPI(api_key_str, secret_key_str, passphrase_str, False, flag_str)
+        account_api = get_account_api(api_key_str, secret_key_str, passphrase_str, flag_str)
+        trade_api = get_trade_api(api_key_str, secret_key_str, passphrase_str, flag_str)
+        market_api = get_market_api(api_key_str, secret_key_str, passphrase_str, flag_str)
         print(f"[{get_beijing_time()}] {account_prefix} API初始化成功 - {account_name}")
         return account_api, trade_api, market_api, account_prefix, account_name
     except Exception as err:  # pylint: disable=broad-except
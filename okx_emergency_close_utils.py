@@ -3,24 +3,28 @@
 name: OKX 紧急平仓工具
 定时规则
 cron: 0 0 1 1 0 
+说明：所有账户并发执行：每个账户一次查询全部标的仓位，平仓单合并为一次批量下单，最后确认仓位归零并统计总耗时。
+限价模式(CLOSE_TYPE="limit")按盘口挂可立即成交的限价单，让价不超过设定的价格带，超时未成交的部分撤单后改市价平仓。
 """
 import os
+import sys
 import json
 import time
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-import okx.Account as Account
-import okx.Trade as Trade
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from okx_clients import get_public_api
+from accounts import get_account
+from order_batch import place_orders, cancel_orders
+from retry_policy import call_with_retry
+from strategy_base import generate_clord_id
+from account_fanout import fan_out_accounts
+from latency_metrics import record as record_latency
 from notification_service import notification_service
 
-# 尝试导入本地配置，如果不存在则使用环境变量
-try:
-    from config_local import *
-    print("[INFO] 使用本地配置文件")
-    IS_DEVELOPMENT = True
-except ImportError:
-    print("[INFO] 使用环境变量配置")
-    IS_DEVELOPMENT = False
-
 # ============== 可配置参数区域 ==============
 # 环境变量账户后缀，支持多账号 (如OKX_API_KEY1, OKX_SECRET_KEY1, OKX_PASSPHRASE1)
 ACCOUNT_SUFFIXES = ["", "1", "2", "3"]  # 空字符串代表无后缀的默认账号
@@ -34,12 +38,21 @@ EMERGENCY_INST_IDS = [
     # 可以添加更多需要平仓的交易标的
 ]
 
-# 网络请求重试配置
-MAX_RETRIES = 3  # 最大重试次数
-RETRY_DELAY = 2  # 重试间隔(秒)
+# 平仓方式：market(市价平仓) 或 limit(限价平仓，按盘口挂可立即成交的限价单，超时未成交部分改市价)
+CLOSE_TYPE = "market"  # 流动性差、仓位大的标的建议使用limit，减少市价单滑点
+
+# 限价平仓参数（CLOSE_TYPE = "limit" 时生效）
+LIMIT_PRICE_BAND = 0.005    # 相对盘口最优价最多让出的比例：卖出平仓价=买一×(1-0.5%)，买入平仓价=卖一×(1+0.5%)
+LIMIT_PRICE_BANDS = {       # 按标的单独设置价格带，未设置的使用 LIMIT_PRICE_BAND
+    "VINE-USDT-SWAP": 0.01,
+    "TRUMP-USDT-SWAP": 0.008,
+}
+LIMIT_BOOK_DEPTH = 5        # 读取的盘口档位数
+LIMIT_CLOSE_TIMEOUT = 2     # 限价单等待成交的时间(秒)，之后撤单并市价平掉剩余仓位
 
-# 平仓方式：market(市价平仓) 或 limit(限价平仓)
-CLOSE_TYPE = "market"  # 建议使用市价平仓以确保快速成交
+EMERGENCY_DEADLINE = 15     # 单个账户查询+平仓+确认的最长时间(秒)
+FLAT_CHECK_TIMEOUT = 5      # 平仓单提交后确认仓位归零的最长等待时间(秒)
+FLAT_CHECK_INTERVAL = 0.3   # 确认仓位的查询间隔(秒)
 
 # ==========================================
 
@@ -49,127 +62,254 @@ def get_beijing_time():
     return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
 
 
-def get_env_var(var_name, suffix="", default=None):
-    """获取环境变量或本地配置变量"""
-    if IS_DEVELOPMENT:
-        # 开发环境：从本地配置文件获取
-        try:
-            return globals()[f"{var_name}{suffix}"]
-        except KeyError:
-            return default
+def get_positions(account_api, inst_ids, account_prefix="", deadline=None):
+    """
+    一次请求获取所有永续合约仓位，返回指定交易标的中有持仓的记录
+
+    Returns:
+        list: 活跃仓位；查询失败返回None
+    """
+    result, error_msg = call_with_retry(lambda: account_api.get_positions(instType="SWAP"), "get_positions",
+                                        "POSITION", account_prefix, deadline=deadline)
+    if result and 'code' in result and result['code'] == '0' and 'data' in result:
+        # 过滤出有持仓的记录
+        active_positions = [pos for pos in result['data']
+                            if pos.get('instId') in inst_ids and float(pos.get('pos', '0') or '0') != 0]
+        print(f"[{get_beijing_time()}] {account_prefix} [POSITION] 获取到{len(active_positions)}个活跃仓位")
+        return active_positions
+    print(f"[{get_beijing_time()}] {account_prefix} [POSITION] 获取仓位失败: {error_msg}")
+    return None
+
+
+def build_close_params(inst_id, position, account_prefix="", price=None):
+    """
+    构建单个仓位的平仓单参数，给定 price 时为限价单，否则为市价单
+
+    Returns:
+        tuple: (平仓参数或None, 说明)
+    """
+    # 获取仓位信息
+    pos_side = position.get('posSide', '')  # long 或 short
+    pos_size = float(position.get('pos', '0') or '0')  # 持仓数量
+
+    if pos_size == 0:
+        print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 仓位数量为0，跳过")
+        return None, "仓位数量为0"
+
+    # 确定平仓方向
+    if pos_side == 'long':
+        # 多头仓位需要卖出平仓
+        side = 'sell'
+    elif pos_side == 'short':
+        # 空头仓位需要买入平仓
+        side = 'buy'
+    else:
+        print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} 仓位方向不明确: {pos_side}")
+        return None, "仓位方向不明确"
+
+    # 构建平仓参数
+    close_params = {
+        "instId": inst_id,
+        "tdMode": position.get('mgnMode') or "cross",
+        "side": side,
+        "posSide": pos_side,
+        "sz": str(position.get('pos'))
+    }
+
+    if price:
+        close_params["ordType"] = "limit"
+        close_params["px"] = price
+        print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] 限价平仓 {inst_id} {pos_side} {pos_size} 价格{price}")
     else:
-        # 生产环境：从环境变量获取
-        return os.getenv(f"{var_name}{suffix}", default)
+        close_params["ordType"] = "market"
+        print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] 市价平仓 {inst_id} {pos_side} {pos_size}")
+
+    # 带clOrdId提交，超时后按clOrdId核对，不会重复平仓
+    close_params["clOrdId"] = generate_clord_id("CLOSE")
+    return close_params, ""
+
 
+def close_positions(trade_api, positions, account_prefix="", deadline=None, prices=None):
+    """
+    同一账户的所有仓位合并为一次批量下单平仓
 
-def get_positions(account_api, inst_id, account_prefix=""):
-    """获取指定交易标的的所有仓位"""
-    for attempt in range(MAX_RETRIES + 1):
+    Args:
+        prices: (instId, posSide) -> 限价，不在其中的仓位市价平仓
+
+    Returns:
+        list: 与 positions 一一对应的 (是否成功, 说明, ordId)
+    """
+    prices = prices or {}
+    params = []
+    outcomes = []
+    for position in positions:
+        inst_id = position.get('instId')
         try:
-            result = account_api.get_positions(instId=inst_id)
-            
-            if result and 'code' in result and result['code'] == '0' and 'data' in result:
-                positions = result['data']
-                # 过滤出有持仓的记录
-                active_positions = [pos for pos in positions if float(pos.get('pos', '0') or '0') != 0]
-                print(f"[{get_beijing_time()}] {account_prefix} [POSITION] {inst_id} 获取到{len(active_positions)}个活跃仓位")
-                return active_positions
-            else:
-                error_msg = result.get('msg', '') if result else '无响应'
-                print(f"[{get_beijing_time()}] {account_prefix} [POSITION] 获取{inst_id}仓位失败: {error_msg}")
+            close_params, msg = build_close_params(inst_id, position, account_prefix,
+                                                   prices.get((inst_id, position.get('posSide', ''))))
         except Exception as e:
-            print(f"[{get_beijing_time()}] {account_prefix} [POSITION] 获取{inst_id}仓位异常 (尝试 {attempt+1}/{MAX_RETRIES+1}): {str(e)}")
-            
-        if attempt < MAX_RETRIES:
-            print(f"[{get_beijing_time()}] {account_prefix} [POSITION] 重试中... ({attempt+1}/{MAX_RETRIES})")
-            time.sleep(RETRY_DELAY)
-    
-    print(f"[{get_beijing_time()}] {account_prefix} [POSITION] 获取{inst_id}仓位失败")
-    return []
+            close_params, msg = None, f"平仓异常: {str(e)}"
+        params.append(close_params)
+        outcomes.append((msg == "仓位数量为0", msg, None))
+    orders = [p for p in params if p]
+    results = place_orders(trade_api, orders, account_prefix, deadline) if orders else {}
+    for i, close_params in enumerate(params):
+        if close_params is None:
+            continue
+        inst_id, pos_side = close_params["instId"], close_params["posSide"]
+        result = results.get(close_params["clOrdId"], {})
+        if result.get('code') == '0':
+            print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 平仓成功")
+            outcomes[i] = (True, "平仓成功", (result.get('data') or [{}])[0].get('ordId'))
+        else:
+            print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 平仓失败: {result.get('msg', '')}")
+            outcomes[i] = (False, f"平仓失败: {result.get('msg', '')}" if result.get('msg') else "平仓失败", None)
+    return outcomes
 
 
-def close_position(trade_api, inst_id, position, account_prefix=""):
-    """平仓单个仓位"""
-    try:
-        # 获取仓位信息
-        pos_side = position.get('posSide', '')  # long 或 short
-        pos_size = float(position.get('pos', '0') or '0')  # 持仓数量
-        
-        if pos_size == 0:
-            print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 仓位数量为0，跳过")
-            return True, "仓位数量为0"
-        
-        # 确定平仓方向
-        if pos_side == 'long':
-            # 多头仓位需要卖出平仓
-            side = 'sell'
-        elif pos_side == 'short':
-            # 空头仓位需要买入平仓
-            side = 'buy'
-        else:
-            print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} 仓位方向不明确: {pos_side}")
-            return False, "仓位方向不明确"
-        
-        # 构建平仓参数
-        close_params = {
-            "instId": inst_id,
-            "tdMode": "cross",
-            "side": side,
-            "posSide": pos_side,
-            "sz": str(pos_size)
-        }
-        
-        # 根据平仓方式设置参数
-        if CLOSE_TYPE == "market":
-            close_params["ordType"] = "market"
-            print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] 市价平仓 {inst_id} {pos_side} {pos_size}")
-        else:
-            # 限价平仓需要获取当前价格
-            close_params["ordType"] = "limit"
-            # 这里可以添加获取当前价格的逻辑，暂时使用市价
-            close_params["ordType"] = "market"
-            print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] 限价平仓 {inst_id} {pos_side} {pos_size}")
-        
-        # 执行平仓
-        for attempt in range(MAX_RETRIES + 1):
-            try:
-                result = trade_api.place_order(**close_params)
-                
-                if result and 'code' in result and result['code'] == '0':
-                    print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 平仓成功")
-                    return True, "平仓成功"
-                else:
-                    error_msg = result.get('msg', '') if result else '无响应'
-                    print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 平仓失败: {error_msg}")
-            except Exception as e:
-                print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 平仓异常 (尝试 {attempt+1}/{MAX_RETRIES+1}): {str(e)}")
-                
-            if attempt < MAX_RETRIES:
-                print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] 重试中... ({attempt+1}/{MAX_RETRIES})")
-                time.sleep(RETRY_DELAY)
-        
-        print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] {inst_id} {pos_side} 平仓失败")
-        return False, "平仓失败"
-        
-    except Exception as e:
-        print(f"[{get_beijing_time()}] {account_prefix} [CLOSE] 平仓{inst_id}时异常: {str(e)}")
-        return False, f"平仓异常: {str(e)}"
+_tick_sizes = {}  # instId -> tickSz，价格精度基本不变，进程内缓存
 
 
-def process_account_emergency_close(account_suffix):
-    """处理单个账户的紧急平仓"""
-    # 准备账户标识
-    suffix_str = account_suffix if account_suffix else ""  # 空后缀对应默认账户
-    prefix = "[ACCOUNT-" + suffix_str + "]" if suffix_str else "[ACCOUNT]"
-    
-    # 从环境变量获取账户信息
-    api_key = get_env_var("OKX_API_KEY", suffix=suffix_str)
-    secret_key = get_env_var("OKX_SECRET_KEY", suffix=suffix_str)
-    passphrase = get_env_var("OKX_PASSPHRASE", suffix=suffix_str)
-    flag = get_env_var("OKX_FLAG", suffix=suffix_str, default="0")  # 默认实盘
-    account_name = get_env_var("OKX_ACCOUNT_NAME", suffix=suffix_str) or f"账户{suffix_str}" if suffix_str else "默认账户"
+def get_tick_size(public_api, inst_id, account_prefix="", deadline=None):
+    """获取合约价格精度，失败返回None"""
+    if inst_id not in _tick_sizes:
+        result, error_msg = call_with_retry(lambda: public_api.get_instruments(instType="SWAP", instId=inst_id),
+                                            "get_instruments", "LIMIT_CLOSE", account_prefix, deadline=deadline)
+        if not (result and result.get('code') == '0' and result.get('data')):
+            print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] 获取{inst_id}价格精度失败: {error_msg}")
+            return None
+        _tick_sizes[inst_id] = result['data'][0].get('tickSz')
+    return _tick_sizes[inst_id]
+
+
+def get_order_book(market_api, inst_id, account_prefix="", deadline=None):
+    """获取盘口前 LIMIT_BOOK_DEPTH 档，失败返回None"""
+    result, error_msg = call_with_retry(lambda: market_api.get_orderbook(instId=inst_id, sz=str(LIMIT_BOOK_DEPTH)),
+                                        "get_orderbook", "LIMIT_CLOSE", account_prefix, deadline=deadline)
+    if result and result.get('code') == '0' and result.get('data'):
+        return result['data'][0]
+    print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] 获取{inst_id}盘口失败: {error_msg}")
+    return None
+
+
+def marketable_limit_price(book, side, tick_sz, band):
+    """
+    可立即成交的限价：卖出平仓挂 买一×(1-band)，买入平仓挂 卖一×(1+band)，按 tickSz 向价格带内取整。
+    限价单按盘口实际价格逐档成交，band 只限定最差成交价
+
+    Returns:
+        tuple: (价格字符串, 价格带内的盘口数量)；盘口为空返回 (None, 0)
+    """
+    levels = book.get('bids' if side == 'sell' else 'asks') or []
+    if not levels:
+        return None, 0
+    best = Decimal(levels[0][0])
+    tick = Decimal(str(tick_sz))
+    if side == 'sell':
+        px = (best * (1 - Decimal(str(band))) / tick).to_integral_value(rounding=ROUND_CEILING) * tick
+        depth = sum(float(level[1]) for level in levels if Decimal(level[0]) >= px)
+    else:
+        px = (best * (1 + Decimal(str(band))) / tick).to_integral_value(rounding=ROUND_FLOOR) * tick
+        depth = sum(float(level[1]) for level in levels if Decimal(level[0]) <= px)
+    return str(px), depth
+
+
+def get_limit_close_prices(market_api, public_api, positions, account_prefix="", deadline=None):
+    """
+    各标的并发读取盘口与价格精度，计算每个仓位的限价平仓价
+
+    Returns:
+        dict: (instId, posSide) -> 限价；取不到盘口的仓位不在其中（改用市价）
+    """
+    inst_ids = sorted({p.get('instId') for p in positions})
+    if not inst_ids:
+        return {}
+
+    def load(inst_id):
+        return (get_order_book(market_api, inst_id, account_prefix, deadline),
+                get_tick_size(public_api, inst_id, account_prefix, deadline))
+
+    with ThreadPoolExecutor(max_workers=len(inst_ids)) as executor:
+        books = dict(zip(inst_ids, executor.map(load, inst_ids)))
+    prices = {}
+    for position in positions:
+        inst_id, pos_side = position.get('instId'), position.get('posSide', '')
+        book, tick_sz = books[inst_id]
+        if not book or not tick_sz:
+            print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] {inst_id} {pos_side} 无法计算限价，改用市价平仓")
+            continue
+        band = LIMIT_PRICE_BANDS.get(inst_id, LIMIT_PRICE_BAND)
+        px, depth = marketable_limit_price(book, 'sell' if pos_side == 'long' else 'buy', tick_sz, band)
+        if px is None:
+            print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] {inst_id} 盘口为空，改用市价平仓")
+            continue
+        size = abs(float(position.get('pos', '0') or '0'))
+        if depth < size:
+            print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] {inst_id} {pos_side} 价格带{band * 100:.2f}%内"
+                  f"盘口数量{depth}不足仓位{size}，未成交部分{LIMIT_CLOSE_TIMEOUT}秒后改市价平仓")
+        prices[(inst_id, pos_side)] = px
+    return prices
+
+
+def limit_close_positions(trade_api, account_api, market_api, public_api, positions, account_prefix="", deadline=None):
+    """
+    限价平仓：所有仓位按盘口一次批量挂限价单，LIMIT_CLOSE_TIMEOUT 秒内未全部成交时，
+    撤销剩余限价单，重新查询仓位并批量市价平掉剩余部分
+
+    Returns:
+        list: 与 positions 一一对应的 (是否成功, 说明)
+    """
+    prices = get_limit_close_prices(market_api, public_api, positions, account_prefix, deadline)
+    outcomes = close_positions(trade_api, positions, account_prefix, deadline, prices)
+    if wait_flat(account_api, EMERGENCY_INST_IDS, account_prefix, deadline, timeout=LIMIT_CLOSE_TIMEOUT):
+        print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] 限价平仓已全部成交")
+        return [(True, "限价平仓成交") for _ in positions]
+
+    # 撤销未成交的限价单（已成交的撤单失败可忽略），各标的并发撤单
+    ord_ids = defaultdict(list)
+    for position, (ok, _, ord_id) in zip(positions, outcomes):
+        if ok and ord_id:
+            ord_ids[position.get('instId')].append(ord_id)
+    if ord_ids:
+        with ThreadPoolExecutor(max_workers=len(ord_ids)) as executor:
+            list(executor.map(lambda inst_id: cancel_orders(trade_api, inst_id, ord_ids[inst_id], account_prefix, deadline),
+                              ord_ids))
+
+    # 撤单完成后仓位不再变化，剩余部分市价平仓
+    remaining = get_positions(account_api, EMERGENCY_INST_IDS, account_prefix, deadline)
+    if remaining is None:
+        print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] [ERROR] 查询剩余仓位失败，无法改市价平仓")
+        return [(ok, msg) for ok, msg, _ in outcomes]
+    print(f"[{get_beijing_time()}] {account_prefix} [LIMIT_CLOSE] 限价单{LIMIT_CLOSE_TIMEOUT}秒内未全部成交，"
+          f"剩余{len(remaining)}个仓位改市价平仓")
+    market_outcomes = close_positions(trade_api, remaining, account_prefix, deadline) if remaining else []
+    by_key = {(p.get('instId'), p.get('posSide', '')): (ok, f"限价未全部成交，剩余{msg}")
+              for p, (ok, msg, _) in zip(remaining, market_outcomes)}
+    return [by_key.get((p.get('instId'), p.get('posSide', '')), (True, "限价平仓成交")) for p in positions]
+
+
+def wait_flat(account_api, inst_ids, account_prefix="", deadline=None, timeout=FLAT_CHECK_TIMEOUT):
+    """平仓单提交后轮询仓位，全部归零返回True"""
+    timeout_at = time.time() + timeout
+    if deadline is not None:
+        timeout_at = min(timeout_at, deadline)
+    while True:
+        positions = get_positions(account_api, inst_ids, account_prefix, deadline=timeout_at)
+        if positions == []:
+            return True
+        if time.time() + FLAT_CHECK_INTERVAL >= timeout_at:
+            return False
+        time.sleep(FLAT_CHECK_INTERVAL)
+
+
+def process_account_emergency_close(account_suffix, deadline=None):
+    """处理单个账户的紧急平仓：查询仓位 -> 批量平仓 -> 确认仓位归零"""
+    start_time = time.time()
+    # 账户配置统一由账户注册表读取（空后缀对应默认账户）
+    account = get_account(account_suffix or "")
+    prefix, account_name = account.prefix, account.name
     
-    if not all([api_key, secret_key, passphrase]):
+    if not account.configured:
         print(f"[{get_beijing_time()}] {prefix} [ERROR] 账户信息不完整或未配置")
         return {
             "account_name": account_name,
@@ -181,14 +321,8 @@ def process_account_emergency_close(account_suffix):
     
     # 初始化API
     try:
-        # 确保所有参数都是字符串类型
-        api_key_str = str(api_key) if api_key else ""
-        secret_key_str = str(secret_key) if secret_key else ""
-        passphrase_str = str(passphrase) if passphrase else ""
-        flag_str = str(flag) if flag else "0"
-        
-        account_api = Account.AccountAPI(api_key_str, secret_key_str, passphrase_str, False, flag_str)
-        trade_api = Trade.TradeAPI(api_key_str, secret_key_str, passphrase_str, False, flag_str)
+        account_api = account.account_api()
+        trade_api = account.trade_api()
         print(f"[{get_beijing_time()}] {prefix} API初始化成功 - {account_name}")
     except Exception as e:
         error_msg = f"API初始化失败: {str(e)}"
@@ -201,77 +335,94 @@ def process_account_emergency_close(account_suffix):
             "total_positions": 0
         }
     
-    # 统计信息
-    total_positions = 0
+    # 一次查询所有需要平仓的交易标的的仓位
+    positions = get_positions(account_api, EMERGENCY_INST_IDS, prefix, deadline)
+    if positions is None:
+        return {
+            "account_name": account_name,
+            "success": False,
+            "error": "获取仓位失败",
+            "closed_count": 0,
+            "total_positions": 0
+        }
+    if not positions:
+        print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] 无持仓")
+    
+    # 所有仓位合并为一次批量平仓
+    if not positions:
+        outcomes = []
+    elif CLOSE_TYPE == "limit":
+        outcomes = limit_close_positions(trade_api, account_api, account.market_api(), get_public_api(account.flag),
+                                         positions, prefix, deadline)
+    else:
+        outcomes = [(ok, msg) for ok, msg, _ in close_positions(trade_api, positions, prefix, deadline)]
+    submit_elapsed = time.time() - start_time
+    print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] {len(positions)}个仓位平仓单已提交，耗时{submit_elapsed:.3f}秒")
+    
+    # 确认仓位归零
+    flat = wait_flat(account_api, EMERGENCY_INST_IDS, prefix, deadline) if positions else True
+    flat_elapsed = time.time() - start_time
+    if flat:
+        record_latency("emergency_time_to_flat", flat_elapsed, account=account_name)
+        print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] 已确认全部平仓，耗时{flat_elapsed:.3f}秒")
+    else:
+        print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] [ERROR] 开始后{flat_elapsed:.3f}秒内未确认全部平仓，请人工检查")
+    
+    # 统计与通知（通知在后台队列发送，不影响平仓速度）
     closed_positions = []
     closed_count = 0
-    
-    # 遍历所有需要平仓的交易标的
-    for inst_id in EMERGENCY_INST_IDS:
-        print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] 开始检查 {inst_id} 仓位")
-        
-        # 获取仓位
-        positions = get_positions(account_api, inst_id, prefix)
-        if not positions:
-            print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] {inst_id} 无持仓")
-            continue
-        
-        total_positions += len(positions)
+    for position, (success, close_msg) in zip(positions, outcomes):
+        inst_id = position.get('instId')
+        pos_side = position.get('posSide', '')
+        pos_size = float(position.get('pos', '0') or '0')
+        avg_px = float(position.get('avgPx', '0') or '0')
+        upl = float(position.get('upl', '0') or '0')
         
-        # 平仓每个仓位
-        for position in positions:
-            pos_side = position.get('posSide', '')
-            pos_size = float(position.get('pos', '0') or '0')
-            avg_px = float(position.get('avgPx', '0') or '0')
-            upl = float(position.get('upl', '0') or '0')
+        if success:
+            closed_count += 1
+            closed_positions.append({
+                "inst_id": inst_id,
+                "pos_side": pos_side,
+                "pos_size": pos_size,
+                "avg_price": avg_px,
+                "pnl": upl,
+                "close_msg": close_msg
+            })
             
-            print(f"[{get_beijing_time()}] {prefix} [EMERGENCY] 准备平仓: {inst_id} {pos_side} {pos_size} @ {avg_px:.4f} PnL: {upl:.2f}")
-            
-            # 执行平仓
-            success, close_msg = close_position(trade_api, inst_id, position, prefix)
+            # 发送平仓通知
+            notification_service.send_bark_notification(
+                f"{prefix} 紧急平仓成功",
+                f"标的: {inst_id}\n"
+                f"方向: {pos_side}\n"
+                f"数量: {pos_size}\n"
+                f"均价: {avg_px:.4f}\n"
+                f"盈亏: {upl:.2f} USDT\n"
+                f"平仓方式: {CLOSE_TYPE}",
+                group="OKX紧急平仓通知"
+            )
+        else:
+            print(f"[{get_beijing_time()}] {prefix} [ERROR] {inst_id} {pos_side} 平仓失败: {close_msg}")
             
-            if success:
-                closed_count += 1
-                closed_positions.append({
-                    "inst_id": inst_id,
-                    "pos_side": pos_side,
-                    "pos_size": pos_size,
-                    "avg_price": avg_px,
-                    "pnl": upl,
-                    "close_msg": close_msg
-                })
-                
-                # 发送平仓通知
-                notification_service.send_bark_notification(
-                    f"{prefix} 紧急平仓成功",
-                    f"标的: {inst_id}\n"
-                    f"方向: {pos_side}\n"
-                    f"数量: {pos_size}\n"
-                    f"均价: {avg_px:.4f}\n"
-                    f"盈亏: {upl:.2f} USDT\n"
-                    f"平仓方式: {CLOSE_TYPE}",
-                    group="OKX紧急平仓通知"
-                )
-            else:
-                print(f"[{get_beijing_time()}] {prefix} [ERROR] {inst_id} {pos_side} 平仓失败: {close_msg}")
-                
-                # 发送失败通知
-                notification_service.send_bark_notification(
-                    f"{prefix} 紧急平仓失败",
-                    f"标的: {inst_id}\n"
-                    f"方向: {pos_side}\n"
-                    f"数量: {pos_size}\n"
-                    f"错误: {close_msg}",
-                    group="OKX紧急平仓通知"
-                )
+            # 发送失败通知
+            notification_service.send_bark_notification(
+                f"{prefix} 紧急平仓失败",
+                f"标的: {inst_id}\n"
+                f"方向: {pos_side}\n"
+                f"数量: {pos_size}\n"
+                f"错误: {close_msg}",
+                group="OKX紧急平仓通知"
+            )
     
     return {
         "account_name": account_name,
         "success": True,
-        "error": None,
+        "error": None if flat else "未确认全部平仓",
         "closed_count": closed_count,
-        "total_positions": total_positions,
-        "closed_positions": closed_positions
+        "total_positions": len(positions),
+        "closed_positions": closed_positions,
+        "flat": flat,
+        "submit_elapsed": submit_elapsed,
+        "flat_elapsed": flat_elapsed
     }
 
 
@@ -311,6 +462,9 @@ if __name__ == "__main__":
     print(f"[{get_beijing_time()}] [EMERGENCY] 🚨 开始OKX紧急平仓操作")
     print(f"[{get_beijing_time()}] [EMERGENCY] 平仓标的: {', '.join(EMERGENCY_INST_IDS)}")
     print(f"[{get_beijing_time()}] [EMERGENCY] 平仓方式: {CLOSE_TYPE}")
+    if CLOSE_TYPE == "limit":
+        print(f"[{get_beijing_time()}] [EMERGENCY] 限价价格带: {LIMIT_PRICE_BAND * 100:.2f}%"
+              f"（单独设置: {LIMIT_PRICE_BANDS}），{LIMIT_CLOSE_TIMEOUT}秒未成交改市价")
     
     # 确认操作
     print(f"[{get_beijing_time()}] [EMERGENCY] ⚠️  警告：即将对所有指定标的进行紧急平仓！")
@@ -325,10 +479,19 @@ if __name__ == "__main__":
     start_time = time.time()
     results = []
     
-    # 处理所有账户
+    # 所有账户并发执行，最后一个账户不再等前面的账户平完
+    report = fan_out_accounts(process_account_emergency_close, ACCOUNT_SUFFIXES, deadline=EMERGENCY_DEADLINE,
+                              label="EMERGENCY")
     for suffix in ACCOUNT_SUFFIXES:
-        print(f"\n[{get_beijing_time()}] [EMERGENCY] 开始处理账户: {suffix if suffix else '默认'}")
-        result = process_account_emergency_close(suffix)
+        result = report[suffix]["result"]
+        if result is None:
+            result = {
+                "account_name": f"账户{suffix}" if suffix else "默认账户",
+                "success": False,
+                "error": "处理超时" if report[suffix]["status"] == "timeout" else "处理异常",
+                "closed_count": 0,
+                "total_positions": 0
+            }
         results.append(result)
     
     # 计算总耗时
@@ -345,6 +508,15 @@ if __name__ == "__main__":
     print(f"[{get_beijing_time()}] [EMERGENCY_SUMMARY] 总检查仓位数: {total_positions}")
     print(f"[{get_beijing_time()}] [EMERGENCY_SUMMARY] 总平仓数量: {total_closed}")
     
+    # total_time 即从开始到所有账户确认平仓的总耗时
+    not_flat = [r['account_name'] for r in results if r['success'] and not r.get('flat', True)] + \
+               [r['account_name'] for r in results if not r['success'] and r['error'] != "账户信息不完整"]
+    if not_flat:
+        print(f"[{get_beijing_time()}] [EMERGENCY_SUMMARY] ⚠️  未确认平仓的账户: {', '.join(not_flat)}")
+    else:
+        record_latency("emergency_time_to_flat", total_time, account="ALL")
+        print(f"[{get_beijing_time()}] [EMERGENCY_SUMMARY] 全部账户已确认平仓，总耗时{total_time:.3f}秒")
+    
     # 发送摘要通知
     send_emergency_summary_notification(results)
     
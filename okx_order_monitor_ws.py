@@ -0,0 +1,240 @@
+"""
+任务名称
+name: OKX 委托订单常驻监控(WebSocket)
+定时规则
+cron: 1 1 1 1 *
+说明：常驻进程，启动一次即可。订阅各账户私有 orders 频道与监控标的 tickers 频道，在内存中维护未成交开仓单及其止盈价，
+最新价越过止盈价时立即撤单，替代 okx_order_monitor_utils.py 每10分钟一次的轮询（账户与标的配置沿用该脚本）。
+orders 频道推送的每笔成交同时记为交易日志的 fill 事件。
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from okx_order_monitor_utils import ACCOUNT_SUFFIXES, MONITOR_INST_IDS
+from accounts import get_accounts, ENV_STYLE_SUFFIX
+from ws_market_data import MarketDataFeed, set_active_feed
+from ws_orders import OrderFeed
+from live_order_book import LiveOrderBook
+from strategy_base import get_pending_orders, PRICE_TOLERANCE
+from order_batch import cancel_order_results
+from retry_policy import classify
+from notification_service import notification_service
+from latency_metrics import record as record_latency, dump_metrics, start_metrics_server
+from trade_journal import get_journal
+
+# ============== 可配置参数区域 ==============
+MARKET_FLAG = os.getenv("OKX_FLAG", "0")   # 行情使用的环境 (0实盘/1模拟盘)
+RESYNC_INTERVAL = 300                      # 定期用REST快照校正内存订单簿的间隔(秒)
+CANCEL_WORKERS = 8                         # 撤单/快照线程数
+CANCEL_RETRY_BASE = 1                      # 撤单失败后重新参与判断前的等待(秒)，连续失败按2的幂增长
+CANCEL_RETRY_MAX = 60                      # 撤单失败重试等待上限(秒)
+METRICS_PORT = os.getenv("METRICS_PORT")   # 设置后在该端口提供 /metrics（Prometheus文本格式）
+FILL_JOURNAL = "order_fills"               # 成交事件默认写入的交易日志
+FILL_JOURNALS = {                          # clOrdId前缀 -> 下单策略的交易日志，成交与该策略的下单记录写在一起
+    "VINE": "vine_5m_reversal",
+}
+
+# ==========================================
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def fill_journal(cl_ord_id):
+    """clOrdId 为 前缀+14位时间+6位随机串，按前缀找到下单策略的交易日志"""
+    prefix = cl_ord_id[:-20] if len(cl_ord_id) > 20 and cl_ord_id[-20:-6].isdigit() else ""
+    return get_journal(FILL_JOURNALS.get(prefix, FILL_JOURNAL))
+
+def is_final_cancel_error(code):
+    """交易所明确拒绝撤单（订单已完结/撤销中、权限不足等业务错误），立即重试不会成功"""
+    return code not in ("", "-1") and classify({"code": code}) == "business"
+
+
+class OrderMonitor:
+    """orders 推送维护订单簿，tickers 推送触发撤单判断；撤单与REST快照在线程池中执行，不阻塞推送处理"""
+
+    def __init__(self, accounts, inst_ids, market_feed=None, price_tolerance=PRICE_TOLERANCE):
+        self.accounts = {a.name: a for a in accounts}
+        self.inst_ids = list(inst_ids)
+        self.book = LiveOrderBook(price_tolerance)
+        self.market_feed = market_feed or MarketDataFeed(flag=MARKET_FLAG)
+        self.order_feeds = []
+        self.executor = ThreadPoolExecutor(max_workers=CANCEL_WORKERS)
+        self.canceled_count = 0
+        self._cancel_retry = {}                 # (account, ordId) -> (LiveOrder, 重新参与判断的时间)
+        self._cancel_failures = defaultdict(int)  # (account, ordId) -> 连续撤单失败次数
+        self._retry_lock = threading.Lock()
+
+    # ---------- 订单簿维护 ----------
+    def snapshot(self, account):
+        """REST拉取该账户各标的的未成交订单，校正订单簿"""
+        trade_api = account.trade_api()
+        for inst_id in self.inst_ids:
+            snapshot_ms = int(time.time() * 1000)
+            orders = get_pending_orders(trade_api, inst_id, account.prefix)
+            self.book.replace(account.name, inst_id, orders, snapshot_ms)
+        print(f"[{get_beijing_time()}] {account.prefix} [MONITOR] 订单簿已同步，监控中的订单{len(self.book.orders(account=account.name))}个")
+
+    async def on_connected(self, account):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.snapshot, account)
+
+    def on_order(self, account, order):
+        if order.get("instId") not in self.inst_ids:
+            return
+        if float(order.get("fillSz") or 0) > 0:
+            # 每条成交推送的 fillSz/fillPx 为本次成交，写日志在线程池中进行，不阻塞推送处理
+            self.executor.submit(self.record_fill, account, order)
+        live = self.book.apply(account.name, order)
+        if live is None:
+            with self._retry_lock:
+                self._cancel_failures.pop((account.name, order.get("ordId")), None)
+        print(f"[{get_beijing_time()}] {account.prefix} [MONITOR] 订单{order.get('ordId')} {order.get('instId')} "
+              f"state={order.get('state')}" + (f" 止盈价={live.take_profit_price}" if live else ""))
+
+    def record_fill(self, account, order):
+        cl_ord_id = order.get("clOrdId", "")
+        fill_journal(cl_ord_id).write(
+            "fill", account=account.name, inst_id=order.get("instId"), cl_ord_id=cl_ord_id, ord_id=order.get("ordId"),
+            side=order.get("side"), fill_px=float(order.get("fillPx") or 0), fill_sz=float(order.get("fillSz") or 0),
+            fee=float(order.get("fillFee") or 0), pnl=float(order.get("fillPnl") or 0),
+            pos_side=order.get("posSide"), trade_id=order.get("tradeId"), state=order.get("state"))
+
+    async def resync_loop(self):
+        while True:
+            await asyncio.sleep(RESYNC_INTERVAL)
+            loop = asyncio.get_running_loop()
+            for account in self.accounts.values():
+                try:
+                    await loop.run_in_executor(self.executor, self.snapshot, account)
+                except Exception as e:
+                    print(f"[{get_beijing_time()}] {account.prefix} [MONITOR] [ERROR] 同步订单簿失败: {e}")
+            dump_metrics()  # 常驻进程不会退出，定期把延迟直方图落盘
+
+    # ---------- 撤单 ----------
+    async def on_ticker(self, inst_id, ticker):
+        try:
+            price = float(ticker["last"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.release_due()
+        hits = self.book.crossed(inst_id, price)
+        if not hits:
+            return
+        tick_time = time.time()
+        by_account = defaultdict(list)
+        for order, reason in hits:
+            by_account[order.account].append((order, reason))
+        loop = asyncio.get_running_loop()
+        for account_name, account_hits in by_account.items():
+            loop.run_in_executor(self.executor, self.cancel, self.accounts[account_name], inst_id, account_hits,
+                                 price, tick_time)
+
+    def cancel(self, account, inst_id, hits, price, tick_time):
+        try:
+            results = cancel_order_results(account.trade_api(), inst_id, [o.ord_id for o, _ in hits], account.prefix)
+        except Exception as e:
+            print(f"[{get_beijing_time()}] {account.prefix} [MONITOR] [ERROR] 撤单异常: {e}")
+            results = {}
+        record_latency("monitor_cross_to_cancel", time.time() - tick_time, account=account.name, inst_id=inst_id)
+        for order, reason in hits:
+            r = results.get(order.ord_id) or {"code": "-1", "msg": "无撤单结果"}
+            if r.get("code") != "0":
+                delay = self.defer_retry(order, str(r.get("code")))
+                print(f"[{get_beijing_time()}] {account.prefix} [ERROR] 订单{order.ord_id}撤销失败: {r.get('msg', '')}，"
+                      f"{delay:.0f}秒后重新判断")
+                continue
+            with self._retry_lock:
+                self._cancel_failures.pop(order.key, None)
+            self.book.remove(order)
+            self.canceled_count += 1
+            print(f"[{get_beijing_time()}] {account.prefix} [MONITOR] 订单{order.ord_id}已撤销: {reason}")
+            notification_service.send_order_cancel_notification(
+                account_name=account.name,
+                inst_id=inst_id,
+                ord_id=order.ord_id,
+                side=order.side,
+                pos_side=order.pos_side,
+                order_price=order.px,
+                take_profit_price=order.take_profit_price,
+                current_price=price,
+                reason=reason
+            )
+
+    def defer_retry(self, order, code):
+        """
+        撤单失败后不立即放回订单簿（下一条行情推送会再次越过并重复撤单），按连续失败次数退避；
+        业务错误（订单已完结、权限不足等）等待一个快照校正周期，期间订单推送会把已完结的订单移出订单簿
+
+        Returns:
+            float: 重新参与判断前的等待(秒)
+        """
+        with self._retry_lock:
+            self._cancel_failures[order.key] += 1
+            if is_final_cancel_error(code):
+                delay = RESYNC_INTERVAL
+            else:
+                delay = min(CANCEL_RETRY_MAX, CANCEL_RETRY_BASE * 2 ** (self._cancel_failures[order.key] - 1))
+            self._cancel_retry[order.key] = (order, time.time() + delay)
+        return delay
+
+    def release_due(self):
+        """到了重试时间的撤单失败订单放回订单簿，重新参与止盈价判断"""
+        now = time.time()
+        with self._retry_lock:
+            due = [order for order, retry_at in self._cancel_retry.values() if retry_at <= now]
+            for order in due:
+                del self._cancel_retry[order.key]
+        for order in due:
+            self.book.release(order)
+
+    # ---------- 运行 ----------
+    async def run(self):
+        for inst_id in self.inst_ids:
+            self.market_feed.subscribe_ticker(inst_id)
+        self.market_feed.on_ticker(self.on_ticker)
+        for account in self.accounts.values():
+            feed = OrderFeed(account)
+            for inst_id in self.inst_ids:
+                feed.subscribe_orders(inst_id)
+            feed.on_order(self.on_order)
+            feed.on_connected(self.on_connected)
+            self.order_feeds.append(feed)
+        set_active_feed(self.market_feed)
+        try:
+            await asyncio.gather(self.market_feed.run(), self.resync_loop(), *(f.run() for f in self.order_feeds))
+        finally:
+            set_active_feed(None)
+
+    def stop(self):
+        self.market_feed.stop()
+        for feed in self.order_feeds:
+            feed.stop()
+
+
+def main():
+    print(f"[{get_beijing_time()}] [INFO] OKX委托订单常驻监控启动")
+    print(f"[{get_beijing_time()}] [CONFIG] 监控标的: {', '.join(MONITOR_INST_IDS)}")
+    print(f"[{get_beijing_time()}] [CONFIG] 价格容差: {PRICE_TOLERANCE * 100:.2f}%")
+    accounts = get_accounts(ACCOUNT_SUFFIXES, ENV_STYLE_SUFFIX, configured_only=True)
+    if not accounts:
+        print(f"[{get_beijing_time()}] [ERROR] 没有已配置的账户，退出")
+        return
+    print(f"[{get_beijing_time()}] [CONFIG] 监控账户: {', '.join(a.name for a in accounts)}")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    monitor = OrderMonitor(accounts, MONITOR_INST_IDS)
+    try:
+        asyncio.run(monitor.run())
+    except KeyboardInterrupt:
+        print(f"[{get_beijing_time()}] [INFO] 收到退出信号，监控停止，共撤销{monitor.canceled_count}个订单")
+
+if __name__ == "__main__":
+    main()
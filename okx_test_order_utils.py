@@ -5,11 +5,13 @@ name: OKX 多账户API测试（批量创建+批量撤销）
 cron: 1 1 1 1 *
 """
 import os
+import sys
 import json
 import time
 from datetime import datetime, timezone, timedelta
-import okx.MarketData as MarketData
-import okx.Trade as Trade
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from okx_clients import get_trade_api
 
 # ============== 可配置参数区域 ==============
 # 环境变量账户后缀，支持多账号 (如OKX_API_KEY1, OKX_SECRET_KEY1, OKX_PASSPHRASE1)
@@ -159,7 +161,7 @@ if __name__ == "__main__":
             if api_key is None or secret_key is None or passphrase is None:
                 raise ValueError("API密钥、密钥或密码不能为空")
             
-            trade_api = Trade.TradeAPI(api_key, secret_key, passphrase, False, flag)
+            trade_api = get_trade_api(api_key, secret_key, passphrase, flag)
             print(f"[{get_beijing_time()}] {prefix} API初始化成功")
         except Exception as e:
             error_msg = f"API初始化失败: {str(e)}"
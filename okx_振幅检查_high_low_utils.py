@@ -10,6 +10,7 @@ import requests
 import logging
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from notification_service import notification_service
 
 # 配置日志
 logging.basicConfig(
@@ -56,9 +57,6 @@ SYMBOLS = {
     },
 }
 
-# Bark 推送配置
-BARK_API_KEY = 'oZaeqGLJzRLSxW7dJqeACn'  # 替换为你的 Bark API Key
-
 def get_kline(symbol, interval="1m", limit=1):
     """获取OKX的最新1根K线数据"""
     params = {
@@ -112,29 +110,6 @@ def calculate_amplitude(kline):
     amplitude = ((high_price - low_price) / open_price) * 100
     return round(amplitude, 2)
 
-def send_bark_notification(title, content):
-    """通过Bark发送通知"""
-    if not BARK_API_KEY:
-        logging.warning("Bark API密钥未配置")
-        return
-
-    url = f"https://api.day.app/{BARK_API_KEY}"
-    payload = {
-        "title": title,
-        "body": content
-    }
-    proxies = {}  # 显式禁用代理
-
-    try:
-        response = requests.post(
-            url,
-            json=payload
-        )
-        response.raise_for_status()
-        logging.info(f"Bark 通知发送成功: {title}")
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Bark 推送失败: {e}")
-
 def monitor_single_symbol(symbol_key, config):
     """监控单个标的的振幅"""
     symbol_name = config["symbol"]
@@ -168,7 +143,9 @@ def monitor_single_symbol(symbol_key, config):
             f"最低价: {kline[3]}\n"
             f"最新价: {kline[4]}"
         )
-        send_bark_notification(title, content)
+        # 同一根K线只预警一次，振幅分组整体限流
+        notification_service.send_bark_notification(title, content, group="OKX振幅监控",
+                                                     dedup_key=f"amplitude_hl:{symbol_name}:{kline[0]}")
     else:
         logging.info(f"{symbol_name} 振幅未超过阈值 ({amplitude}% <= {upper_threshold}% and {amplitude}% >= {lower_threshold}%)")
 
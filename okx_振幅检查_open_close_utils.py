@@ -137,7 +137,9 @@ def monitor_single_symbol(symbol_key, config):
             amplitude=amplitude,
             threshold=upper_threshold,
             open_price=kline[1],
-            latest_price=kline[4]
+            latest_price=kline[4],
+            bar_ts=kline[0],
+            alert_type="amplitude_oc"
         )
     else:
         logging.info(f"{symbol_name} 振幅未超过阈值 ({amplitude}% <= {upper_threshold}% and {amplitude}% >= {lower_threshold}%)")
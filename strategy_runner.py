@@ -0,0 +1,186 @@
+"""
+任务名称
+name: OKX 策略常驻调度器
+定时规则
+cron: 1 1 1 1 *
+说明：常驻进程，启动一次即可。进程内只导入一次各策略模块，
+在每根K线收盘并确认完结后立即调度对应策略，替代每个周期冷启动一次的青龙定时任务。
+RUNNER_TRIGGER=ws 时改为订阅WebSocket K线频道，收到完结K线推送即触发策略。
+"""
+import os
+import sys
+import time
+import asyncio
+import importlib
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from kline_cache import get_cached_klines, bar_to_ms
+from ws_market_data import MarketDataFeed, set_active_feed
+from latency_metrics import record as record_latency, dump_metrics, start_metrics_server
+
+# ============== 可配置参数区域 ==============
+# 常驻调度的策略：module为策略脚本模块名，entry为入口函数，inst_id/bar/price_type用于等待K线完结
+# 基于 strategy_base.Strategy 的脚本（模块内有 strategy 实例）可省略 inst_id/bar/price_type
+RUNNER_STRATEGIES = [
+    {"module": "vine_5m_reversal_strategy_v2", "entry": "main"},
+    {"module": "ada_5m_reversal_strategy_v1", "entry": "main"},
+    {"module": "eth_K6_strategy", "entry": "main", "inst_id": "ETH-USDT-SWAP", "bar": "5m"},
+    {"module": "vine_k8_strategy_v4", "entry": "main", "inst_id": "VINE-USDT-SWAP", "bar": "5m"},
+    {"module": "doge_bollinger_band_reversal_strategy", "entry": "main", "inst_id": "DOGE-USDT-SWAP", "bar": "5m", "price_type": "mark"},
+    {"module": "trump_15m_reversal_strategy_v2", "entry": "main", "inst_id": "TRUMP-USDT-SWAP", "bar": "15m"},
+]
+
+# 只启用部分策略时设置环境变量，如 RUNNER_STRATEGIES=vine_5m_reversal_strategy_v2,eth_K6_strategy
+ENABLED_MODULES = [m.strip() for m in os.getenv("RUNNER_STRATEGIES", "").split(",") if m.strip()]
+
+KLINE_FLAG = os.getenv("OKX_FLAG", "0")  # K线行情使用的环境 (0实盘/1模拟盘)
+RUNNER_TRIGGER = os.getenv("RUNNER_TRIGGER", "poll")  # poll: 收盘后轮询完结标志 / ws: WebSocket推送完结K线
+CONFIRM_TIMEOUT = 20          # 收盘后等待K线完结标志的最长时间(秒)
+CONFIRM_POLL_INTERVAL = 0.5   # 轮询K线完结标志的间隔(秒)
+METRICS_PORT = os.getenv("METRICS_PORT")  # 设置后在该端口提供 /metrics（Prometheus文本格式）
+
+# ==========================================
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def load_strategies():
+    """导入所有策略模块（只导入一次），返回可调度的策略配置列表"""
+    strategies = []
+    for cfg in RUNNER_STRATEGIES:
+        if ENABLED_MODULES and cfg["module"] not in ENABLED_MODULES:
+            continue
+        try:
+            module = importlib.import_module(cfg["module"])
+            func = getattr(module, cfg.get("entry", "main"))
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [RUNNER] [ERROR] 导入策略 {cfg['module']} 失败: {e}")
+            continue
+        strategy = getattr(module, "strategy", None)
+        if strategy is not None:
+            cfg = dict({"inst_id": strategy.inst_id, "bar": strategy.bar, "price_type": strategy.price_type}, **cfg)
+        if bar_to_ms(cfg["bar"]) is None:
+            print(f"[{get_beijing_time()}] [RUNNER] [ERROR] 策略 {cfg['module']} K线周期 {cfg['bar']} 不支持常驻调度")
+            continue
+        strategies.append(dict(cfg, func=func, running=False))
+        print(f"[{get_beijing_time()}] [RUNNER] 已加载策略: {cfg['module']} ({cfg['inst_id']} {cfg['bar']})")
+    return strategies
+
+def wait_bar_confirmed(cfg, bar_ts):
+    """轮询K线缓存，直到指定开盘时间的K线在OKX端标记为已完结"""
+    deadline = time.time() + CONFIRM_TIMEOUT
+    while time.time() < deadline:
+        try:
+            klines = get_cached_klines(cfg["inst_id"], cfg["bar"], 1, price_type=cfg.get("price_type", "last"),
+                                       flag=KLINE_FLAG, include_unconfirmed=False)
+            if klines and int(klines[0][0]) >= bar_ts:
+                return True
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] 检查K线完结状态异常: {e}")
+        time.sleep(CONFIRM_POLL_INTERVAL)
+    return False
+
+def run_strategy_once(cfg):
+    """在线程中执行一次策略，隔离策略内部的异常与exit()"""
+    start = time.time()
+    try:
+        cfg["func"]()
+    except KeyboardInterrupt:
+        raise
+    except BaseException as e:
+        print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] [ERROR] 策略执行异常: {e}\n{traceback.format_exc()}")
+    elapsed = time.time() - start
+    record_latency("strategy_run", elapsed, strategy=cfg["module"])
+    dump_metrics()  # 常驻进程不会退出，每次执行后把延迟直方图落盘
+    return elapsed
+
+async def schedule_strategy(cfg, executor):
+    """按K线收盘时间循环调度单个策略"""
+    loop = asyncio.get_running_loop()
+    bar_ms = bar_to_ms(cfg["bar"])
+    while True:
+        now_ms = time.time() * 1000
+        next_close_ms = (now_ms // bar_ms + 1) * bar_ms
+        await asyncio.sleep((next_close_ms - now_ms) / 1000)
+        bar_ts = int(next_close_ms - bar_ms)  # 刚收盘K线的开盘时间
+
+        if cfg["running"]:
+            print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] 上一周期仍在执行，跳过本次调度")
+            continue
+        cfg["running"] = True
+        try:
+            confirmed = await loop.run_in_executor(executor, wait_bar_confirmed, cfg, bar_ts)
+            if not confirmed:
+                print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] {CONFIRM_TIMEOUT}秒内K线未完结，跳过本次调度")
+                continue
+            signal_delay = time.time() - next_close_ms / 1000
+            print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] K线已完结(收盘后{signal_delay:.3f}秒)，开始执行")
+            elapsed = await loop.run_in_executor(executor, run_strategy_once, cfg)
+            print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] 执行完成，耗时{elapsed:.3f}秒")
+        finally:
+            cfg["running"] = False
+
+async def run_forever(strategies):
+    # 等待完结与策略执行都是阻塞调用，每个策略至少两个线程
+    with ThreadPoolExecutor(max_workers=max(4, len(strategies) * 2)) as executor:
+        await asyncio.gather(*(schedule_strategy(cfg, executor) for cfg in strategies))
+
+async def trigger_strategy(cfg, executor, close_ms):
+    """收到完结K线推送后执行策略"""
+    if cfg["running"]:
+        print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] 上一周期仍在执行，跳过本次推送")
+        return
+    cfg["running"] = True
+    try:
+        signal_delay = time.time() - close_ms / 1000
+        print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] 收到K线完结推送(收盘后{signal_delay:.3f}秒)，开始执行")
+        elapsed = await asyncio.get_running_loop().run_in_executor(executor, run_strategy_once, cfg)
+        print(f"[{get_beijing_time()}] [RUNNER] [{cfg['module']}] 执行完成，耗时{elapsed:.3f}秒")
+    finally:
+        cfg["running"] = False
+
+async def run_with_feed(strategies, feed=None):
+    """WebSocket触发模式：订阅各策略的K线与ticker频道，K线完结即调度"""
+    feed = feed or MarketDataFeed(flag=KLINE_FLAG)
+    for cfg in strategies:
+        feed.subscribe_candles(cfg["inst_id"], cfg["bar"], cfg.get("price_type", "last"))
+        feed.subscribe_ticker(cfg["inst_id"])
+    set_active_feed(feed)  # 策略内 get_current_price 优先读取推送价格
+
+    with ThreadPoolExecutor(max_workers=max(4, len(strategies))) as executor:
+        async def on_bar_close(inst_id, bar, price_type, kline):
+            close_ms = int(kline[0]) + bar_to_ms(bar)
+            for cfg in strategies:
+                if (cfg["inst_id"], cfg["bar"], cfg.get("price_type", "last")) == (inst_id, bar, price_type):
+                    asyncio.ensure_future(trigger_strategy(cfg, executor, close_ms))
+
+        feed.on_bar_close(on_bar_close)
+        try:
+            await feed.run()
+        finally:
+            set_active_feed(None)
+
+def main():
+    print(f"[{get_beijing_time()}] [RUNNER] 策略常驻调度器启动")
+    strategies = load_strategies()
+    if not strategies:
+        print(f"[{get_beijing_time()}] [RUNNER] [ERROR] 没有可调度的策略，退出")
+        return
+    print(f"[{get_beijing_time()}] [RUNNER] 触发方式: {RUNNER_TRIGGER}")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    try:
+        if RUNNER_TRIGGER == "ws":
+            asyncio.run(run_with_feed(strategies))
+        else:
+            asyncio.run(run_forever(strategies))
+    except KeyboardInterrupt:
+        print(f"[{get_beijing_time()}] [RUNNER] 收到退出信号，调度器停止")
+
+if __name__ == "__main__":
+    main()
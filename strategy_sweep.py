@@ -0,0 +1,172 @@
+"""
+任务名称
+name: 策略参数网格扫描
+定时规则
+cron: 1 1 1 1 *
+说明：多进程扫描大振幅反转、K6、K8策略的参数网格，K线数组放在共享内存中，各进程直接映射，不按任务序列化。
+结果按累计收益排序输出，并保存CSV到 logs/backtest/。
+用法：python strategy_sweep.py [策略名...]，策略名见 SWEEP_PRESETS
+"""
+import os
+import sys
+import csv
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from datetime import datetime, timezone, timedelta
+import numpy as np
+
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from amplitude_backtest import klines_to_ohlc, backtest_amplitude_reversal
+from kpattern_backtest import backtest_k6, backtest_k8, k8_trend
+from kline_history import load_history, HISTORY_DIR
+from amplitude_reversal_backtest import BACKTEST_PRESETS
+
+# ============== 可配置参数区域 ==============
+HISTORY_DAYS = 365            # 回测的历史天数
+FEE_RATE = 0.0005             # 单边手续费率（吃单）
+SWEEP_WORKERS = os.cpu_count() or 1
+CHUNK_SIZE = 16               # 每个进程任务包含的参数组数，减少进程间往返
+TOP_N = 20                    # 输出排名前N的参数组合
+
+# fixed 为不扫描的参数（与线上一致），grid 为扫描范围
+SWEEP_PRESETS = {
+    name: {"engine": "amplitude", "inst_id": p["inst_id"], "bar": p["bar"],
+           "fixed": {k: v for k, v in p["params"].items() if k not in p["grid"]}, "grid": p["grid"]}
+    for name, p in BACKTEST_PRESETS.items()
+}
+SWEEP_PRESETS.update({
+    "eth_k6": {
+        "engine": "k6", "inst_id": "ETH-USDT-SWAP", "bar": "5m",
+        "fixed": {"expiry_bars": 12},
+        "grid": {"min_body1": [0.008, 0.01, 0.012, 0.015],
+                 "max_body1": [0.02, 0.025, 0.035],
+                 "max_total_range": [0.02, 0.035, 0.05],
+                 "take_profit_percent": [0.01, 0.015, 0.02],
+                 "stop_loss_percent": [0.006, 0.01, 0.015]},
+    },
+    "vine_k8_v4": {
+        "engine": "k8", "inst_id": "VINE-USDT-SWAP", "bar": "5m",
+        "fixed": {"expiry_bars": 12, "ema_short": 13, "ema_mid": 34, "ema_long": 89, "enable_trend_filter": True},
+        "grid": {"min_body1": [0.006, 0.009, 0.012],
+                 "max_body1": [0.025, 0.035, 0.05],
+                 "max_total_range": [0.015, 0.02, 0.03],
+                 "take_profit_percent": [0.015, 0.02, 0.03],
+                 "stop_loss_percent": [0.01, 0.015, 0.02]},
+    },
+})
+
+ENGINES = {
+    "amplitude": backtest_amplitude_reversal,
+    "k6": backtest_k6,
+    "k8": backtest_k8,
+}
+# ==========================================
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+# 子进程内的共享K线数组
+_worker = {}
+
+def _init_worker(shm_name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm  # 保持引用，避免映射被回收
+    _worker["ohlc"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["cache"] = {}
+
+def _evaluate(engine, params_list):
+    ohlc = _worker["ohlc"]
+    results = []
+    for params in params_list:
+        params = dict(params)
+        if engine == "k8" and params.get("enable_trend_filter", True):
+            # EMA趋势与扫描参数无关，每个进程只计算一次
+            spans = (params.get("ema_short", 13), params.get("ema_mid", 34), params.get("ema_long", 89))
+            if spans not in _worker["cache"]:
+                _worker["cache"][spans] = k8_trend(ohlc, *spans)
+            params["trend"] = _worker["cache"][spans]
+        stats = ENGINES[engine](ohlc, **params)["stats"]
+        params.pop("trend", None)
+        results.append((params, stats))
+    return results
+
+def run_sweep(ohlc, engine, grid, fixed=None, workers=SWEEP_WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    多进程网格扫描
+
+    Returns:
+        list: [(参数dict, stats)]，按 total_return 降序
+    """
+    ohlc = np.ascontiguousarray(ohlc, dtype=float)
+    names = list(grid)
+    combos = [dict(fixed or {}, **dict(zip(names, values)))
+              for values in itertools.product(*(grid[name] for name in names))]
+    chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(ohlc.nbytes, 1))
+    try:
+        np.ndarray(ohlc.shape, dtype=ohlc.dtype, buffer=shm.buf)[:] = ohlc
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, ohlc.shape, ohlc.dtype.str)) as executor:
+            futures = [executor.submit(_evaluate, engine, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                results.extend(future.result())
+    finally:
+        shm.close()
+        shm.unlink()
+    results.sort(key=lambda x: x[1]["total_return"], reverse=True)
+    return results
+
+def print_table(results, grid, top_n=TOP_N):
+    names = list(grid)
+    header = ["排名"] + names + ["累计收益%", "最大回撤%", "交易数", "胜率%", "盈亏比"]
+    rows = []
+    for rank, (params, stats) in enumerate(results[:top_n], 1):
+        rows.append([str(rank)] + [f"{params[n]:g}" if isinstance(params[n], float) else str(params[n]) for n in names] + [
+            f"{stats['total_return']*100:.2f}", f"{stats['max_drawdown']*100:.2f}", str(stats['trades']),
+            f"{stats['win_rate']*100:.1f}", f"{stats['profit_factor']:.2f}"])
+    widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for r in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+def save_results(name, results, grid):
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    path = os.path.join(HISTORY_DIR, f"sweep_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    names = list(grid)
+    stat_keys = ["total_return", "max_drawdown", "trades", "signals", "win_rate", "avg_return", "profit_factor"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names + stat_keys)
+        for params, stats in results:
+            writer.writerow([params[n] for n in names] + [stats[k] for k in stat_keys])
+    return path
+
+def run_preset(name):
+    preset = SWEEP_PRESETS[name]
+    ohlc = klines_to_ohlc(load_history(preset["inst_id"], preset["bar"], HISTORY_DAYS))
+    combos = int(np.prod([len(v) for v in preset["grid"].values()]))
+    print(f"[{get_beijing_time()}] [SWEEP] {name} {preset['inst_id']} {preset['bar']} 共{len(ohlc)}根K线，"
+          f"{combos}组参数，{SWEEP_WORKERS}个进程")
+    start = time.time()
+    results = run_sweep(ohlc, preset["engine"], preset["grid"], dict(preset["fixed"], fee_rate=FEE_RATE))
+    print(f"[{get_beijing_time()}] [SWEEP] {name} 扫描完成，耗时{time.time() - start:.2f}秒")
+    print_table(results, preset["grid"])
+    path = save_results(name, results, preset["grid"])
+    print(f"[{get_beijing_time()}] [SWEEP] 完整结果已保存到: {path}")
+
+def main():
+    names = sys.argv[1:] or list(SWEEP_PRESETS)
+    for name in names:
+        if name not in SWEEP_PRESETS:
+            print(f"[{get_beijing_time()}] [ERROR] 未知策略: {name}，可选: {', '.join(SWEEP_PRESETS)}")
+            continue
+        run_preset(name)
+
+if __name__ == "__main__":
+    main()
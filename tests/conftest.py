@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与脚本一致，utils 目录下的模块按顶层模块导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils'))
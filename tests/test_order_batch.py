@@ -0,0 +1,123 @@
+"""place_orders 的结果核对：超时后按 clOrdId 查询再决定是否重新提交，以及下次下单前核对结果未知的订单"""
+import time
+
+import pytest
+
+import order_batch
+from order_batch import place_orders, reconcile_submissions
+from order_state import OrderStateStore, SUBMIT_ACCEPTED, SUBMIT_REJECTED, SUBMIT_UNKNOWN
+
+NOT_EXIST = {"code": "51603", "msg": "Order does not exist", "data": []}
+
+
+class FakeTradeApi:
+    """按脚本依次返回 place_order / get_order 的响应（get_order 也可按 clOrdId 给出），None 表示请求超时（无响应）"""
+
+    def __init__(self, place=(), query=()):
+        self.place = list(place)
+        self.query = query if isinstance(query, dict) else list(query)
+        self.placed = []
+        self.queried = []
+
+    def place_order(self, **order):
+        self.placed.append(order["clOrdId"])
+        return self.place.pop(0)
+
+    def get_order(self, instId, clOrdId):
+        self.queried.append(clOrdId)
+        return self.query[clOrdId] if isinstance(self.query, dict) else self.query.pop(0)
+
+
+def accepted(cl_ord_id, ord_id="1001"):
+    return {"code": "0", "msg": "", "data": [{"clOrdId": cl_ord_id, "ordId": ord_id, "sCode": "0", "sMsg": ""}]}
+
+
+def found(cl_ord_id, ord_id="1001"):
+    return {"code": "0", "msg": "", "data": [{"clOrdId": cl_ord_id, "ordId": ord_id, "state": "live"}]}
+
+
+def order(cl_ord_id="T20260101000000abcdef"):
+    return {"instId": "VINE-USDT-SWAP", "tdMode": "cross", "side": "buy", "ordType": "limit", "px": "0.1", "sz": "10",
+            "clOrdId": cl_ord_id}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = OrderStateStore(str(tmp_path / "order_state.db"))
+    monkeypatch.setattr(order_batch, "get_order_state", lambda: store)
+    monkeypatch.setattr(order_batch, "REQUEST_EXPIRY", 0.05)
+    monkeypatch.setattr(order_batch, "EXPIRY_MARGIN", 0.05)
+    monkeypatch.setattr(order_batch, "RECONCILE_DELAY", 0.01)
+    return store
+
+
+@pytest.fixture
+def notices(monkeypatch):
+    sent = []
+    monkeypatch.setattr(order_batch.notification_service, "send_bark_notification",
+                        lambda title, message, group=None: sent.append(title))
+    return sent
+
+
+def test_timeout_then_missing_resubmits_same_clordid(store, notices):
+    o = order()
+    api = FakeTradeApi(place=[None, accepted(o["clOrdId"])], query=[NOT_EXIST])
+    result = place_orders(api, [o], account="acc")[o["clOrdId"]]
+    assert result["code"] == "0"
+    assert api.placed == [o["clOrdId"], o["clOrdId"]]
+    assert store.get_submission(o["clOrdId"])["status"] == SUBMIT_ACCEPTED
+
+
+def test_timeout_then_found_is_accepted_without_resubmit(store, notices):
+    o = order()
+    api = FakeTradeApi(place=[None], query=[found(o["clOrdId"], "2002")])
+    result = place_orders(api, [o], account="acc")[o["clOrdId"]]
+    assert result["code"] == "0" and result["data"][0]["ordId"] == "2002"
+    assert api.placed == [o["clOrdId"]]
+    assert store.get_submission(o["clOrdId"])["ord_id"] == "2002"
+
+
+def test_deadline_before_expiry_marks_unknown(store, notices, monkeypatch):
+    monkeypatch.setattr(order_batch, "REQUEST_EXPIRY", 30)
+    o = order()
+    api = FakeTradeApi(place=[None], query=[NOT_EXIST])
+    result = place_orders(api, [o], account="acc", deadline=time.time() + 0.2)[o["clOrdId"]]
+    # 原请求未失效时查不到订单不能重发，否则可能重复开仓
+    assert result["code"] != "0" and result["unknown"]
+    assert api.placed == [o["clOrdId"]]
+    assert store.get_submission(o["clOrdId"])["status"] == SUBMIT_UNKNOWN
+
+
+def test_accepted_clordid_is_not_submitted_again(store, notices):
+    o = order()
+    api = FakeTradeApi(place=[accepted(o["clOrdId"], "3003")])
+    place_orders(api, [o], account="acc")
+    replay = place_orders(api, [o], account="acc")[o["clOrdId"]]
+    assert replay["code"] == "0" and replay["data"][0]["ordId"] == "3003"
+    assert api.placed == [o["clOrdId"]]
+
+
+def test_reconcile_unresolved_before_next_order(store, notices, monkeypatch):
+    for cl_ord_id in ("LIVE20260101000000aaaaaa", "GONE20260101000000bbbbbb", "WAIT20260101000000cccccc"):
+        store.claim_submission(cl_ord_id, "acc", "VINE-USDT-SWAP")
+    store.update_submission("GONE20260101000000bbbbbb", SUBMIT_UNKNOWN, msg="超时")
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + 5)  # 三笔提交的原请求都已失效
+    api = FakeTradeApi(query={"LIVE20260101000000aaaaaa": found("LIVE20260101000000aaaaaa", "4004"),
+                              "GONE20260101000000bbbbbb": NOT_EXIST,
+                              "WAIT20260101000000cccccc": {"code": "50001", "msg": "busy"}})
+    monkeypatch.setattr(order_batch, "call_with_retry", lambda func, *a, **k: (func(), ""))
+    outcomes = reconcile_submissions(api, "acc")
+    assert sorted((o["cl_ord_id"], o["accepted"]) for o in outcomes) == [
+        ("GONE20260101000000bbbbbb", False), ("LIVE20260101000000aaaaaa", True)]
+    assert store.get_submission("LIVE20260101000000aaaaaa")["status"] == SUBMIT_ACCEPTED
+    assert store.get_submission("GONE20260101000000bbbbbb")["status"] == SUBMIT_REJECTED
+    # 查询失败的保持结果未知，下次再核对
+    assert store.get_submission("WAIT20260101000000cccccc")["status"] == "sending"
+    assert len(notices) == 2
+
+
+def test_reconcile_skips_submissions_still_in_flight(store, notices):
+    store.claim_submission("NEW20260101000000dddddd", "acc", "VINE-USDT-SWAP")
+    api = FakeTradeApi()
+    assert reconcile_submissions(api, "acc") == []
+    assert api.queried == []
@@ -0,0 +1,68 @@
+"""MarketDataFeed 对接本地模拟 WebSocket 服务器：订阅、K线完结去重、断线重连后重订阅"""
+import json
+import asyncio
+
+import websockets
+
+import ws_market_data
+from kline_cache import KlineCache
+from ws_market_data import MarketDataFeed
+
+BAR_MS = 5 * 60 * 1000
+T0 = 1_700_000_100_000 // BAR_MS * BAR_MS
+
+
+def candle(ts, close, confirm):
+    return [str(ts), "1", "2", "0.5", str(close), "10", "10", "10", confirm]
+
+
+def push(inst_id, *klines):
+    return json.dumps({"arg": {"channel": "candle5m", "instId": inst_id}, "data": list(klines)})
+
+
+def test_subscribe_bar_close_dedup_and_reconnect(tmp_path, monkeypatch):
+    monkeypatch.setattr(ws_market_data, "RECONNECT_DELAY", 0.05)
+    subscriptions = []
+    # 第1次连接：推送未完结K线、同一根完结K线两次，然后断开；第2次连接：重复推送上一根并推送下一根
+    scripts = [
+        [push("VINE-USDT-SWAP", candle(T0, 1.1, "0")),
+         push("VINE-USDT-SWAP", candle(T0, 1.2, "1")),
+         push("VINE-USDT-SWAP", candle(T0, 1.2, "1"))],
+        [push("VINE-USDT-SWAP", candle(T0, 1.2, "1")),
+         push("VINE-USDT-SWAP", candle(T0 + BAR_MS, 1.3, "1"))],
+    ]
+
+    async def handler(ws):
+        msg = json.loads(await ws.recv())
+        subscriptions.append(msg)
+        await ws.send(json.dumps({"event": "subscribe", "arg": msg["args"][0]}))
+        for message in scripts[len(subscriptions) - 1] if len(subscriptions) <= len(scripts) else []:
+            await ws.send(message)
+        if len(subscriptions) < len(scripts):
+            return  # 关闭连接，触发客户端重连
+        await ws.wait_closed()
+
+    async def scenario():
+        closes = []
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            cache = KlineCache(cache_dir=str(tmp_path), market_api=object())
+            feed = MarketDataFeed(public_url=url, business_url=url, kline_cache=cache)
+            feed.subscribe_candles("VINE-USDT-SWAP", "5m")
+            feed.on_bar_close(lambda inst_id, bar, price_type, kline: closes.append((inst_id, bar, kline[0])))
+            task = asyncio.ensure_future(feed.run())
+            for _ in range(100):
+                if len(closes) >= 2:
+                    break
+                await asyncio.sleep(0.05)
+            feed.stop()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return feed, cache, closes
+
+    feed, cache, closes = asyncio.run(scenario())
+
+    assert subscriptions == [{"op": "subscribe", "args": [{"channel": "candle5m", "instId": "VINE-USDT-SWAP"}]}] * 2
+    assert closes == [("VINE-USDT-SWAP", "5m", str(T0)), ("VINE-USDT-SWAP", "5m", str(T0 + BAR_MS))]
+    assert feed.get_latest_bar("VINE-USDT-SWAP", "5m")[4] == "1.3"
+    assert [k[0] for k in cache._load(("VINE-USDT-SWAP", "5m", "last"))["confirmed"]] == [str(T0 + BAR_MS), str(T0)]
@@ -59,6 +59,7 @@ def main():
         # 检查未成交委托
         pending_orders = okx_utils.get_orders_pending(trade_api, INST_ID, account_prefix=account_name)
         order_canceled = False
+        cancel_ids = []
         for order in pending_orders:
             side = order.get('side')
             pos_side = order.get('posSide')
@@ -76,8 +77,11 @@ def main():
                 continue
             if (side == 'buy' and pos_side == 'long' and prev_close > tp) or (side == 'sell' and pos_side == 'short' and prev_close < tp):
                 print(f"[{okx_utils.get_shanghai_time()}] [{account_name}] 委托{order.get('ordId')}触发止盈，撤单")
-                okx_utils.cancel_pending_open_orders(trade_api, INST_ID, order_ids=order['ordId'], account_prefix=account_name)
-                order_canceled = True
+                cancel_ids.append(order['ordId'])
+        if cancel_ids:
+            # 本账户需要撤销的委托合并为一次批量撤单
+            okx_utils.cancel_pending_open_orders(trade_api, INST_ID, order_ids=cancel_ids, account_prefix=account_name)
+            order_canceled = True
         if order_canceled:
             print(f"[{okx_utils.get_shanghai_time()}] [{account_name}] 撤单后继续判断信号")
         elif pending_orders:
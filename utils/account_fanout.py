@@ -0,0 +1,66 @@
+"""
+任务名称
+name: OKX 多账户并发执行
+定时规则
+cron: 1 1 1 1 *
+说明：同一信号需要在多个账户下单时，并发执行各账户的撤单+下单流程，
+单个账户的重试或网络延迟不再拖慢其他账户。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone, timedelta
+
+ACCOUNT_DEADLINE = 8  # 每个账户撤单+下单流程的最长时间(秒)，超时不再等待也不再重试
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def fan_out_accounts(func, account_suffixes, *args, deadline=ACCOUNT_DEADLINE, label="FANOUT", **kwargs):
+    """
+    并发执行 func(suffix, *args, deadline=截止时间戳, **kwargs)
+
+    Args:
+        func: 单账户处理函数，需接受 deadline 关键字参数（time.time() 时间戳），用于控制内部重试
+        account_suffixes: 账户后缀列表
+        deadline: 每个账户的最长处理时间(秒)
+        label: 日志标签
+
+    Returns:
+        dict: suffix -> {"status": ok/error/timeout, "elapsed": 秒, "result": 返回值}
+    """
+    suffixes = list(account_suffixes)
+    if not suffixes:
+        return {}
+    start = time.time()
+    abs_deadline = start + deadline
+
+    def timed(suffix):
+        # 在工作线程内计时，得到各账户自身的耗时
+        try:
+            return func(suffix, *args, deadline=abs_deadline, **kwargs), None, time.time() - start
+        except Exception as e:
+            return None, e, time.time() - start
+
+    executor = ThreadPoolExecutor(max_workers=len(suffixes))
+    futures = {executor.submit(timed, suffix): suffix for suffix in suffixes}
+    done, not_done = wait(futures, timeout=deadline)
+    # 超时账户的线程无法强制终止，不再等待，由其自身按deadline结束重试
+    executor.shutdown(wait=False)
+
+    report = {}
+    for future, suffix in futures.items():
+        account = f"账户{suffix}" if suffix else "默认账户"
+        if future in not_done:
+            report[suffix] = {"status": "timeout", "elapsed": time.time() - start, "result": None}
+            print(f"[{get_beijing_time()}] [{label}] [LATENCY] {account} 超过{deadline}秒未完成，不再等待")
+            continue
+        result, error, elapsed = future.result()
+        if error is None:
+            report[suffix] = {"status": "ok", "elapsed": elapsed, "result": result}
+            print(f"[{get_beijing_time()}] [{label}] [LATENCY] {account} 完成，耗时{elapsed:.3f}秒")
+        else:
+            report[suffix] = {"status": "error", "elapsed": elapsed, "result": None}
+            print(f"[{get_beijing_time()}] [{label}] [LATENCY] {account} 异常({elapsed:.3f}秒): {error}")
+    print(f"[{get_beijing_time()}] [{label}] 全部账户处理结束，总耗时{time.time() - start:.3f}秒")
+    return report
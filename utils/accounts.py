@@ -0,0 +1,99 @@
+"""
+任务名称
+name: OKX 账户注册表
+定时规则
+cron: 1 1 1 1 *
+说明：统一从环境变量读取多账户配置，兼容仓库中两种命名方式：
+ENV_STYLE_SUFFIX  -> OKX_API_KEY1 / OKX_SECRET_KEY1 / OKX_PASSPHRASE1 / OKX_FLAG1 / OKX_ACCOUNT_NAME1
+ENV_STYLE_INFIX   -> OKX1_API_KEY / OKX1_SECRET_KEY / OKX1_PASSPHRASE / OKX1_FLAG / OKX1_ACCOUNT_NAME
+无后缀的默认账户两种方式相同（OKX_API_KEY 等）。本地开发时环境变量未设置的项从 config_local.py 读取。
+"""
+import os
+import threading
+from okx_clients import get_trade_api, get_market_api, get_account_api
+
+# 本地开发配置（变量名与环境变量相同），环境变量优先
+try:
+    import config_local
+except ImportError:
+    config_local = None
+
+ENV_STYLE_SUFFIX = "suffix"
+ENV_STYLE_INFIX = "infix"
+
+
+def env_key(var_name, suffix="", style=ENV_STYLE_SUFFIX):
+    """var_name 不带 OKX_ 前缀，如 "API_KEY" """
+    if suffix and style == ENV_STYLE_INFIX:
+        return f"OKX{suffix}_{var_name}"
+    return f"OKX_{var_name}{suffix}"
+
+
+def getenv(name, default=None):
+    value = os.getenv(name)
+    if value is None and config_local is not None:
+        value = getattr(config_local, name, None)
+    return default if value is None else value
+
+
+class Account:
+    """单个账户的配置，API客户端通过 okx_clients 缓存复用"""
+
+    def __init__(self, suffix, api_key, secret_key, passphrase, flag="0", name=None):
+        self.suffix = suffix
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.flag = str(flag or "0")
+        self.name = name or (f"账户{suffix}" if suffix else "默认账户")
+        self.prefix = f"[ACCOUNT-{suffix}]" if suffix else "[ACCOUNT]"
+
+    @property
+    def configured(self):
+        return all([self.api_key, self.secret_key, self.passphrase])
+
+    def trade_api(self):
+        return get_trade_api(str(self.api_key), str(self.secret_key), str(self.passphrase), self.flag)
+
+    def market_api(self):
+        return get_market_api(str(self.api_key), str(self.secret_key), str(self.passphrase), self.flag)
+
+    def account_api(self):
+        return get_account_api(str(self.api_key), str(self.secret_key), str(self.passphrase), self.flag)
+
+    def __repr__(self):
+        return f"Account({self.name!r}, suffix={self.suffix!r}, flag={self.flag!r})"
+
+
+def load_account(suffix="", style=ENV_STYLE_SUFFIX):
+    """按指定命名方式读取账户，缺少API_KEY时再尝试另一种命名方式"""
+    styles = [style] + [s for s in (ENV_STYLE_SUFFIX, ENV_STYLE_INFIX) if s != style]
+    for s in styles:
+        if getenv(env_key("API_KEY", suffix, s)):
+            break
+    else:
+        s = style
+    return Account(
+        suffix,
+        getenv(env_key("API_KEY", suffix, s)),
+        getenv(env_key("SECRET_KEY", suffix, s)),
+        getenv(env_key("PASSPHRASE", suffix, s)),
+        getenv(env_key("FLAG", suffix, s), "0"),
+        getenv(env_key("ACCOUNT_NAME", suffix, s)),
+    )
+
+
+# 进程内共享的账户表，常驻调度时各策略复用同一份配置
+_accounts = {}
+_accounts_lock = threading.Lock()
+
+def get_account(suffix="", style=ENV_STYLE_SUFFIX):
+    key = (suffix, style)
+    with _accounts_lock:
+        if key not in _accounts:
+            _accounts[key] = load_account(suffix, style)
+        return _accounts[key]
+
+def get_accounts(suffixes, style=ENV_STYLE_SUFFIX, configured_only=False):
+    accounts = [get_account(suffix, style) for suffix in suffixes]
+    return [a for a in accounts if a.configured] if configured_only else accounts
@@ -0,0 +1,247 @@
+"""
+任务名称
+name: 大振幅反转策略回测引擎
+定时规则
+cron: 1 1 1 1 *
+说明：vine/ada/trump 大振幅反转策略的向量化回测。
+信号：已完结K线振幅达到阈值，阳线做空、阴线做多，限价 = (收盘 + 最高/最低) / 2 ± 滑点，
+下一根K线开始挂单，超过有效期未成交撤单；成交后按止盈止损平仓。
+与Pine策略一致：持仓期间忽略新信号，新信号替换未成交的旧委托。
+"""
+import itertools
+import numpy as np
+
+# K线字段索引（OKX格式：ts, o, h, l, c, ...）
+TS, OPEN, HIGH, LOW, CLOSE = 0, 1, 2, 3, 4
+
+EXIT_TP = 1
+EXIT_SL = 2
+EXIT_OPEN = 0   # 回测结束时仍持仓，按最后收盘价计算
+
+def klines_to_ohlc(klines):
+    """OKX K线列表（任意顺序）转为按时间升序的 float 数组 [ts, o, h, l, c]"""
+    arr = np.array([[float(k[i]) for i in range(5)] for k in klines], dtype=float)
+    if len(arr) == 0:
+        return arr.reshape(0, 5)
+    return arr[np.argsort(arr[:, TS], kind="stable")]
+
+def _first_true(mask):
+    """每行第一个True的位置，不存在为-1"""
+    idx = mask.argmax(axis=1)
+    idx[~mask[np.arange(len(mask)), idx]] = -1
+    return idx
+
+def _windows(values, starts, width):
+    """取 values[start:start+width]，越界部分填NaN"""
+    padded = np.concatenate([values, np.full(width, np.nan)])
+    return padded[starts[:, None] + np.arange(width)]
+
+def find_signals(ohlc, amplitude_percent, slippage, slippage_type="percent", entry_mode="midpoint"):
+    """
+    向量化计算信号
+
+    Args:
+        amplitude_percent: 振幅阈值（小数，如0.042）
+        slippage: 滑点，percent为比例（vine: 0.005），absolute为价格（trump Pine: 0.16）
+        entry_mode: midpoint 为 (收盘+高/低)/2（vine/trump），close 为收盘价（ada）
+
+    Returns:
+        (signal_bars, sides, limit_prices)，side 1做多 / -1做空
+    """
+    o, h, l, c = ohlc[:, OPEN], ohlc[:, HIGH], ohlc[:, LOW], ohlc[:, CLOSE]
+    amplitude = (h - l) / l
+    green = c > o
+    red = c < o
+    side = np.where(amplitude >= amplitude_percent, np.where(green, -1, np.where(red, 1, 0)), 0)
+    if entry_mode == "close":
+        base = c
+    else:
+        base = np.where(side < 0, (c + h) / 2, (c + l) / 2)
+    if slippage_type == "absolute":
+        limit = base + side * slippage
+    else:
+        limit = base * (1 + side * slippage)
+    bars = np.nonzero(side)[0]
+    # 最后一根K线之后没有可成交的K线
+    bars = bars[bars < len(ohlc) - 1]
+    return bars, side[bars], limit[bars]
+
+def simulate_fills(ohlc, signal_bars, sides, limit_prices, expiry_bars):
+    """信号下一根K线起挂单，expiry_bars根内触价即成交，返回(成交K线, 成交价)，未成交为-1/NaN"""
+    o, h, l = ohlc[:, OPEN], ohlc[:, HIGH], ohlc[:, LOW]
+    starts = signal_bars + 1
+    win_l = _windows(l, starts, expiry_bars)
+    win_h = _windows(h, starts, expiry_bars)
+    px = limit_prices[:, None]
+    touched = np.where(sides[:, None] > 0, win_l <= px, win_h >= px)
+    offset = _first_true(touched)
+    fill_bars = np.where(offset >= 0, starts + offset, -1)
+    # 跳空越过限价时按开盘价成交
+    fill_open = o[np.clip(fill_bars, 0, len(ohlc) - 1)]
+    fill_px = np.where(sides > 0, np.minimum(fill_open, limit_prices), np.maximum(fill_open, limit_prices))
+    fill_px = np.where(fill_bars >= 0, fill_px, np.nan)
+    return fill_bars, fill_px
+
+def simulate_exits(ohlc, fill_bars, sides, fill_px, take_profit_percent, stop_loss_percent, max_hold_bars=None):
+    """
+    从成交K线起寻找首次触发止盈/止损的K线。同一根K线同时触及止盈止损时按止损计（保守），
+    跳空越过止损时按开盘价成交。
+
+    Returns:
+        (exit_bars, exit_prices, exit_reasons)
+    """
+    n = len(ohlc)
+    o, h, l, c = ohlc[:, OPEN], ohlc[:, HIGH], ohlc[:, LOW], ohlc[:, CLOSE]
+    tp = np.where(sides > 0, fill_px * (1 + take_profit_percent), fill_px * (1 - take_profit_percent))
+    sl = np.where(sides > 0, fill_px * (1 - stop_loss_percent), fill_px * (1 + stop_loss_percent))
+    exit_bars = np.full(len(fill_bars), -1)
+    exit_px = np.full(len(fill_bars), np.nan)
+    reasons = np.full(len(fill_bars), EXIT_OPEN)
+
+    horizon = n if max_hold_bars is None else max_hold_bars
+    pending = np.nonzero(fill_bars >= 0)[0]
+    start_offset = np.zeros(len(fill_bars), dtype=int)
+    width = 64
+    # 窗口逐步加倍，大部分交易在前几十根K线内平仓，避免为所有交易构造超长窗口
+    while len(pending):
+        w = min(width, horizon)
+        starts = fill_bars[pending] + start_offset[pending]
+        win_h = _windows(h, starts, w)
+        win_l = _windows(l, starts, w)
+        long_side = sides[pending][:, None] > 0
+        hit_tp = np.where(long_side, win_h >= tp[pending][:, None], win_l <= tp[pending][:, None])
+        hit_sl = np.where(long_side, win_l <= sl[pending][:, None], win_h >= sl[pending][:, None])
+        in_horizon = (start_offset[pending][:, None] + np.arange(w)) < horizon
+        hit_tp &= in_horizon
+        hit_sl &= in_horizon
+        first = _first_true(hit_tp | hit_sl)
+        done = first >= 0
+        idx = pending[done]
+        bars = starts[done] + first[done]
+        is_sl = hit_sl[done, first[done]]
+        gap_open = o[bars]
+        sl_px = np.where(sides[idx] > 0, np.minimum(gap_open, sl[idx]), np.maximum(gap_open, sl[idx]))
+        exit_bars[idx] = bars
+        exit_px[idx] = np.where(is_sl, sl_px, tp[idx])
+        reasons[idx] = np.where(is_sl, EXIT_SL, EXIT_TP)
+
+        start_offset[pending] += w
+        remain = pending[~done]
+        reached_end = (fill_bars[remain] + start_offset[remain] >= n) | (start_offset[remain] >= horizon)
+        # 数据结束或超过最长持仓仍未平仓：按最后可用收盘价计
+        last = np.minimum(fill_bars[remain] + np.minimum(start_offset[remain], horizon) - 1, n - 1)[reached_end]
+        ended = remain[reached_end]
+        exit_bars[ended] = last
+        exit_px[ended] = c[last]
+        pending = remain[~reached_end]
+        width *= 4
+    return exit_bars, exit_px, reasons
+
+def run_signals(ohlc, signal_bars, sides, limit_prices, take_profit_percent, stop_loss_percent,
+                expiry_bars=1, fee_rate=0.0, max_hold_bars=None):
+    """
+    按限价信号回测（各策略族共用）：成交、止盈止损平仓，持仓期间忽略新信号，新信号替换未成交的旧委托
+
+    Args:
+        signal_bars/sides/limit_prices: 信号K线索引（升序）、方向(1做多/-1做空)、限价
+        expiry_bars: 委托有效期（K线根数），如15m K线订单有效1小时为4
+        fee_rate: 单边手续费率，按开平各扣一次
+
+    Returns:
+        dict: trades(逐笔明细) 与 stats(汇总指标)
+    """
+    fill_bars, fill_px = simulate_fills(ohlc, signal_bars, sides, limit_prices, expiry_bars)
+    exit_bars, exit_px, reasons = simulate_exits(ohlc, fill_bars, sides, fill_px,
+                                                 take_profit_percent, stop_loss_percent, max_hold_bars)
+
+    # 信号稀疏，按顺序处理持仓互斥与委托替换
+    taken = []
+    position_exit = -1
+    pending = None
+    for k in range(len(signal_bars)):
+        bar = signal_bars[k]
+        if pending is not None:
+            if 0 <= fill_bars[pending] <= bar:
+                taken.append(pending)
+                position_exit = exit_bars[pending]
+            pending = None  # 已成交，或被新信号撤单替换
+        if position_exit > bar:
+            continue  # 持仓中，忽略信号
+        pending = k
+    if pending is not None and fill_bars[pending] >= 0:
+        taken.append(pending)
+    taken = np.array(taken, dtype=int)
+
+    side = sides[taken]
+    entry = fill_px[taken]
+    exit_ = exit_px[taken]
+    returns = side * (exit_ - entry) / entry - 2 * fee_rate
+    trades = {
+        "signal_ts": ohlc[signal_bars[taken], TS].astype(np.int64),
+        "entry_ts": ohlc[fill_bars[taken], TS].astype(np.int64),
+        "exit_ts": ohlc[exit_bars[taken], TS].astype(np.int64),
+        "side": side,
+        "entry_price": entry,
+        "exit_price": exit_,
+        "exit_reason": reasons[taken],
+        "return": returns,
+    }
+    return {"trades": trades, "stats": summarize(returns, len(signal_bars))}
+
+def backtest_amplitude_reversal(ohlc, amplitude_percent, take_profit_percent, stop_loss_percent,
+                                slippage=0.0, slippage_type="percent", expiry_bars=1,
+                                entry_mode="midpoint", fee_rate=0.0, max_hold_bars=None):
+    """
+    回测大振幅反转策略
+
+    Args:
+        ohlc: klines_to_ohlc 返回的升序数组
+        其余参数见 find_signals / run_signals
+
+    Returns:
+        dict: trades(逐笔明细) 与 stats(汇总指标)
+    """
+    ohlc = np.asarray(ohlc, dtype=float)
+    signal_bars, sides, limits = find_signals(ohlc, amplitude_percent, slippage, slippage_type, entry_mode)
+    return run_signals(ohlc, signal_bars, sides, limits, take_profit_percent, stop_loss_percent,
+                       expiry_bars, fee_rate, max_hold_bars)
+
+def summarize(returns, signal_count=0):
+    """汇总指标，收益为相对名义价值的比例（乘以杠杆即为保证金收益率）"""
+    n = len(returns)
+    if n == 0:
+        return {"signals": signal_count, "trades": 0, "win_rate": 0.0, "total_return": 0.0,
+                "avg_return": 0.0, "profit_factor": 0.0, "max_drawdown": 0.0}
+    equity = np.cumsum(returns)
+    drawdown = np.maximum.accumulate(np.concatenate([[0.0], equity]))[1:] - equity
+    gains = returns[returns > 0].sum()
+    losses = -returns[returns < 0].sum()
+    return {
+        "signals": signal_count,
+        "trades": n,
+        "win_rate": float((returns > 0).mean()),
+        "total_return": float(equity[-1]),
+        "avg_return": float(returns.mean()),
+        "profit_factor": float(gains / losses) if losses > 0 else float("inf"),
+        "max_drawdown": float(drawdown.max()),
+    }
+
+def sweep_parameters(ohlc, grid, **fixed):
+    """
+    参数网格回测
+
+    Args:
+        grid: 参数名 -> 候选值列表，如 {"amplitude_percent": [0.04, 0.05], "stop_loss_percent": [0.017, 0.027]}
+        fixed: 其余固定参数
+
+    Returns:
+        list: [(参数dict, stats)]，按 total_return 降序
+    """
+    ohlc = np.asarray(ohlc, dtype=float)
+    names = list(grid)
+    results = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(fixed, **dict(zip(names, values)))
+        results.append((params, backtest_amplitude_reversal(ohlc, **params)["stats"]))
+    results.sort(key=lambda x: x[1]["total_return"], reverse=True)
+    return results
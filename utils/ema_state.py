@@ -0,0 +1,123 @@
+"""
+任务名称
+name: 增量EMA状态
+定时规则
+cron: 1 1 1 1 *
+说明：按 (instId, bar) 持久化多周期EMA状态，每根新完结K线O(1)更新；
+首次或K线不连续时用已有历史K线重新预热，计算方式与 pandas ewm(span, adjust=False) 一致。
+"""
+import os
+import json
+import threading
+from datetime import datetime, timezone, timedelta
+from kline_cache import bar_to_ms, is_confirmed
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EMA_STATE_DIR = os.getenv("OKX_EMA_STATE_DIR", os.path.join(ROOT_DIR, "logs", "ema_state"))
+
+def get_shanghai_time(fmt="%Y-%m-%d %H:%M:%S"):
+    tz = timezone(timedelta(hours=8))
+    return datetime.now(tz).strftime(fmt)
+
+
+class IncrementalEMA:
+    """
+    多周期EMA增量计算：
+    - update(klines) 传入OKX格式K线（最新在前，可含未完结K线），只用比状态更新的已完结K线推进
+    - values(live_price) 返回已完结K线的EMA；传入最新价时返回以该价格作为当前K线收盘的临时EMA，不改变状态
+    """
+
+    def __init__(self, inst_id, bar, spans=(13, 34, 89), state_dir=EMA_STATE_DIR):
+        self.inst_id = inst_id
+        self.bar = bar
+        self.spans = tuple(int(s) for s in spans)
+        self.bar_ms = bar_to_ms(bar)
+        self.path = os.path.join(state_dir, f"{inst_id}_{bar}_{'_'.join(map(str, self.spans))}.json")
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    # ---------- 存储 ----------
+    def _empty(self):
+        return {"last_ts": 0, "count": 0, "ema": {}}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return self._empty()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [EMA] 读取EMA状态失败 {self.path}: {e}")
+            return self._empty()
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [EMA] 保存EMA状态失败 {self.path}: {e}")
+
+    # ---------- 计算 ----------
+    def _alpha(self, span):
+        return 2.0 / (span + 1)
+
+    def _apply(self, ema, close):
+        for span in self.spans:
+            key = str(span)
+            prev = ema.get(key)
+            ema[key] = close if prev is None else self._alpha(span) * close + (1 - self._alpha(span)) * prev
+
+    def update(self, klines):
+        """
+        用新完结的K线推进EMA状态
+
+        Returns:
+            int: 本次推进的K线数量
+        """
+        confirmed = sorted((k for k in klines if is_confirmed(k)), key=lambda k: int(k[0]))
+        if not confirmed:
+            return 0
+        with self._lock:
+            last_ts = self.state["last_ts"]
+            new_bars = [k for k in confirmed if int(k[0]) > last_ts]
+            if not new_bars:
+                return 0
+            contiguous = (last_ts and self.bar_ms is not None
+                          and int(new_bars[0][0]) == last_ts + self.bar_ms)
+            if not contiguous:
+                # 首次运行或中间缺K线：用传入的全部已完结K线重新预热
+                print(f"[{get_shanghai_time()}] [EMA] {self.inst_id} {self.bar} 使用{len(confirmed)}根历史K线预热EMA")
+                self.state = self._empty()
+                new_bars = confirmed
+            for k in new_bars:
+                self._apply(self.state["ema"], float(k[4]))
+            self.state["last_ts"] = int(new_bars[-1][0])
+            self.state["count"] += len(new_bars)
+            self._save()
+            return len(new_bars)
+
+    def is_ready(self):
+        """已累计的K线数量达到最长周期，EMA才可用"""
+        return self.state["count"] >= max(self.spans)
+
+    def values(self, live_price=None):
+        """span -> EMA值；live_price 不为None时附加一次临时更新（O(1)，可按tick调用）"""
+        with self._lock:
+            ema = dict(self.state["ema"])
+        if live_price is not None and ema:
+            self._apply(ema, float(live_price))
+        return {int(k): v for k, v in ema.items()}
+
+
+# 进程内按 (instId, bar, spans) 复用的状态实例
+_ema_states = {}
+
+def get_ema_state(inst_id, bar, spans=(13, 34, 89)):
+    key = (inst_id, bar, tuple(spans))
+    if key not in _ema_states:
+        _ema_states[key] = IncrementalEMA(inst_id, bar, spans)
+    return _ema_states[key]
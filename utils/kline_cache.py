@@ -0,0 +1,292 @@
+"""
+任务名称
+name: OKX K线缓存服务
+定时规则
+cron: 1 1 1 1 *
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone, timedelta
+from okx_clients import get_market_api
+from retry_policy import call_with_retry
+
+try:
+    import fcntl  # 跨进程文件锁（青龙/Linux环境）
+except ImportError:
+    fcntl = None
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+KLINE_CACHE_DIR = os.getenv("OKX_KLINE_CACHE_DIR", os.path.join(ROOT_DIR, "logs", "kline_cache"))
+MAX_CACHED_BARS = 1000      # 每个(标的, 周期, 价格类型)最多缓存的已完结K线数量
+MAX_FETCH_LIMIT = 300       # get_candlesticks 单次最大返回数量
+LIVE_BAR_TTL = 2.0          # 未完结K线的共享有效期(秒)，多个脚本同时启动时复用同一次请求
+
+# 价格类型 -> MarketAPI 方法名
+PRICE_TYPE_METHODS = {
+    "last": "get_candlesticks",
+    "mark": "get_mark_price_candlesticks",
+    "index": "get_index_candlesticks",
+}
+
+BAR_UNIT_MS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "H": 60 * 60 * 1000,
+    "D": 24 * 60 * 60 * 1000,
+    "W": 7 * 24 * 60 * 60 * 1000,
+}
+
+def get_shanghai_time(fmt="%Y-%m-%d %H:%M:%S"):
+    tz = timezone(timedelta(hours=8))
+    return datetime.now(tz).strftime(fmt)
+
+def bar_to_ms(bar):
+    """K线周期转毫秒，如 5m -> 300000；月线等不定长周期返回None"""
+    b = bar.replace("utc", "")
+    unit = b[-1:]
+    if unit not in BAR_UNIT_MS or not b[:-1].isdigit():
+        return None
+    return int(b[:-1]) * BAR_UNIT_MS[unit]
+
+def is_confirmed(kline):
+    """K线完结标志位于最后一个字段（普通K线索引8，标记/指数价格K线索引5）"""
+    return len(kline) >= 6 and kline[-1] == '1'
+
+
+class KlineCache:
+    """
+    K线缓存：按 (instId, bar, 价格类型) 持久化已完结K线，只增量拉取最新缓存之后的K线。
+    返回数据格式与OKX接口的 data 字段一致（最新在前），可直接替换 get_candlesticks 的返回。
+    """
+
+    def __init__(self, flag="0", cache_dir=KLINE_CACHE_DIR, market_api=None, max_bars=MAX_CACHED_BARS):
+        self.flag = str(flag)
+        # 模拟盘行情与实盘不同，单独目录存放
+        self.cache_dir = cache_dir if self.flag == "0" else os.path.join(cache_dir, "demo")
+        self.market_api = market_api
+        self.max_bars = max_bars
+        self._memory = {}  # key -> {"confirmed": [...], "live": kline, "live_fetched_at": ts}
+        self._lock = threading.Lock()
+        self._key_locks = {}  # 按key加锁，不同标的可并发拉取
+
+    # ---------- 存储 ----------
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _cache_path(self, key):
+        inst_id, bar, price_type = key
+        return os.path.join(self.cache_dir, f"{inst_id}_{bar}_{price_type}.json")
+
+    def _load(self, key):
+        path = self._cache_path(key)
+        if not os.path.exists(path):
+            return {"confirmed": [], "live": None, "live_fetched_at": 0}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [KLINE_CACHE] 读取缓存失败 {path}: {e}")
+            return {"confirmed": [], "live": None, "live_fetched_at": 0}
+
+    def _save(self, key, entry):
+        path = self._cache_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, separators=(",", ":"))
+            os.replace(tmp_path, path)  # 原子替换，避免并发读到半截文件
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [KLINE_CACHE] 保存缓存失败 {path}: {e}")
+
+    def _file_lock(self, key):
+        """返回已加锁的文件句柄（无fcntl时返回None）"""
+        if fcntl is None:
+            return None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            lock_file = open(f"{self._cache_path(key)}.lock", "w")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            return lock_file
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [KLINE_CACHE] 文件锁获取失败: {e}")
+            return None
+
+    # ---------- 拉取 ----------
+    def _get_market_api(self):
+        if self.market_api is None:
+            self.market_api = get_market_api(flag=self.flag)
+        return self.market_api
+
+    def _fetch(self, inst_id, bar, price_type, limit, after=""):
+        # 各K线接口按 retry_policy.ENDPOINT_LIMITS 限速，多标的并发扫描时共享同一令牌桶
+        endpoint = PRICE_TYPE_METHODS[price_type]
+        method = getattr(self._get_market_api(), endpoint)
+        result, error_msg = call_with_retry(lambda: method(instId=inst_id, bar=bar, limit=str(limit), after=after),
+                                            endpoint, "KLINE_CACHE")
+        if result and result.get('code') == '0' and 'data' in result:
+            print(f"[{get_shanghai_time()}] [KLINE_CACHE] 拉取 {inst_id} {bar} {price_type} {len(result['data'])}条 (limit={limit})")
+            return result['data']
+        print(f"[{get_shanghai_time()}] [KLINE_CACHE] 拉取{inst_id} K线失败: {error_msg}")
+        return None
+
+    def _fetch_range(self, inst_id, bar, price_type, count, after=""):
+        """拉取count根K线（after为空时从最新开始），超过单次上限时按after分页向前翻"""
+        rows = []
+        while len(rows) < count:
+            batch = self._fetch(inst_id, bar, price_type, min(count - len(rows), MAX_FETCH_LIMIT), after=after)
+            if batch is None:
+                return None if not rows else rows
+            if not batch:
+                break
+            rows.extend(batch)
+            after = batch[-1][0]
+        return rows
+
+    # ---------- 对外接口 ----------
+    def get_klines(self, inst_id, bar, limit, price_type="last", include_unconfirmed=True):
+        """
+        获取K线（最新在前）
+
+        Args:
+            inst_id: 交易标的
+            bar: K线周期
+            limit: 返回数量（含未完结K线）
+            price_type: last(成交价) / mark(标记价格) / index(指数价格)
+            include_unconfirmed: 是否在首位附带当前未完结K线
+
+        Returns:
+            list: 与OKX接口data字段同格式的K线列表，失败返回None
+        """
+        if price_type not in PRICE_TYPE_METHODS:
+            raise ValueError(f"不支持的价格类型: {price_type}")
+        limit = int(limit)
+        key = (inst_id, bar, price_type)
+        bar_ms = bar_to_ms(bar)
+        with self._key_lock(key):
+            lock_file = self._file_lock(key)
+            try:
+                entry = self._load(key)
+                confirmed = entry.get("confirmed", [])
+                newest_ts = int(confirmed[0][0]) if confirmed else 0
+                now_ms = int(time.time() * 1000)
+                need_confirmed = limit - 1 if include_unconfirmed else limit
+
+                # 已完结K线是否已是最新（下一根即为当前未完结K线）
+                fresh = bool(confirmed) and bar_ms is not None and now_ms < newest_ts + 2 * bar_ms
+                live = entry.get("live")
+                live_valid = (live is not None and int(live[0]) > newest_ts
+                              and time.time() - entry.get("live_fetched_at", 0) < LIVE_BAR_TTL)
+                enough = len(confirmed) >= need_confirmed
+
+                if enough and fresh and (live_valid or not include_unconfirmed):
+                    print(f"[{get_shanghai_time()}] [KLINE_CACHE] 命中缓存 {inst_id} {bar} {price_type}，无需请求")
+                else:
+                    fetched = []
+                    if not (fresh and (live_valid or not include_unconfirmed)):
+                        # 增量：只拉取最新缓存之后的K线，多拉1根做重叠校验；缺口过大则整体重建
+                        missing = (now_ms - newest_ts) // bar_ms + 1 if confirmed and bar_ms is not None else None
+                        rebuild = missing is None or missing > MAX_FETCH_LIMIT
+                        newer_count = need_confirmed + 1 if rebuild else missing
+                        newer = self._fetch_range(inst_id, bar, price_type, max(newer_count, 2))
+                        if newer is None:
+                            fetched = None
+                        else:
+                            fetched.extend(newer)
+                            if rebuild:
+                                confirmed = []
+                    if fetched is not None and confirmed and len(confirmed) < need_confirmed:
+                        # 缓存数量不足：只向前补齐更早的K线
+                        older = self._fetch_range(inst_id, bar, price_type, need_confirmed - len(confirmed), after=confirmed[-1][0])
+                        fetched = None if older is None else fetched + older
+
+                    if fetched is None:
+                        # 缓存已过期或缺少有效的未完结K线时不返回旧数据，避免策略按错位/过期的K线下单
+                        if not (enough and fresh and (live_valid or not include_unconfirmed)):
+                            print(f"[{get_shanghai_time()}] [KLINE_CACHE] {inst_id} {bar} 拉取失败，缓存已过期")
+                            return None
+                        print(f"[{get_shanghai_time()}] [KLINE_CACHE] {inst_id} {bar} 拉取失败，使用缓存数据")
+                    else:
+                        merged = {int(k[0]): k for k in confirmed}
+                        new_live = None
+                        for k in fetched:
+                            if is_confirmed(k):
+                                merged[int(k[0])] = k
+                            elif new_live is None or int(k[0]) > int(new_live[0]):
+                                new_live = k
+                        confirmed = [merged[ts] for ts in sorted(merged, reverse=True)][:self.max_bars]
+                        if new_live is None and live_valid:
+                            new_live = live  # 本次只补历史，未完结K线沿用共享值
+                        if new_live is not None and confirmed and int(new_live[0]) <= int(confirmed[0][0]):
+                            new_live = None
+                        entry = {
+                            "confirmed": confirmed,
+                            "live": new_live,
+                            "live_fetched_at": time.time() if new_live is not live else entry.get("live_fetched_at", 0),
+                        }
+                        self._save(key, entry)
+                self._memory[key] = entry
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+
+        result = []
+        if include_unconfirmed and entry.get("live") is not None:
+            result.append(entry["live"])
+        result.extend(confirmed[:limit - len(result)])
+        return result
+
+    def push_klines(self, inst_id, bar, klines, price_type="last"):
+        """
+        写入外部推送的K线（如WebSocket），已完结K线并入持久化缓存，未完结K线作为共享的当前K线
+
+        Args:
+            klines: 与OKX接口data字段同格式的K线列表
+        """
+        key = (inst_id, bar, price_type)
+        bar_ms = bar_to_ms(bar)
+        with self._key_lock(key):
+            lock_file = self._file_lock(key)
+            try:
+                entry = self._load(key)
+                merged = {int(k[0]): k for k in entry.get("confirmed", [])}
+                live = entry.get("live")
+                live_fetched_at = entry.get("live_fetched_at", 0)
+                for k in sorted(klines, key=lambda x: int(x[0])):
+                    if is_confirmed(k):
+                        ts = int(k[0])
+                        # 推送中断导致与缓存不连续时丢弃旧缓存，由get_klines向前补齐，避免中间缺K线
+                        if merged and bar_ms is not None and ts > max(merged) + bar_ms:
+                            merged = {}
+                        merged[ts] = k
+                    elif live is None or int(k[0]) >= int(live[0]):
+                        live, live_fetched_at = k, time.time()
+                confirmed = [merged[ts] for ts in sorted(merged, reverse=True)][:self.max_bars]
+                if live is not None and confirmed and int(live[0]) <= int(confirmed[0][0]):
+                    live = None
+                entry = {"confirmed": confirmed, "live": live, "live_fetched_at": live_fetched_at}
+                self._save(key, entry)
+                self._memory[key] = entry
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+
+
+# 按flag复用的全局缓存实例
+_kline_caches = {}
+
+def get_kline_cache(flag="0"):
+    flag = str(flag) if flag is not None else "0"
+    if flag not in _kline_caches:
+        _kline_caches[flag] = KlineCache(flag=flag)
+    return _kline_caches[flag]
+
+def get_cached_klines(inst_id, bar, limit, price_type="last", flag="0", include_unconfirmed=True):
+    """便捷函数：通过全局缓存获取K线（最新在前）"""
+    return get_kline_cache(flag).get_klines(inst_id, bar, limit, price_type, include_unconfirmed)
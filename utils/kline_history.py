@@ -0,0 +1,73 @@
+"""
+任务名称
+name: OKX 历史K线加载
+定时规则
+cron: 1 1 1 1 *
+说明：回测用历史K线，按 (instId, bar) 缓存为本地CSV，再次加载只请求缺少的部分。
+"""
+import os
+import csv
+import time
+from datetime import datetime, timezone, timedelta
+from kline_cache import bar_to_ms
+from okx_clients import get_market_api
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HISTORY_DIR = os.path.join(ROOT_DIR, "logs", "backtest")
+HISTORY_PAGE_LIMIT = 100      # get_history_candlesticks 单次最大返回数量
+MAX_RETRIES = 3
+RETRY_DELAY = 2
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def fetch_history_page(market_api, inst_id, bar, after=""):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            result = market_api.get_history_candlesticks(instId=inst_id, bar=bar, after=after, limit=str(HISTORY_PAGE_LIMIT))
+            if result and result.get('code') == '0' and 'data' in result:
+                return result['data']
+            error_msg = result.get('msg', '') if result else '无响应'
+            print(f"[{get_beijing_time()}] [HISTORY] 获取{inst_id}历史K线失败: {error_msg}")
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [HISTORY] 获取{inst_id}历史K线异常 (尝试 {attempt+1}/{MAX_RETRIES+1}): {str(e)}")
+        if attempt < MAX_RETRIES:
+            time.sleep(RETRY_DELAY)
+    return None
+
+def load_history(inst_id, bar, days=365):
+    """加载最近days天的已完结K线，本地CSV已有的部分不再请求"""
+    path = os.path.join(HISTORY_DIR, f"{inst_id}_{bar}.csv")
+    rows = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                rows[int(row[0])] = row
+    start_ms = int((time.time() - days * 86400) * 1000)
+    market_api = get_market_api(flag="0")
+
+    # 先从最新往前补到本地最新一根，再从本地最早一根往前补到起始时间
+    newest = max(rows) if rows else None
+    ranges = [("", newest if newest is not None else start_ms)]
+    if rows and min(rows) > start_ms + bar_to_ms(bar):
+        ranges.append((str(min(rows)), start_ms))
+    for after, stop_ms in ranges:
+        while True:
+            page = fetch_history_page(market_api, inst_id, bar, after)
+            if not page:
+                break
+            for k in page:
+                if k[-1] == '1':
+                    rows[int(k[0])] = k[:5]
+            oldest = int(page[-1][0])
+            print(f"[{get_beijing_time()}] [HISTORY] {inst_id} {bar} 已加载至 {datetime.fromtimestamp(oldest / 1000)}，共{len(rows)}根")
+            if oldest <= stop_ms:
+                break
+            after = page[-1][0]
+
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows[ts][:5] for ts in sorted(rows))
+    return [rows[ts] for ts in sorted(rows) if ts >= start_ms]
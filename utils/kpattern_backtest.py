@@ -0,0 +1,99 @@
+"""
+任务名称
+name: K线形态策略回测引擎
+定时规则
+cron: 1 1 1 1 *
+说明：eth_K6_strategy 与 vine_k8_strategy_v4 的向量化信号计算，成交与止盈止损复用 amplitude_backtest.run_signals。
+信号K线收盘价挂限价单，ohlc 为 klines_to_ohlc 返回的升序数组。
+"""
+import numpy as np
+from amplitude_backtest import OPEN, CLOSE, run_signals
+
+def body_ratio(ohlc):
+    """实体比例 |close - open| / open"""
+    return np.abs(ohlc[:, CLOSE] - ohlc[:, OPEN]) / ohlc[:, OPEN]
+
+def candle_direction(ohlc):
+    """阳线1 / 阴线-1 / 十字0"""
+    return np.sign(ohlc[:, CLOSE] - ohlc[:, OPEN]).astype(int)
+
+def prev_sum(values, first, count):
+    """result[i] = values[i-first] + ... + values[i-first-count+1]，不足部分为NaN"""
+    cs = np.concatenate([[0.0], np.cumsum(values)])
+    i = np.arange(len(values))
+    hi = i - first + 1
+    lo = hi - count
+    out = np.full(len(values), np.nan)
+    valid = lo >= 0
+    out[valid] = cs[hi[valid]] - cs[lo[valid]]
+    return out
+
+def ema(values, span):
+    """与 pandas ewm(span, adjust=False) 一致的EMA"""
+    alpha = 2.0 / (span + 1)
+    out = np.empty(len(values))
+    acc = values[0] if len(values) else 0.0
+    for i, v in enumerate(values):
+        acc = alpha * v + (1 - alpha) * acc
+        out[i] = acc
+    return out
+
+def k6_signals(ohlc, min_body1, max_body1, max_total_range):
+    """
+    eth_K6_strategy：信号K线(k1)实体在区间内，前4根(k2~k5)实体之和小于上限，方向取k2
+    """
+    body = body_ratio(ohlc)
+    direction = candle_direction(ohlc)
+    total_range = prev_sum(body, 1, 4)
+    side = np.zeros(len(ohlc), dtype=int)
+    side[1:] = direction[:-1]
+    ok = (body > min_body1) & (body < max_body1) & (total_range < max_total_range) & (side != 0)
+    bars = np.nonzero(ok)[0]
+    bars = bars[bars < len(ohlc) - 1]
+    return bars, side[bars], ohlc[bars, CLOSE]
+
+def k8_signals(ohlc, min_body1, max_body1, max_total_range, ema_short=13, ema_mid=34, ema_long=89,
+               enable_trend_filter=True, trend=None):
+    """
+    vine_k8_strategy_v4：信号K线(k0)实体在区间内，前5根实体之和小于上限，k0与k1同向，方向取k0；
+    开启趋势过滤时要求 EMA短>中>长（做多）或 短<中<长（做空）
+
+    Args:
+        trend: 预先计算的 k8_trend 结果，参数扫描时复用
+    """
+    body = body_ratio(ohlc)
+    direction = candle_direction(ohlc)
+    total_range = prev_sum(body, 1, 5)
+    prev_direction = np.concatenate([[0], direction[:-1]])
+    ok = (body > min_body1) & (body < max_body1) & (total_range < max_total_range)
+    ok &= (direction != 0) & (direction == prev_direction)
+    if enable_trend_filter:
+        if trend is None:
+            trend = k8_trend(ohlc, ema_short, ema_mid, ema_long)
+        ok &= trend == direction
+        ok[:ema_long] = False  # 线上K线数量不足最长EMA周期时不开仓
+    bars = np.nonzero(ok)[0]
+    bars = bars[bars < len(ohlc) - 1]
+    return bars, direction[bars], ohlc[bars, CLOSE]
+
+def k8_trend(ohlc, ema_short=13, ema_mid=34, ema_long=89):
+    """EMA多空排列：多头1 / 空头-1 / 震荡0"""
+    close = ohlc[:, CLOSE]
+    s, m, l = ema(close, ema_short), ema(close, ema_mid), ema(close, ema_long)
+    return np.where((s > m) & (m > l), 1, np.where((s < m) & (m < l), -1, 0))
+
+def backtest_k6(ohlc, min_body1, max_body1, max_total_range, take_profit_percent, stop_loss_percent,
+                expiry_bars=12, fee_rate=0.0, max_hold_bars=None):
+    ohlc = np.asarray(ohlc, dtype=float)
+    bars, sides, limits = k6_signals(ohlc, min_body1, max_body1, max_total_range)
+    return run_signals(ohlc, bars, sides, limits, take_profit_percent, stop_loss_percent,
+                       expiry_bars, fee_rate, max_hold_bars)
+
+def backtest_k8(ohlc, min_body1, max_body1, max_total_range, take_profit_percent, stop_loss_percent,
+                ema_short=13, ema_mid=34, ema_long=89, enable_trend_filter=True,
+                expiry_bars=12, fee_rate=0.0, max_hold_bars=None, trend=None):
+    ohlc = np.asarray(ohlc, dtype=float)
+    bars, sides, limits = k8_signals(ohlc, min_body1, max_body1, max_total_range,
+                                     ema_short, ema_mid, ema_long, enable_trend_filter, trend)
+    return run_signals(ohlc, bars, sides, limits, take_profit_percent, stop_loss_percent,
+                       expiry_bars, fee_rate, max_hold_bars)
@@ -0,0 +1,261 @@
+"""
+任务名称
+name: 延迟埋点与直方图
+定时规则
+cron: 1 1 1 1 *
+说明：span() 上下文管理器 / timed() 装饰器 / record() 记录耗时，按 (指标名, 标签) 聚合为固定分桶直方图。
+进程退出时把本次的直方图累加到 logs/metrics/latency.json，并输出 Prometheus 文本格式 latency.prom
+（可由 node_exporter textfile collector 采集）；常驻进程可用 start_metrics_server 直接暴露 /metrics。
+"""
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+try:
+    import fcntl  # 跨进程文件锁（青龙/Linux环境）
+except ImportError:
+    fcntl = None
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+METRICS_DIR = os.getenv("OKX_METRICS_DIR", os.path.join(ROOT_DIR, "logs", "metrics"))
+METRICS_ENABLED = os.getenv("OKX_METRICS", "1") != "0"
+# 直方图分桶上界（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "okx_latency_seconds"
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Histogram:
+    def __init__(self, counts=None, total=0.0, count=0):
+        self.counts = list(counts) if counts else [0] * (len(BUCKETS) + 1)  # 最后一个为 +Inf
+        self.total = total
+        self.count = count
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        self.count += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.count += other.count
+
+    def quantile(self, q):
+        """按分桶上界估算分位数"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts[:-1]):
+            seen += c
+            if seen >= target:
+                return BUCKETS[i]
+        return float("inf")
+
+    def to_dict(self):
+        return {"counts": self.counts, "sum": self.total, "count": self.count}
+
+
+class LatencyRegistry:
+    def __init__(self):
+        self._hists = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def record(self, name, seconds, **labels):
+        if not METRICS_ENABLED or seconds is None or seconds < 0:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._hists:
+                self._hists[key] = Histogram()
+            self._hists[key].observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: Histogram(h.counts, h.total, h.count) for k, h in self._hists.items()}
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def drain(self):
+        """原子地取走当前的全部直方图，之后记录的数据进入新的字典，不会丢失"""
+        with self._lock:
+            hists, self._hists = self._hists, {}
+        return hists
+
+    def restore(self, hists):
+        """把 drain() 取走但未能落盘的直方图合并回来"""
+        with self._lock:
+            for key, h in hists.items():
+                self._hists.setdefault(key, Histogram()).merge(h)
+
+
+registry = LatencyRegistry()
+# 落盘与 /metrics 读取互斥：落盘期间数据已从内存取走但可能尚未写入文件（或已写入但 /metrics 仍会合并内存），
+# 不加锁时抓取会漏算或重复计算，Prometheus 计数器出现回退
+_dump_lock = threading.Lock()
+
+def record(name, seconds, **labels):
+    """记录一次耗时（秒）"""
+    registry.record(name, seconds, **labels)
+
+@contextmanager
+def span(name, **labels):
+    """
+    计时上下文：
+        with span("place_order", account=account_name):
+            ...
+    异常时额外带上 error="1" 标签
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException:
+        error = "1"
+        raise
+    finally:
+        record(name, time.perf_counter() - start, error=error, **labels)
+
+def timed(name=None, **labels):
+    """计时装饰器，name 默认为函数名"""
+    def decorator(func):
+        metric = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(metric, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ========== 导出 ==========
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(hists):
+    lines = [f"# HELP {METRIC_PREFIX} OKX交易流程各阶段耗时", f"# TYPE {METRIC_PREFIX} histogram"]
+    for (name, labels), h in sorted(hists.items()):
+        base = [("stage", name)] + list(labels)
+        label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in base)
+        cumulative = 0
+        for bound, c in zip(list(BUCKETS) + ["+Inf"], h.counts):
+            cumulative += c
+            lines.append(f'{METRIC_PREFIX}_bucket{{{label_str},le="{bound}"}} {cumulative}')
+        lines.append(f"{METRIC_PREFIX}_sum{{{label_str}}} {h.total:.6f}")
+        lines.append(f"{METRIC_PREFIX}_count{{{label_str}}} {h.count}")
+    return "\n".join(lines) + "\n"
+
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[{get_beijing_time()}] [METRICS] 读取指标文件失败: {e}")
+        return {}
+    hists = {}
+    for item in data.get("histograms", []):
+        if len(item["counts"]) != len(BUCKETS) + 1:
+            continue  # 分桶配置变化后丢弃旧数据
+        key = (item["name"], tuple(tuple(x) for x in item["labels"]))
+        hists[key] = Histogram(item["counts"], item["sum"], item["count"])
+    return hists
+
+def dump_metrics(metrics_dir=METRICS_DIR):
+    """把本进程的直方图累加到磁盘上的汇总，并重写Prometheus文本文件"""
+    with _dump_lock:
+        return _dump_locked(metrics_dir)
+
+def _dump_locked(metrics_dir):
+    local = registry.drain()
+    if not local:
+        return None
+    state_path = os.path.join(metrics_dir, "latency.json")
+    prom_path = os.path.join(metrics_dir, "latency.prom")
+    lock_file = None
+    persisted = False
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        if fcntl is not None:
+            lock_file = open(f"{state_path}.lock", "w")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        merged = _load_state(state_path)
+        for key, h in local.items():
+            merged.setdefault(key, Histogram()).merge(h)
+        data = {"updated": get_beijing_time(), "buckets": list(BUCKETS),
+                "histograms": [dict(name=k[0], labels=[list(x) for x in k[1]], **h.to_dict()) for k, h in merged.items()]}
+        for path, content in ((state_path, json.dumps(data, ensure_ascii=False)), (prom_path, render_prometheus(merged))):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            persisted = True  # latency.json 已写入，之后 latency.prom 失败也不能再放回内存
+        return prom_path
+    except Exception as e:
+        print(f"[{get_beijing_time()}] [METRICS] 保存指标失败: {e}")
+        if not persisted:
+            registry.restore(local)
+        return None
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+def print_summary(hists=None):
+    hists = registry.snapshot() if hists is None else hists
+    for (name, labels), h in sorted(hists.items()):
+        label_str = " ".join(f"{k}={v}" for k, v in labels)
+        p50, p99 = h.quantile(0.5), h.quantile(0.99)
+        print(f"[{get_beijing_time()}] [METRICS] {name} {label_str} n={h.count} "
+              f"avg={h.total / h.count * 1000:.1f}ms p50<={p50 * 1000:.0f}ms p99<={p99 * 1000:.0f}ms")
+
+if METRICS_ENABLED:
+    atexit.register(dump_metrics)
+
+# ========== HTTP 暴露 ==========
+def start_metrics_server(port, host="0.0.0.0"):
+    """常驻进程使用：后台线程提供 GET /metrics（磁盘汇总 + 本进程尚未落盘的数据）"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            with _dump_lock:
+                hists = _load_state(os.path.join(METRICS_DIR, "latency.json"))
+                for key, h in registry.snapshot().items():
+                    hists.setdefault(key, Histogram()).merge(h)
+            body = render_prometheus(hists).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[{get_beijing_time()}] [METRICS] 指标服务已启动: http://{host}:{port}/metrics")
+    return server
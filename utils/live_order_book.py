@@ -0,0 +1,194 @@
+"""
+任务名称
+name: 内存未成交订单簿
+定时规则
+cron: 1 1 1 1 *
+说明：常驻委托监控在内存中维护各账户未成交开仓单及其止盈触发价，由私有 orders 频道推送与REST快照更新，
+收到最新价时直接在内存中判断哪些订单的止盈价已被越过，无需再请求交易所。
+"""
+import bisect
+import threading
+from strategy_base import order_take_profit, cancel_reason, PRICE_TOLERANCE
+
+LIVE_STATES = {"live"}                            # 监控的订单状态（与 get_pending_orders 一致）
+TOMBSTONE_LIMIT = 5000                            # 已完结订单的 uTime 记录上限，用于丢弃迟到的旧状态
+
+
+class LiveOrder:
+    __slots__ = ("account", "inst_id", "ord_id", "cl_ord_id", "side", "pos_side", "px", "direction",
+                 "take_profit_price", "u_time", "order")
+
+    def __init__(self, account, order, direction, take_profit_price):
+        self.account = account
+        self.inst_id = order.get("instId")
+        self.ord_id = order.get("ordId")
+        self.cl_ord_id = order.get("clOrdId", "")
+        self.side = order.get("side")
+        self.pos_side = order.get("posSide", "")
+        self.px = float(order.get("px") or 0)
+        self.direction = direction
+        self.take_profit_price = take_profit_price
+        self.u_time = int(order.get("uTime") or 0)
+        self.order = order
+
+    @property
+    def key(self):
+        return self.account, self.ord_id
+
+
+class _InstrumentIndex:
+    """
+    单个标的的订单索引：按止盈触发价升序的两个有序数组
+    - longs: 做多单在价格上穿止盈价时撤销，被越过的总是数组开头的一段
+    - shorts: 做空单在价格下穿止盈价时撤销，被越过的总是数组末尾的一段
+    撤销中的订单移出数组（仍保留在 orders 中），撤单失败时放回
+    """
+
+    def __init__(self):
+        self.orders = {}    # (account, ordId) -> LiveOrder
+        self.longs = []     # [(止盈价, (account, ordId))]
+        self.shorts = []
+
+    def _side(self, order):
+        return self.longs if order.direction == "long" else self.shorts
+
+    def insert(self, order):
+        bisect.insort(self._side(order), (order.take_profit_price, order.key))
+
+    def unlink(self, order):
+        """从有序数组中移除，不在数组中（撤销中）时忽略"""
+        arr = self._side(order)
+        item = (order.take_profit_price, order.key)
+        i = bisect.bisect_left(arr, item)
+        if i < len(arr) and arr[i] == item:
+            del arr[i]
+
+
+class LiveOrderBook:
+    """
+    - apply(account, order): 处理一条推送/快照订单，状态非 live 或无止盈价的开仓单从簿中移除
+    - replace(account, inst_id, orders, snapshot_ms): 用REST快照校正某账户某标的的全部订单
+    - crossed(inst_id, price): 返回止盈价已被越过的订单并标记为撤销中（不会被重复返回）
+    - release(order): 撤单失败后取消撤销中标记，下次价格更新时重新判断
+    每个标的按止盈价维护有序数组，价格更新时只访问被越过的订单：增删 O(log n)，判断 O(log n + k)
+    """
+
+    def __init__(self, price_tolerance=PRICE_TOLERANCE):
+        self.price_tolerance = price_tolerance
+        self._index = {}        # inst_id -> _InstrumentIndex
+        self._done = {}         # (account, ordId) -> 完结时的 uTime
+        self._canceling = set()
+        self._lock = threading.Lock()
+
+    def _inst(self, inst_id):
+        if inst_id not in self._index:
+            self._index[inst_id] = _InstrumentIndex()
+        return self._index[inst_id]
+
+    def _discard(self, index, key):
+        order = index.orders.pop(key, None)
+        if order is not None:
+            index.unlink(order)
+        self._canceling.discard(key)
+
+    def apply(self, account, order):
+        """返回订单在簿中的新状态：LiveOrder 或 None（已移除/不监控）"""
+        key = (account, order.get("ordId"))
+        u_time = int(order.get("uTime") or 0)
+        with self._lock:
+            index = self._inst(order.get("instId"))
+            current = index.orders.get(key)
+            # 推送与快照可能乱序到达，只接受比已知状态更新的数据
+            if (current is not None and u_time < current.u_time) or u_time < self._done.get(key, -1):
+                return current
+            direction, take_profit_price = order_take_profit(order)
+            if order.get("state") in LIVE_STATES and direction and take_profit_price:
+                live = LiveOrder(account, order, direction, take_profit_price)
+                if current is not None and key not in self._canceling:
+                    index.unlink(current)
+                index.orders[key] = live
+                if key not in self._canceling:
+                    index.insert(live)
+                return live
+            self._discard(index, key)
+            if order.get("state") not in LIVE_STATES:
+                self._mark_done(key, u_time)
+            return None
+
+    def _mark_done(self, key, u_time):
+        self._done[key] = u_time
+        if len(self._done) > TOMBSTONE_LIMIT:
+            for old in sorted(self._done, key=self._done.get)[:len(self._done) - TOMBSTONE_LIMIT]:
+                del self._done[old]
+
+    def replace(self, account, inst_id, orders, snapshot_ms):
+        """
+        用REST快照校正：快照中没有、且最后更新早于快照请求时间(snapshot_ms)的订单视为已完结，
+        快照请求发出后才由推送加入的新订单不受影响
+        """
+        snapshot_ids = {o.get("ordId") for o in orders}
+        for order in orders:
+            self.apply(account, dict(order, instId=order.get("instId") or inst_id))
+        with self._lock:
+            index = self._inst(inst_id)
+            for key, order in list(index.orders.items()):
+                if key[0] == account and key[1] not in snapshot_ids and order.u_time <= snapshot_ms:
+                    self._discard(index, key)
+
+    def remove(self, order):
+        with self._lock:
+            self._discard(self._inst(order.inst_id), order.key)
+
+    def crossed(self, inst_id, price):
+        """
+        Returns:
+            list: [(LiveOrder, 撤销原因)]
+        """
+        hits = []
+        with self._lock:
+            index = self._index.get(inst_id)
+            if index is None:
+                return hits
+            # 做多单：从止盈价最低的一端取，直到遇到未被越过的订单
+            n = 0
+            for tp, key in index.longs:
+                reason = cancel_reason("long", price, tp, self.price_tolerance)
+                if not reason:
+                    break
+                hits.append((index.orders[key], reason))
+                n += 1
+            del index.longs[:n]
+            # 做空单：从止盈价最高的一端取
+            n = 0
+            for tp, key in reversed(index.shorts):
+                reason = cancel_reason("short", price, tp, self.price_tolerance)
+                if not reason:
+                    break
+                hits.append((index.orders[key], reason))
+                n += 1
+            if n:
+                del index.shorts[-n:]
+            self._canceling.update(order.key for order, _ in hits)
+        return hits
+
+    def release(self, order):
+        with self._lock:
+            if order.key not in self._canceling:
+                return
+            self._canceling.discard(order.key)
+            index = self._inst(order.inst_id)
+            current = index.orders.get(order.key)
+            if current is not None:
+                index.insert(current)
+
+    def orders(self, inst_id=None, account=None):
+        with self._lock:
+            if inst_id:
+                indexes = [self._index[inst_id]] if inst_id in self._index else []
+            else:
+                indexes = list(self._index.values())
+            return [o for index in indexes for o in index.orders.values() if account is None or o.account == account]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(index.orders) for index in self._index.values())
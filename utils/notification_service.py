@@ -8,9 +8,257 @@ cron: 1 1 1 1 *
 import os
 import json
 import time
+import queue
+import atexit
+import threading
 import requests
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any
+try:
+    import fcntl  # 跨进程文件锁（青龙/Linux环境）
+except ImportError:
+    fcntl = None
+try:
+    from latency_metrics import record as record_latency  # utils目录不在路径中时不统计
+except ImportError:
+    record_latency = None
+
+# ========== 异步发送配置 ==========
+NOTIFY_ASYNC = os.getenv("NOTIFY_ASYNC", "1") != "0"              # 0 时退回同步发送（调试用）
+COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", "1.5"))  # 同一分组在该窗口(秒)内的消息合并为一条
+FLUSH_TIMEOUT = 30                                                 # 进程退出时等待队列发送完成的最长时间(秒)
+
+# ========== 去重与限流配置 ==========
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(_MODULE_DIR) if os.path.basename(_MODULE_DIR) == "utils" else _MODULE_DIR
+NOTIFY_STATE_PATH = os.getenv("NOTIFY_STATE_PATH", os.path.join(ROOT_DIR, "logs", "notify_state.json"))
+DEDUP_TTL = 6 * 3600  # 同一 (类型, 标的, K线时间) 的预警在该时间(秒)内只发送一次
+# 分组 -> (令牌数, 周期秒)，只限流振幅预警；未列出的分组不限流（交易、撤单通知不能被丢弃）
+GROUP_RATE_LIMITS = {
+    "OKX振幅监控": (10, 300),
+}
+
+
+class NotificationDispatcher:
+    """
+    后台通知队列：
+    - submit() 只入队，立即返回，交易线程不等待推送服务
+    - 后台线程按分组合并 COALESCE_WINDOW 内的消息，再调用 deliver(title, message, group, **extra) 发送
+    - 发送失败按 retry_delay * 2^n 退避重试
+    - 进程退出时自动 flush，尽量把队列中的消息发完
+    """
+
+    def __init__(self, deliver, window: float = COALESCE_WINDOW, max_retries: int = 3, retry_delay: float = 2,
+                 on_done=None):
+        self.deliver = deliver
+        self.on_done = on_done  # 每条（合并后）通知最终成功/失败时回调，用于统计
+        self.window = window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._flushing = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, title: str, message: str, group: Optional[str] = None, **extra):
+        self._queue.put((title, message, group, extra))
+        self._ensure_worker()
+
+    def _collect(self):
+        """取出一条消息后，在合并窗口内继续收集队列中的消息"""
+        items = [self._queue.get()]
+        deadline = time.time() + self.window
+        while not self._flushing.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        while True:  # 窗口结束时已在队列中的消息一并带走
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    @staticmethod
+    def _coalesce(items):
+        """按分组合并；带 url/copy 等附加参数的消息单独发送"""
+        merged, grouped = [], {}
+        for title, message, group, extra in items:
+            if extra:
+                merged.append((title, message, group, extra))
+            else:
+                grouped.setdefault(group, []).append((title, message))
+        for group, msgs in grouped.items():
+            if len(msgs) == 1:
+                merged.append((msgs[0][0], msgs[0][1], group, {}))
+            else:
+                title = f"{msgs[0][0]} 等{len(msgs)}条通知"
+                message = "\n\n──────────\n\n".join(f"【{t}】\n{m}" for t, m in msgs)
+                merged.append((title, message, group, {}))
+        return merged
+
+    def _send(self, title, message, group, extra):
+        start = time.perf_counter()
+        ok = self._try_send(title, message, group, extra)
+        if record_latency is not None:
+            record_latency("notify_deliver", time.perf_counter() - start, group=group, success=int(ok))
+        if self.on_done:
+            self.on_done(ok)
+        return ok
+
+    def _try_send(self, title, message, group, extra):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.deliver(title, message, group, **extra):
+                    return True
+            except Exception as e:
+                print(f"[{get_beijing_time()}] [NOTIFICATION] [QUEUE] 发送异常 (尝试 {attempt+1}/{self.max_retries+1}): {str(e)}")
+            if attempt < self.max_retries:
+                time.sleep(self.retry_delay * (2 ** attempt))
+        print(f"[{get_beijing_time()}] [NOTIFICATION] [QUEUE] 所有尝试失败，丢弃通知: {title}")
+        return False
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            try:
+                for title, message, group, extra in self._coalesce(items):
+                    self._send(title, message, group, extra)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+        """
+        等待队列中的通知发送完成（跳过合并窗口）
+
+        Returns:
+            bool: 是否在超时前全部发送完成
+        """
+        if not self.pending():
+            return True
+        self._flushing.set()
+        try:
+            deadline = time.time() + timeout
+            while self.pending() and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            self._flushing.clear()
+        if self.pending():
+            print(f"[{get_beijing_time()}] [NOTIFICATION] [QUEUE] 等待{timeout}秒后仍有{self.pending()}条通知未发送")
+            return False
+        return True
+
+
+def get_beijing_time() -> str:
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AlertStateStore:
+    """
+    磁盘上的通知状态，青龙每次运行都是新进程，状态需落盘才能跨次生效：
+    - dedup: 去重键 -> 过期时间戳
+    - buckets: 分组 -> [剩余令牌, 更新时间]，令牌桶按 GROUP_RATE_LIMITS 补充
+    多个脚本并发时用 fcntl 文件锁串行化读写
+    """
+
+    def __init__(self, path: str = NOTIFY_STATE_PATH, dedup_ttl: float = DEDUP_TTL,
+                 rate_limits: Optional[Dict[str, tuple]] = None):
+        self.path = path
+        self.dedup_ttl = dedup_ttl
+        self.rate_limits = GROUP_RATE_LIMITS if rate_limits is None else rate_limits
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            lock_file = None
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                if fcntl is not None:
+                    lock_file = open(f"{self.path}.lock", "w")
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except Exception as e:
+                print(f"[{get_beijing_time()}] [NOTIFICATION] [STATE] 文件锁获取失败: {e}")
+            try:
+                yield
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [NOTIFICATION] [STATE] 读取通知状态失败: {e}")
+            state = {}
+        state.setdefault("dedup", {})
+        state.setdefault("buckets", {})
+        return state
+
+    def _save(self, state: dict):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [NOTIFICATION] [STATE] 保存通知状态失败: {e}")
+
+    def check(self, dedup_key: Optional[str] = None, group: Optional[str] = None) -> tuple:
+        """
+        判断一条通知是否可以发送，可以发送时同时记录去重键并消耗令牌
+
+        Returns:
+            (bool, str): (是否发送, 不发送的原因)
+        """
+        limit = self.rate_limits.get(group)
+        if dedup_key is None and limit is None:
+            return True, ""
+        now = time.time()
+        with self._locked():
+            state = self._load()
+            dedup = {k: v for k, v in state["dedup"].items() if v > now}  # 顺便清理过期键
+            if dedup_key is not None and dedup_key in dedup:
+                return False, f"重复预警({dedup_key})"
+            bucket = None
+            if limit is not None:
+                rate, per = limit
+                tokens, updated = state["buckets"].get(group, [float(rate), now])
+                tokens = min(float(rate), tokens + (now - updated) * rate / per)
+                if tokens < 1:
+                    state["buckets"][group] = [tokens, now]
+                    state["dedup"] = dedup
+                    self._save(state)
+                    return False, f"分组{group}超出限流({rate}条/{per}秒)"
+                bucket = [tokens - 1, now]
+            if dedup_key is not None:
+                dedup[dedup_key] = now + self.dedup_ttl
+            if bucket is not None:
+                state["buckets"][group] = bucket
+            state["dedup"] = dedup
+            self._save(state)
+        return True, ""
+
 
 class NotificationService:
     """通知服务类"""
@@ -36,6 +284,13 @@ class NotificationService:
         self.notification_count = 0
         self.success_count = 0
         self.failed_count = 0
+
+        # 后台发送队列，重试/退避由队列负责
+        self.async_mode = NOTIFY_ASYNC
+        self.alert_state = AlertStateStore()
+        self.suppressed_count = 0
+        self.dispatcher = NotificationDispatcher(self._post_bark, max_retries=self.max_retries,
+                                                 retry_delay=self.retry_delay, on_done=self._record)
     
     def get_beijing_time(self) -> str:
         """获取北京时间"""
@@ -44,9 +299,10 @@ class NotificationService:
     
     def send_bark_notification(self, title: str, message: str, group: Optional[str] = None, 
                               sound: str = "bell", badge: Optional[int] = None, 
-                              url: Optional[str] = None, copy: Optional[str] = None) -> bool:
+                              url: Optional[str] = None, copy: Optional[str] = None,
+                              block: bool = False, dedup_key: Optional[str] = None) -> bool:
         """
-        发送Bark通知
+        发送Bark通知（默认放入后台队列，立即返回）
         
         Args:
             title: 通知标题
@@ -56,14 +312,52 @@ class NotificationService:
             badge: 角标数字（可选）
             url: 点击跳转链接（可选）
             copy: 复制内容（可选）
+            block: 是否同步发送并等待结果
+            dedup_key: 去重键（可选），DEDUP_TTL 内相同键只发送一次
             
         Returns:
-            bool: 发送是否成功
+            bool: 同步发送时为是否成功；异步时为是否已入队
         """
         if not self.bark_key:
             print(f"[{self.get_beijing_time()}] [NOTIFICATION] [ERROR] 缺少BARK_KEY配置")
             return False
         
+        # 去重与分组限流，被拦截的通知不发出HTTP请求
+        allowed, reason = self.alert_state.check(dedup_key, group if group else self.bark_group)
+        if not allowed:
+            self.suppressed_count += 1
+            print(f"[{self.get_beijing_time()}] [NOTIFICATION] 跳过通知 {title}: {reason}")
+            return False
+        
+        # 只传非默认的附加参数，便于队列合并同组消息
+        extra = {k: v for k, v in {'sound': sound if sound != "bell" else None, 'badge': badge,
+                                   'url': url, 'copy': copy}.items() if v is not None}
+        if self.async_mode and not block:
+            self.dispatcher.submit(title, message, group, **extra)
+            return True
+        
+        for attempt in range(self.max_retries + 1):
+            if self._post_bark(title, message, group, **extra):
+                self._record(True)
+                return True
+            if attempt < self.max_retries:
+                print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 重试中... ({attempt+1}/{self.max_retries})")
+                time.sleep(self.retry_delay)
+        print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 所有尝试失败")
+        self._record(False)
+        return False
+
+    def _record(self, ok: bool):
+        self.notification_count += 1
+        if ok:
+            self.success_count += 1
+        else:
+            self.failed_count += 1
+
+    def _post_bark(self, title: str, message: str, group: Optional[str] = None,
+                   sound: str = "bell", badge: Optional[int] = None,
+                   url: Optional[str] = None, copy: Optional[str] = None) -> bool:
+        """单次POST到Bark，返回是否成功"""
         # 使用指定的分组或默认分组
         notification_group = group if group else self.bark_group
         
@@ -85,35 +379,25 @@ class NotificationService:
         
         headers = {'Content-Type': 'application/json'}
         
-        # 发送通知
-        for attempt in range(self.max_retries + 1):
-            try:
-                response = requests.post(
-                    self.bark_key, 
-                    json=payload, 
-                    headers=headers, 
-                    timeout=self.timeout
-                )
-                
-                if response.status_code == 200:
-                    self.notification_count += 1
-                    self.success_count += 1
-                    print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 通知发送成功: {title}")
-                    return True
-                else:
-                    print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 发送失败: {response.text}")
-                    
-            except Exception as e:
-                print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 异常 (尝试 {attempt+1}/{self.max_retries+1}): {str(e)}")
-                
-            if attempt < self.max_retries:
-                print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 重试中... ({attempt+1}/{self.max_retries})")
-                time.sleep(self.retry_delay)
-        
-        self.notification_count += 1
-        self.failed_count += 1
-        print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 所有尝试失败")
+        try:
+            response = requests.post(
+                self.bark_key, 
+                json=payload, 
+                headers=headers, 
+                timeout=self.timeout
+            )
+            
+            if response.status_code == 200:
+                print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 通知发送成功: {title}")
+                return True
+            print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 发送失败: {response.text}")
+        except Exception as e:
+            print(f"[{self.get_beijing_time()}] [NOTIFICATION] [BARK] 异常: {str(e)}")
         return False
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+        """等待后台队列中的通知发送完成"""
+        return self.dispatcher.flush(timeout)
     
     def send_trading_notification(self, account_name: str, inst_id: str, signal_type: str, 
                                  entry_price: float, size: float, margin: float,
@@ -273,7 +557,8 @@ class NotificationService:
         return self.send_bark_notification(title, message, group="OKX委托监控")
     
     def send_amplitude_alert(self, symbol: str, amplitude: float, threshold: float,
-                           open_price: float, latest_price: float) -> bool:
+                           open_price: float, latest_price: float,
+                           bar_ts: Optional[Any] = None, alert_type: str = "amplitude") -> bool:
         """
         发送振幅预警通知
         
@@ -283,6 +568,8 @@ class NotificationService:
             threshold: 阈值
             open_price: 开盘价
             latest_price: 最新价
+            bar_ts: K线开盘时间戳（可选），传入时同一根K线只预警一次
+            alert_type: 预警类型，与 symbol、bar_ts 组成去重键
             
         Returns:
             bool: 发送是否成功
@@ -296,7 +583,8 @@ class NotificationService:
             f"最新价: {latest_price}"
         )
         
-        return self.send_bark_notification(title, message, group="OKX振幅监控")
+        dedup_key = f"{alert_type}:{symbol}:{bar_ts}" if bar_ts is not None else None
+        return self.send_bark_notification(title, message, group="OKX振幅监控", dedup_key=dedup_key)
     
     def send_summary_notification(self, results: list, total_canceled: int) -> bool:
         """
@@ -361,6 +649,7 @@ class NotificationService:
             "total_notifications": self.notification_count,
             "success_count": self.success_count,
             "failed_count": self.failed_count,
+            "suppressed_count": self.suppressed_count,
             "success_rate": (self.success_count / self.notification_count * 100) if self.notification_count > 0 else 0
         }
     
@@ -369,6 +658,7 @@ class NotificationService:
         self.notification_count = 0
         self.success_count = 0
         self.failed_count = 0
+        self.suppressed_count = 0
 
 # 创建全局通知服务实例
 notification_service = NotificationService()
@@ -394,8 +684,9 @@ if __name__ == "__main__":
     
     # 测试基本通知
     success = notification_service.send_test_notification("通知服务测试", "通知服务已成功启动！")
+    notification_service.flush()
     print(f"测试通知发送结果: {'成功' if success else '失败'}")
     
     # 显示统计信息
     stats = notification_service.get_statistics()
-    print(f"通知统计: {json.dumps(stats, indent=2, ensure_ascii=False)}") 
+    print(f"通知统计: {json.dumps(stats, indent=2, ensure_ascii=False)}") 
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+任务名称
+name: OKX API 客户端复用
+定时规则
+cron: 1 1 1 1 *
+说明：按 (API类型, 账户, flag) 缓存 python-okx 客户端实例，所有客户端共享同一个HTTP/2连接池，
+进程内重复调用不再重新建立TCP+TLS连接；请求经 rate_limiter 按接口限额跨进程排队。
+交易客户端使用较短的超时：下单超时后由 order_batch 按 clOrdId 核对，不会重复开仓。
+下单请求可通过 request_expiry() 附带 expTime 请求头，交易所在截止时间之后收到的请求直接拒绝。
+"""
+import os
+import threading
+import contextlib
+import contextvars
+import httpx
+import okx.Trade as Trade
+import okx.MarketData as MarketData
+import okx.Account as Account
+import okx.PublicData as PublicData
+from rate_limiter import RateLimitedTransport
+
+# 请求超时(秒)。httpx 默认5秒；交易接口超时后会按clOrdId查询核对，可以设得更短以便尽快进入核对
+HTTP_TIMEOUT = float(os.getenv("OKX_HTTP_TIMEOUT", "5"))
+TRADE_TIMEOUT = float(os.getenv("OKX_TRADE_TIMEOUT", "2"))
+CONNECT_TIMEOUT = float(os.getenv("OKX_CONNECT_TIMEOUT", "2"))
+
+# 支持 expTime 请求头的下单/改单接口
+EXP_TIME_PATHS = {"/api/v5/trade/order", "/api/v5/trade/batch-orders",
+                  "/api/v5/trade/amend-order", "/api/v5/trade/amend-batch-orders"}
+
+_clients = {}
+_transports = {}
+_lock = threading.Lock()
+_exp_time = contextvars.ContextVar("okx_exp_time", default=None)
+
+@contextlib.contextmanager
+def request_expiry(exp_time_ms):
+    """
+    with 块内当前线程发出的下单/改单请求附带 expTime（毫秒时间戳）：
+    交易所在该时间之后才收到的请求会被拒绝，过了截止时间仍查不到的订单就不会再出现
+    """
+    token = _exp_time.set(int(exp_time_ms))
+    try:
+        yield
+    finally:
+        _exp_time.reset(token)
+
+class ExpTimeTransport(httpx.BaseTransport):
+    """为下单/改单请求加上 expTime 请求头（不参与签名）"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request):
+        exp_time = _exp_time.get()
+        if exp_time is not None and request.method == "POST" and request.url.path in EXP_TIME_PATHS:
+            request.headers["expTime"] = str(exp_time)
+        return self.transport.handle_request(request)
+
+    def close(self):
+        self.transport.close()
+
+def _shared_transport(proxy=None):
+    """同一代理下共享的HTTP/2连接池（OKX签名在请求头中，不同账户可共用连接），外层按接口限速"""
+    if proxy not in _transports:
+        _transports[proxy] = RateLimitedTransport(ExpTimeTransport(httpx.HTTPTransport(http2=True, proxy=proxy)))
+    return _transports[proxy]
+
+def _share_pool(client, proxy=None):
+    # python-okx 的客户端继承自 httpx.Client，替换其底层transport即可共享连接池
+    old = getattr(client, "_transport", None)
+    if old is None:
+        return
+    client._transport = _shared_transport(proxy)
+    old.close()
+
+def get_client(api_cls, api_key="-1", secret_key="-1", passphrase="-1", flag="0", proxy=None):
+    """
+    获取缓存的API客户端
+
+    Args:
+        api_cls: Trade.TradeAPI / MarketData.MarketAPI / Account.AccountAPI / PublicData.PublicAPI 等
+        api_key/secret_key/passphrase: 不传时为无签名的公共接口客户端
+    """
+    key = (api_cls, str(api_key), str(secret_key), str(passphrase), str(flag), proxy)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = api_cls(str(api_key), str(secret_key), str(passphrase), None, str(flag), proxy=proxy)
+            _share_pool(client, proxy)
+            timeout = TRADE_TIMEOUT if api_cls is Trade.TradeAPI else HTTP_TIMEOUT
+            client.timeout = httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout))
+            _clients[key] = client
+        return client
+
+def get_trade_api(api_key, secret_key, passphrase, flag="0", proxy=None):
+    return get_client(Trade.TradeAPI, api_key, secret_key, passphrase, flag, proxy)
+
+def get_market_api(api_key="-1", secret_key="-1", passphrase="-1", flag="0", proxy=None):
+    return get_client(MarketData.MarketAPI, api_key, secret_key, passphrase, flag, proxy)
+
+def get_account_api(api_key, secret_key, passphrase, flag="0", proxy=None):
+    return get_client(Account.AccountAPI, api_key, secret_key, passphrase, flag, proxy)
+
+def get_public_api(flag="0", proxy=None):
+    return get_client(PublicData.PublicAPI, flag=flag, proxy=proxy)
@@ -5,16 +5,25 @@ name: OKX UTILS 工具
 cron: 1 1 1 1 *
 """
 import os
+import sys
 import json
 import random
 from re import T
 import string
-import time
 from datetime import datetime, timezone, timedelta
-import okx.MarketData as MarketData
-import okx.Trade as Trade
 import requests
 
+# utils目录加入路径，保证同目录模块以同一模块名加载（进程内只有一份缓存实例）
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+if UTILS_DIR not in sys.path:
+    sys.path.append(UTILS_DIR)
+from kline_cache import get_cached_klines
+import okx_clients
+from notification_service import NotificationDispatcher, NOTIFY_ASYNC
+from latency_metrics import timed
+from retry_policy import call_with_retry
+from order_batch import cancel_orders
+
 # ========== 环境与配置 ==========
 IS_DEVELOPMENT = True
 # try:
@@ -65,48 +74,39 @@ def get_env_var(var_name, suffix="", default=None):
         return default
 
 # ========== 3. 获取未成交订单 ==========
+@timed("okx_utils.get_orders_pending")
 def get_orders_pending(trade_api, inst_id, max_retries=3, retry_delay=2, account_prefix=""):
-    for attempt in range(max_retries + 1):
-        try:
-            result = trade_api.get_order_list(instId=inst_id, state="live")
-            print(f"[get_orders_pending][{get_shanghai_time()}] HTTP返回: {json.dumps(result, ensure_ascii=False)}")
-            if result and 'code' in result and result['code'] == '0' and 'data' in result:
-                return result['data']
-        except Exception as e:
-            print(f"[get_orders_pending][{get_shanghai_time()}] 异常: {e}")
-        if attempt < max_retries:
-            time.sleep(retry_delay)
+    """retry_delay 仅为兼容旧调用保留，退避间隔由 retry_policy 控制"""
+    result, error_msg = call_with_retry(lambda: trade_api.get_order_list(instId=inst_id, state="live"), "get_order_list",
+                                        "get_orders_pending", account_prefix, max_retries=max_retries)
+    print(f"[get_orders_pending][{get_shanghai_time()}] HTTP返回: {json.dumps(result, ensure_ascii=False)}")
+    if result and 'code' in result and result['code'] == '0' and 'data' in result:
+        return result['data']
     return []
 
 # ========== 4. 批量撤销开仓订单 ==========
+@timed("okx_utils.cancel_pending_open_orders")
 def cancel_pending_open_orders(trade_api, inst_id, order_ids=None, max_retries=3, retry_delay=2, account_prefix=""):
     """
     支持传入 order_ids（单个或列表），否则自动查找当前挂单。
+    按 cancel-batch-orders 单次上限分批提交，全部撤销成功返回True（逐笔结果见 order_batch.cancel_orders）。
     """
     if order_ids is not None:
         if isinstance(order_ids, str):
             order_ids = [order_ids]
-        cancel_orders = [{"instId": inst_id, "ordId": oid} for oid in order_ids]
+        ord_ids = list(order_ids)
     else:
         orders = get_orders_pending(trade_api, inst_id, max_retries, retry_delay, account_prefix)
-        cancel_orders = []
+        ord_ids = []
         for order in orders:
             if order.get('ordType') == 'limit' and ((order.get('side') == 'buy' and order.get('posSide') == 'long') or (order.get('side') == 'sell' and order.get('posSide') == 'short')):
-                cancel_orders.append({"instId": inst_id, "ordId": order['ordId']})
-    if not cancel_orders:
+                ord_ids.append(order['ordId'])
+    if not ord_ids:
         print("[cancel_pending_open_orders] 没有可撤销的订单")
         return False
-    for attempt in range(max_retries + 1):
-        try:
-            result = trade_api.cancel_multiple_orders(cancel_orders)
-            print(f"[cancel_pending_open_orders] 撤单接口返回: {result}")
-            if result and 'code' in result and result['code'] == '0':
-                return True
-        except Exception as e:
-            print(f"[cancel_pending_open_orders] 撤单异常: {e}")
-        if attempt < max_retries:
-            time.sleep(retry_delay)
-    return False
+    results = cancel_orders(trade_api, inst_id, ord_ids, account_prefix)
+    print(f"[cancel_pending_open_orders] 撤单结果: {results}")
+    return all(ok for ok, _ in results.values())
 
 # ========== 5. 生成clOrdId ==========
 def generate_clord_id(prefix="ORD"):
@@ -140,12 +140,20 @@ def build_order_params(inst_id, side, entry_price, size, pos_side, take_profit,
     }
 
 # ========== 7. Bark通知格式 ==========
-def send_bark_notification(title, content, group=None):
-    bark_key = os.getenv("BARK_KEY")
-    bark_group = group or os.getenv("BARK_GROUP", "未配置的GROUP")
-    if not bark_key:
+def send_bark_notification(title, content, group=None, block=False):
+    """默认放入后台通知队列立即返回，下单流程不等待推送服务；block=True 时同步发送"""
+    if not os.getenv("BARK_KEY"):
         print("[WARN] 未配置BARK_KEY，无法发送Bark通知")
         return
+    if NOTIFY_ASYNC and not block:
+        _bark_dispatcher.submit(title, content, group)
+        return
+    _send_bark_now(title, content, group)
+
+@timed("notify_send")
+def _send_bark_now(title, content, group=None):
+    bark_key = os.getenv("BARK_KEY")
+    bark_group = group or os.getenv("BARK_GROUP", "未配置的GROUP")
     # 支持直接填URL或只填key
     if bark_key.startswith("http"):
         url = bark_key
@@ -156,7 +164,7 @@ def send_bark_notification(title, content, group=None):
         resp = requests.post(url, json={"title": title, "body": content, "group": bark_group}, timeout=10)
         print(f"[Bark通知] 状态码: {resp.status_code}, 响应: {resp.text[:100]}")
         if resp.status_code == 200:
-            return
+            return True
     except Exception as e:
         print(f"[Bark通知] POST失败: {e}")
     # 兼容GET方式
@@ -165,14 +173,18 @@ def send_bark_notification(title, content, group=None):
         params = urllib.parse.urlencode({"title": title, "body": content, "group": bark_group})
         resp = requests.get(f"{url}/{title}/{content}?group={bark_group}", timeout=10)
         print(f"[Bark通知] GET状态码: {resp.status_code}, 响应: {resp.text[:100]}")
+        return resp.status_code == 200
     except Exception as e:
         print(f"[Bark通知] GET失败: {e}")
+    return False
+
+_bark_dispatcher = NotificationDispatcher(_send_bark_now)
 
 # ========== 8. 初始化交易API ==========
 def init_trade_api(api_key, secret_key, passphrase, flag=None, suffix=""):
     if flag is None:
         flag = get_env_var("OKX_FLAG", suffix, "0")
-    return Trade.TradeAPI(str(api_key), str(secret_key), str(passphrase), False, str(flag))
+    return okx_clients.get_trade_api(api_key, secret_key, passphrase, flag)
 
 # ========== 新增：标准化获取 TradeAPI/AccountAPI ==========
 def get_trade_api():
@@ -180,35 +192,31 @@ def get_trade_api():
     secret_key = get_env_var("OKX_SECRET_KEY")
     passphrase = get_env_var("OKX_PASSPHRASE")
     flag = get_env_var("OKX_FLAG", default="0")
-    return Trade.TradeAPI(str(api_key), str(secret_key), str(passphrase), False, str(flag))
+    return okx_clients.get_trade_api(api_key, secret_key, passphrase, flag)
 
 def get_account_api():
     api_key = get_env_var("OKX_API_KEY")
     secret_key = get_env_var("OKX_SECRET_KEY")
     passphrase = get_env_var("OKX_PASSPHRASE")
     flag = get_env_var("OKX_FLAG", default="0")
-    import okx.Account as Account
-    return Account.AccountAPI(str(api_key), str(secret_key), str(passphrase), False, str(flag))
+    return okx_clients.get_account_api(api_key, secret_key, passphrase, flag)
 
 # ========== 9. 获取K线数据 ==========
+@timed("okx_utils.get_kline_data")
 def get_kline_data(api_key, secret_key, passphrase, inst_id, bar, limit=None, flag=None, suffix="", max_retries=3, retry_delay=2):
+    """
+    通过K线缓存获取K线（最新在前，首根为未完结K线），已完结K线只增量拉取。
+    api_key/secret_key/passphrase 保留兼容旧调用，行情接口无需签名。
+    """
     if limit is None:
         limit = int(get_env_var("OKX_KLINE_LIMIT", suffix, 2))
+    flag_str = str(flag) if flag is not None else "0"
     try:
-        flag_str = str(flag) if flag is not None else "0"
-        market_api = MarketData.MarketAPI(str(api_key), str(secret_key), str(passphrase), False, flag_str)
-        print(f"[okx_utils] [MARKET] K线API初始化成功")
+        data = get_cached_klines(inst_id, bar, limit, flag=flag_str)
     except Exception as e:
-        print(f"[okx_utils] [ERROR] K线API初始化失败: {str(e)}")
+        print(f"[okx_utils] [ERROR] 获取K线失败: {e}")
         return None
-    for attempt in range(max_retries + 1):
-        try:
-            result = market_api.get_candlesticks(instId=inst_id, bar=bar, limit=str(limit))
-            print(f"[DEBUG] K线原始返回: {result}")
-            if result and 'data' in result and len(result['data']) >= 2:
-                return result['data']
-        except Exception as e:
-            print(f"[okx_utils] [ERROR] 获取K线失败: {e}")
-        if attempt < max_retries:
-            time.sleep(retry_delay)
-    return None 
+    print(f"[DEBUG] K线数据: {data}")
+    if data and len(data) >= 2:
+        return data
+    return None
@@ -0,0 +1,326 @@
+"""
+任务名称
+name: OKX 批量下单/撤单
+定时规则
+cron: 1 1 1 1 *
+说明：同一账户在一次信号处理中产生的订单合并为一次 batch-orders 请求（单次最多20笔），
+撤单同理使用 cancel-batch-orders；逐笔结果按 clOrdId/ordId 拆回，格式与 place_order 返回一致。
+下单超时后按 clOrdId 查询核对再决定是否重新提交，可以放心使用较短的请求超时。
+下单请求带 expTime：只有原请求已过截止时间（交易所不会再受理）且查不到订单时才重新提交，否则记为结果未知。
+结果未知的 clOrdId 在该账户下次下单前按 clOrdId 核对（reconcile_submissions），确认受理或未受理后通知。
+"""
+import json
+import time
+import sqlite3
+from datetime import datetime, timezone, timedelta
+from retry_policy import call_with_retry, TRANSIENT_CODES, DUPLICATE_CLORDID_CODE, ORDER_NOT_EXIST_CODE
+from okx_clients import request_expiry
+from order_state import get_order_state, SUBMIT_ACCEPTED, SUBMIT_REJECTED, SUBMIT_UNKNOWN, SUBMIT_SENDING
+from notification_service import notification_service
+
+BATCH_ORDER_LIMIT = 20  # OKX 批量下单/撤单单次最多20笔
+RESUBMIT_LIMIT = 2      # 确认交易所没有该订单后，用同一clOrdId重新提交的最多次数
+RECONCILE_DELAY = 0.2   # 结果不确定时先等待(秒)再按clOrdId查询，给交易所落库留时间
+REQUEST_EXPIRY = 3.0    # 下单请求的有效期(秒)，作为 expTime 发送；超过后交易所不再受理该请求
+EXPIRY_MARGIN = 0.5     # 判断原请求已失效时额外等待的时间(秒)，容忍本机与交易所的时钟误差
+NOTIFY_GROUP = "OKX自动交易通知"
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def _chunks(items, size=BATCH_ORDER_LIMIT):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _split_result(result, keys, key_field, error_msg=""):
+    """
+    把批量接口的返回拆成逐笔结果：{key: {"code", "msg", "data": [该笔数据]}}
+    批量接口整体code为0/1/2（全部成功/全部失败/部分成功），逐笔成败看 sCode
+    """
+    if not result:
+        return {k: {"code": "-1", "msg": error_msg or "无响应", "data": []} for k in keys}
+    by_key = {d.get(key_field): d for d in result.get("data") or []}
+    split = {}
+    for k in keys:
+        item = by_key.get(k)
+        if item is None:
+            split[k] = {"code": result.get("code", "-1"), "msg": result.get("msg") or "无逐笔结果", "data": []}
+        else:
+            split[k] = {"code": item.get("sCode", result.get("code")), "msg": item.get("sMsg", ""), "data": [item]}
+    return split
+
+def place_orders(trade_api, orders, account_prefix="", deadline=None, account=None, on_reconciled=None):
+    """
+    批量下单，每个订单须带 clOrdId
+
+    超时等结果不确定的失败不盲目重发：先按 clOrdId 查询订单，确认交易所没有该订单后才用同一 clOrdId 重新提交。
+    提交过的 clOrdId 记在本地索引(order_state.submissions)中，已受理的不会再次提交，结果未知的先核对。
+    下单前先核对该账户此前结果未知的订单（reconcile_submissions）。
+
+    Args:
+        account: 索引中记录的账户名，默认取 account_prefix
+        on_reconciled: 核对出结果时的回调，参数为 reconcile_submissions 返回的单条结果
+
+    Returns:
+        dict: clOrdId -> 与 place_order 返回格式一致的结果（code为"0"表示该笔成功）；
+              结果未知（可能已下单）的带 unknown=True，由该账户下次下单前的核对确认
+    """
+    index = _SubmissionIndex(account if account is not None else account_prefix)
+    for outcome in reconcile_submissions(trade_api, index.account, account_prefix, deadline):
+        if on_reconciled:
+            on_reconciled(outcome)
+    results = {}
+    for chunk in _chunks(list(orders)):
+        results.update(_place_chunk(trade_api, chunk, account_prefix, deadline, index))
+    return results
+
+def _submit(trade_api, chunk, account_prefix="", deadline=None):
+    """
+    提交一次（单笔用 place_order，多笔用 batch-orders），只重试确定未被处理的失败（限速、连接未建立）
+
+    Returns:
+        tuple: (逐笔结果, 原请求失效时间)，失效时间之后交易所不会再受理本次提交
+    """
+    cl_ord_ids = [o["clOrdId"] for o in chunk]
+    exp_time = time.time() + REQUEST_EXPIRY
+    with request_expiry(exp_time * 1000):
+        if len(chunk) == 1:
+            result, error_msg = call_with_retry(lambda: trade_api.place_order(**chunk[0]), "place_order", "ORDER",
+                                                account_prefix, idempotent=False, deadline=deadline)
+            print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单提交结果: {json.dumps(result)}")
+        else:
+            result, error_msg = call_with_retry(lambda: trade_api.place_multiple_orders(chunk), "place_multiple_orders",
+                                                "BATCH_ORDER", account_prefix, idempotent=False, deadline=deadline)
+            print(f"[{get_beijing_time()}] {account_prefix} [BATCH_ORDER] {len(chunk)}笔订单批量提交结果: {json.dumps(result)}")
+    expires_at = exp_time + EXPIRY_MARGIN
+    if len(chunk) == 1 and result and result.get("code") == "0":
+        return {cl_ord_ids[0]: result}, expires_at
+    split = _split_result(result, cl_ord_ids, "clOrdId", error_msg)
+    if result is None or str(result.get("code")) in TRANSIENT_CODES:
+        for k in cl_ord_ids:
+            split[k]["ambiguous"] = True
+    return split, expires_at
+
+def _is_ambiguous(r):
+    """无响应/交易所临时故障/clOrdId重复：订单可能已经存在"""
+    item = (r.get("data") or [{}])[0]
+    return bool(r.get("ambiguous")) or str(r.get("code")) in TRANSIENT_CODES \
+        or str(item.get("sCode", "")) == DUPLICATE_CLORDID_CODE
+
+def _accepted_result(cl_ord_id, ord_id, msg=""):
+    return {"code": "0", "msg": "", "data": [{"clOrdId": cl_ord_id, "ordId": ord_id, "sCode": "0", "sMsg": msg}]}
+
+def _query_order(trade_api, order, account_prefix="", deadline=None):
+    """
+    按 clOrdId 查询订单
+
+    Returns:
+        tuple: ("found", 订单数据) / ("missing", None) / ("unknown", 错误说明)
+    """
+    cl_ord_id = order["clOrdId"]
+    result, error_msg = call_with_retry(lambda: trade_api.get_order(instId=order["instId"], clOrdId=cl_ord_id),
+                                        "get_order", "RECONCILE", account_prefix, deadline=deadline)
+    if result and result.get("code") == "0" and result.get("data"):
+        return "found", result["data"][0]
+    if result and str(result.get("code")) == ORDER_NOT_EXIST_CODE:
+        return "missing", None
+    return "unknown", error_msg or (result or {}).get("msg", "") or "无响应"
+
+def _place_chunk(trade_api, chunk, account_prefix, deadline, index):
+    results = {}
+    to_send = []
+    to_check = []  # [(订单, 原请求失效时间)]
+    for order in chunk:
+        cl_ord_id = order["clOrdId"]
+        existing = index.claim(order)
+        if existing is None:
+            to_send.append(order)
+        elif existing["status"] == SUBMIT_ACCEPTED:
+            print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单{cl_ord_id}已提交过(ordId={existing['ord_id']})，不再重复提交")
+            results[cl_ord_id] = _accepted_result(cl_ord_id, existing["ord_id"], "已提交过")
+        else:
+            print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单{cl_ord_id}上次提交结果未知，先查询核对")
+            results[cl_ord_id] = {"code": "-1", "msg": existing.get("msg") or "提交结果未知", "data": []}
+            # updated 为最后一次提交的时间（整数秒，多留1秒）
+            to_check.append((order, existing["updated"] + 1 + REQUEST_EXPIRY + EXPIRY_MARGIN))
+
+    for attempt in range(RESUBMIT_LIMIT + 1):
+        if to_send:
+            split, expires_at = _submit(trade_api, to_send, account_prefix, deadline)
+            for order in to_send:
+                cl_ord_id = order["clOrdId"]
+                r = split[cl_ord_id]
+                results[cl_ord_id] = r
+                if r.get("code") == "0":
+                    index.update(cl_ord_id, SUBMIT_ACCEPTED, (r.get("data") or [{}])[0].get("ordId"))
+                elif _is_ambiguous(r):
+                    to_check.append((order, expires_at))
+                else:
+                    index.update(cl_ord_id, SUBMIT_REJECTED, msg=r.get("msg", ""))
+            to_send = []
+        if not to_check:
+            break
+        # 原请求失效前查不到订单不代表没有下单（请求可能仍在途中），在截止时间内尽量等到失效后再查询
+        wait_until = max(expires_at for _, expires_at in to_check)
+        if deadline is not None:
+            wait_until = min(wait_until, deadline - RECONCILE_DELAY)
+        time.sleep(max(RECONCILE_DELAY, wait_until - time.time()))
+        for order, expires_at in to_check:
+            cl_ord_id = order["clOrdId"]
+            state, data = _query_order(trade_api, order, account_prefix, deadline)
+            if state == "found":
+                print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单{cl_ord_id}已被交易所受理: "
+                      f"ordId={data.get('ordId')} state={data.get('state')}")
+                index.update(cl_ord_id, SUBMIT_ACCEPTED, data.get("ordId"))
+                results[cl_ord_id] = _accepted_result(cl_ord_id, data.get("ordId"))
+            elif state == "missing" and time.time() < expires_at:
+                # 原请求还可能被受理，此时重发可能重复开仓，由该账户下次下单前的 reconcile_submissions 核对
+                print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单{cl_ord_id}暂未查到，原请求尚未失效，不重新提交")
+                index.update(cl_ord_id, SUBMIT_UNKNOWN, msg="原请求未失效时查无此订单")
+                results[cl_ord_id] = {"code": "-1", "msg": "订单状态未知，原请求尚未失效，请核对", "data": [], "unknown": True}
+            elif state == "missing" and attempt < RESUBMIT_LIMIT and (deadline is None or time.time() < deadline):
+                print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 确认订单{cl_ord_id}未被受理，使用同一clOrdId重新提交")
+                index.update(cl_ord_id, SUBMIT_SENDING)  # 刷新提交时间，其他进程核对时不会把在途的重新提交判为未受理
+                to_send.append(order)
+            elif state == "missing":
+                index.update(cl_ord_id, SUBMIT_REJECTED, msg="交易所无此订单")
+                results[cl_ord_id] = {"code": "-1", "msg": "提交失败，交易所无此订单", "data": []}
+            else:
+                print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单{cl_ord_id}状态无法确认: {data}")
+                index.update(cl_ord_id, SUBMIT_UNKNOWN, msg=data)
+                results[cl_ord_id] = {"code": "-1", "msg": f"订单状态未知，请核对: {data}", "data": [], "unknown": True}
+        to_check = []
+    return results
+
+
+def reconcile_submissions(trade_api, account, account_prefix="", deadline=None):
+    """
+    核对该账户结果未知（sending/unknown）的提交：原请求已过 expTime 后按 clOrdId 查询，
+    查到订单记为已受理，查不到记为未受理（交易所不会再受理原请求），两种结果都发送通知；查询失败的留到下次核对。
+    这些订单在提交时已按失败处理，已受理的订单可能正挂单或已成交，需要人工确认
+
+    Returns:
+        list: [{"cl_ord_id", "inst_id", "accepted", "ord_id", "state", "msg"}]，只包含核对出结果的订单
+    """
+    try:
+        pending = get_order_state().get_unresolved_submissions(
+            account, older_than=REQUEST_EXPIRY + EXPIRY_MARGIN + 1)  # updated 为整数秒，多留1秒
+    except sqlite3.Error as e:
+        print(f"[{get_beijing_time()}] {account_prefix} [RECONCILE] 读取本地clOrdId索引失败: {e}")
+        return []
+    index = _SubmissionIndex(account)
+    outcomes = []
+    for sub in pending:
+        cl_ord_id = sub["cl_ord_id"]
+        state, data = _query_order(trade_api, {"clOrdId": cl_ord_id, "instId": sub["inst_id"]}, account_prefix, deadline)
+        if state == "found":
+            print(f"[{get_beijing_time()}] {account_prefix} [RECONCILE] 订单{cl_ord_id}已被交易所受理: "
+                  f"ordId={data.get('ordId')} state={data.get('state')}")
+            index.update(cl_ord_id, SUBMIT_ACCEPTED, data.get("ordId"))
+            outcome = {"cl_ord_id": cl_ord_id, "inst_id": sub["inst_id"], "accepted": True, "ord_id": data.get("ordId"),
+                       "state": data.get("state"), "msg": "核对确认已受理"}
+            content = (f"订单: {cl_ord_id}\nordId: {data.get('ordId')}\n状态: {data.get('state')}\n"
+                       f"方向: {data.get('side')} {data.get('posSide', '')}\n价格: {data.get('px')}\n数量: {data.get('sz')}\n"
+                       f"提交时未确认结果，实际已被交易所受理，请检查持仓与挂单")
+        elif state == "missing":
+            print(f"[{get_beijing_time()}] {account_prefix} [RECONCILE] 订单{cl_ord_id}原请求已失效且查无此订单，确认未被受理")
+            index.update(cl_ord_id, SUBMIT_REJECTED, msg="核对确认交易所无此订单")
+            outcome = {"cl_ord_id": cl_ord_id, "inst_id": sub["inst_id"], "accepted": False, "ord_id": None,
+                       "state": None, "msg": "核对确认交易所无此订单"}
+            content = f"订单: {cl_ord_id}\n提交时未确认结果，核对确认交易所无此订单，未下单"
+        else:
+            print(f"[{get_beijing_time()}] {account_prefix} [RECONCILE] 订单{cl_ord_id}仍无法确认，下次核对: {data}")
+            continue
+        outcomes.append(outcome)
+        notification_service.send_bark_notification(
+            f"{account_prefix} {sub['inst_id']} 订单核对: {'已受理' if outcome['accepted'] else '未受理'}",
+            content, group=NOTIFY_GROUP)
+    return outcomes
+
+
+class _SubmissionIndex:
+    """已提交clOrdId的本地索引，存储不可用时只打印日志，不影响下单"""
+
+    def __init__(self, account):
+        self.account = account
+
+    def claim(self, order):
+        try:
+            return get_order_state().claim_submission(order["clOrdId"], self.account, order.get("instId", ""))
+        except sqlite3.Error as e:
+            print(f"[{get_beijing_time()}] [ORDER] 本地clOrdId索引不可用: {e}")
+            return None
+
+    def update(self, cl_ord_id, status, ord_id=None, msg=""):
+        try:
+            get_order_state().update_submission(cl_ord_id, status, ord_id, msg)
+        except sqlite3.Error as e:
+            print(f"[{get_beijing_time()}] [ORDER] 更新本地clOrdId索引失败: {e}")
+
+def cancel_orders(trade_api, inst_id, ord_ids, account_prefix="", deadline=None):
+    """
+    批量撤单
+
+    Returns:
+        dict: ordId -> (是否成功, 说明)
+    """
+    results = {}
+    for ord_id, r in cancel_order_results(trade_api, inst_id, ord_ids, account_prefix, deadline).items():
+        ok = r.get("code") == "0"
+        results[ord_id] = (ok, "撤销成功" if ok else (r.get("msg") or "撤销失败"))
+    return results
+
+def cancel_order_results(trade_api, inst_id, ord_ids, account_prefix="", deadline=None):
+    """
+    批量撤单，返回逐笔结果（需要按错误码区分失败原因时使用）
+
+    Returns:
+        dict: ordId -> {"code", "msg", "data"}，code 为该笔的 sCode；未拿到响应时为"-1"
+    """
+    results = {}
+    for chunk in _chunks(list(ord_ids)):
+        # 撤单是幂等的，重复撤销只会返回订单状态错误
+        if len(chunk) == 1:
+            result, error_msg = call_with_retry(lambda: trade_api.cancel_order(instId=inst_id, ordId=chunk[0]),
+                                                "cancel_order", "CANCEL", account_prefix, deadline=deadline)
+        else:
+            payload = [{"instId": inst_id, "ordId": ord_id} for ord_id in chunk]
+            result, error_msg = call_with_retry(lambda: trade_api.cancel_multiple_orders(payload), "cancel_multiple_orders",
+                                                "CANCEL", account_prefix, deadline=deadline)
+        split = _split_result(result, chunk, "ordId", error_msg)
+        for ord_id, r in split.items():
+            if r.get("code") == "0":
+                print(f"[{get_beijing_time()}] {account_prefix} [CANCEL] 订单{ord_id}撤销成功")
+            else:
+                print(f"[{get_beijing_time()}] {account_prefix} [CANCEL] 订单{ord_id}撤销失败: {r.get('msg', '')}")
+        results.update(split)
+    return results
+
+
+class OrderBatch:
+    """
+    收集同一账户一次信号处理中产生的订单，submit() 时合并提交：
+        batch = OrderBatch(trade_api, account_prefix)
+        batch.add(order_params)
+        results = batch.submit()  # clOrdId -> 结果
+    """
+
+    def __init__(self, trade_api, account_prefix="", account=None, on_reconciled=None):
+        self.trade_api = trade_api
+        self.account_prefix = account_prefix
+        self.account = account
+        self.on_reconciled = on_reconciled
+        self.orders = []
+
+    def add(self, order_params):
+        self.orders.append(order_params)
+        return order_params["clOrdId"]
+
+    def __len__(self):
+        return len(self.orders)
+
+    def submit(self, deadline=None):
+        if not self.orders:
+            return {}
+        orders, self.orders = self.orders, []
+        return place_orders(self.trade_api, orders, self.account_prefix, deadline, self.account, self.on_reconciled)
@@ -0,0 +1,214 @@
+"""
+任务名称
+name: 本地订单状态存储
+定时规则
+cron: 1 1 1 1 *
+说明：SQLite(WAL模式)保存各策略/账户的最后下单时间、未完结clOrdId、已处理信号时间戳和已提交clOrdId索引，
+每次更新都是单条事务，多个策略进程同时写入也不会互相覆盖；按主键查询，与历史记录多少无关。
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ORDER_STATE_DB = os.getenv("OKX_ORDER_STATE_DB", os.path.join(ROOT_DIR, "logs", "order_state.db"))
+BUSY_TIMEOUT = 10  # 其他进程持有写锁时的最长等待时间(秒)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS last_order (
+    strategy TEXT NOT NULL,
+    account  TEXT NOT NULL,
+    ts       INTEGER NOT NULL,
+    PRIMARY KEY (strategy, account)
+);
+CREATE TABLE IF NOT EXISTS open_orders (
+    cl_ord_id TEXT PRIMARY KEY,
+    strategy  TEXT NOT NULL,
+    account   TEXT NOT NULL,
+    inst_id   TEXT NOT NULL,
+    ts        INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_open_orders_account ON open_orders (strategy, account);
+CREATE TABLE IF NOT EXISTS signals (
+    strategy TEXT NOT NULL,
+    key      TEXT NOT NULL,
+    ts       INTEGER NOT NULL,
+    PRIMARY KEY (strategy, key)
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    cl_ord_id TEXT PRIMARY KEY,
+    account   TEXT NOT NULL,
+    inst_id   TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    ord_id    TEXT,
+    msg       TEXT,
+    ts        INTEGER NOT NULL,
+    updated   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions (status, ts);
+"""
+
+# submissions.status
+SUBMIT_SENDING = "sending"    # 请求即将发出/已发出，结果未知
+SUBMIT_ACCEPTED = "accepted"  # 交易所已受理（有ordId）
+SUBMIT_REJECTED = "rejected"  # 交易所明确拒绝或确认不存在，可用同一clOrdId重新提交
+SUBMIT_UNKNOWN = "unknown"    # 超时后查询也失败，需再次核对后才能重新提交
+
+def get_shanghai_time(fmt="%Y-%m-%d %H:%M:%S"):
+    tz = timezone(timedelta(hours=8))
+    return datetime.now(tz).strftime(fmt)
+
+
+class OrderStateStore:
+    """
+    - last_order: (策略, 账户) -> 最后一次下单成功的时间
+    - open_orders: 策略下出去、尚未确认完结的 clOrdId
+    - signals: (策略, 键) -> 最后处理的信号时间戳，claim_signal 原子地判断并占用
+    - submissions: 已提交过的 clOrdId 及其受理状态，下单前 claim_submission 原子地登记
+    """
+
+    def __init__(self, path=ORDER_STATE_DB):
+        self.path = path
+        self._local = threading.local()  # sqlite连接不能跨线程共享，每个线程一个
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 下单时间 ----------
+    def get_last_order_time(self, strategy, account):
+        row = self._conn().execute(
+            "SELECT ts FROM last_order WHERE strategy=? AND account=?", (strategy, account)).fetchone()
+        return row[0] if row else 0
+
+    def record_order(self, strategy, account, cl_ord_id=None, inst_id="", ts=None):
+        """下单成功：更新最后下单时间，并记录未完结的clOrdId（同一事务）"""
+        ts = int(ts if ts is not None else time.time())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO last_order (strategy, account, ts) VALUES (?, ?, ?) "
+                "ON CONFLICT (strategy, account) DO UPDATE SET ts=MAX(ts, excluded.ts)",
+                (strategy, account, ts))
+            if cl_ord_id:
+                conn.execute(
+                    "INSERT OR REPLACE INTO open_orders (cl_ord_id, strategy, account, inst_id, ts) VALUES (?, ?, ?, ?, ?)",
+                    (cl_ord_id, strategy, account, inst_id, ts))
+
+    # ---------- 未完结订单 ----------
+    def get_open_orders(self, strategy, account):
+        rows = self._conn().execute(
+            "SELECT cl_ord_id FROM open_orders WHERE strategy=? AND account=? ORDER BY ts",
+            (strategy, account)).fetchall()
+        return [r[0] for r in rows]
+
+    def close_orders(self, cl_ord_ids):
+        cl_ord_ids = [c for c in cl_ord_ids if c]
+        if not cl_ord_ids:
+            return
+        with self._conn() as conn:
+            conn.executemany("DELETE FROM open_orders WHERE cl_ord_id=?", [(c,) for c in cl_ord_ids])
+
+    def sync_open_orders(self, strategy, account, live_cl_ord_ids):
+        """用交易所返回的未成交订单校正：不在 live_cl_ord_ids 中的记录视为已完结"""
+        live = set(c for c in live_cl_ord_ids if c)
+        stale = [c for c in self.get_open_orders(strategy, account) if c not in live]
+        self.close_orders(stale)
+        return stale
+
+    # ---------- 信号防重 ----------
+    def get_signal_ts(self, strategy, key):
+        row = self._conn().execute(
+            "SELECT ts FROM signals WHERE strategy=? AND key=?", (strategy, key)).fetchone()
+        return row[0] if row else 0
+
+    def claim_signal(self, strategy, key, ts):
+        """
+        原子地占用一个信号：ts 比已记录的更新时写入并返回True，否则返回False（已被本进程或其他进程处理）
+        """
+        ts = int(ts)
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO signals (strategy, key, ts) VALUES (?, ?, ?) "
+                "ON CONFLICT (strategy, key) DO UPDATE SET ts=excluded.ts WHERE excluded.ts > signals.ts",
+                (strategy, key, ts))
+            return cur.rowcount > 0
+
+    # ---------- 已提交clOrdId索引 ----------
+    def get_submission(self, cl_ord_id):
+        row = self._conn().execute(
+            "SELECT cl_ord_id, account, inst_id, status, ord_id, msg, ts, updated FROM submissions WHERE cl_ord_id=?",
+            (cl_ord_id,)).fetchone()
+        if not row:
+            return None
+        return dict(zip(("cl_ord_id", "account", "inst_id", "status", "ord_id", "msg", "ts", "updated"), row))
+
+    def claim_submission(self, cl_ord_id, account, inst_id):
+        """
+        原子地登记一次提交：clOrdId 未出现过、或上次被明确拒绝时写入 sending 并返回None；
+        否则返回已有记录（已受理或结果未知），调用方不得直接重新提交
+        """
+        now = int(time.time())
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO submissions (cl_ord_id, account, inst_id, status, ord_id, msg, ts, updated) "
+                "VALUES (?, ?, ?, ?, NULL, '', ?, ?) "
+                "ON CONFLICT (cl_ord_id) DO UPDATE SET status=excluded.status, msg='', updated=excluded.updated "
+                "WHERE submissions.status=?",
+                (cl_ord_id, account, inst_id, SUBMIT_SENDING, now, now, SUBMIT_REJECTED))
+            if cur.rowcount > 0:
+                return None
+        return self.get_submission(cl_ord_id)
+
+    def update_submission(self, cl_ord_id, status, ord_id=None, msg=""):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE submissions SET status=?, ord_id=COALESCE(?, ord_id), msg=?, updated=? WHERE cl_ord_id=?",
+                (status, ord_id, msg or "", int(time.time()), cl_ord_id))
+
+    def get_unresolved_submissions(self, account=None, older_than=0):
+        """结果未知（sending/unknown）且最后一次更新早于 older_than 秒前的记录，供事后核对"""
+        sql = "SELECT cl_ord_id FROM submissions WHERE status IN (?, ?) AND updated<=?"
+        args = [SUBMIT_SENDING, SUBMIT_UNKNOWN, int(time.time() - older_than)]
+        if account is not None:
+            sql += " AND account=?"
+            args.append(account)
+        return [self.get_submission(r[0]) for r in self._conn().execute(sql + " ORDER BY ts", args).fetchall()]
+
+    # ---------- 旧数据迁移 ----------
+    def import_order_history(self, strategy, json_path):
+        """导入旧版 {账户名: 下单时间} JSON 文件，已有更新记录时保留较新的时间"""
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [ORDER_STATE] 读取旧下单记录失败 {json_path}: {e}")
+            return 0
+        for account, ts in data.items():
+            self.record_order(strategy, account, ts=ts)
+        print(f"[{get_shanghai_time()}] [ORDER_STATE] 已导入{len(data)}条旧下单记录: {json_path}")
+        return len(data)
+
+
+# 进程内共享的存储实例
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_order_state(path=ORDER_STATE_DB):
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = OrderStateStore(path)
+        return _stores[path]
@@ -0,0 +1,215 @@
+"""
+任务名称
+name: OKX 跨进程接口限速
+定时规则
+cron: 1 1 1 1 *
+说明：按 OKX 各接口的限额维护令牌桶（交易/账户接口按 (接口, API Key)，行情/公共接口按IP只有一个桶），桶状态保存在 logs/rate_limits/ 下并用文件锁保护，
+同时运行的青龙任务（策略、委托监控、余额查询、振幅监控）共享同一份额度，超出时在本地排队而不是收到 50011。
+okx_clients 创建的客户端在HTTP传输层统一限速，无需改动各处调用；每次请求的排队时间记入延迟指标 rate_limit_wait。
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone, timedelta
+import httpx
+try:
+    import fcntl  # 跨进程文件锁（青龙/Linux环境）
+except ImportError:
+    fcntl = None
+try:
+    from latency_metrics import record as record_latency
+except ImportError:
+    record_latency = None
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RATE_LIMIT_DIR = os.getenv("OKX_RATE_LIMIT_DIR", os.path.join(ROOT_DIR, "logs", "rate_limits"))
+RATE_LIMIT_ENABLED = os.getenv("OKX_RATE_LIMIT", "1") != "0"
+WAIT_LOG_THRESHOLD = 0.5  # 排队超过该时长(秒)时打印日志
+
+# "方法 路径" -> (请求数, 秒)。私有接口按API Key、公共接口按IP(本机)计数；未列出的接口不限速
+# 批量接口的限额按订单数计算，一次请求消耗的令牌数等于其中的订单数
+ENDPOINT_LIMITS = {
+    "GET /api/v5/market/ticker": (20, 2),
+    "GET /api/v5/market/candles": (40, 2),
+    "GET /api/v5/market/history-candles": (20, 2),
+    "GET /api/v5/market/books": (40, 2),
+    "GET /api/v5/market/mark-price-candles": (20, 2),
+    "GET /api/v5/market/index-candles": (20, 2),
+    "GET /api/v5/public/instruments": (20, 2),
+    "GET /api/v5/public/mark-price": (10, 2),
+    "GET /api/v5/trade/orders-pending": (60, 2),
+    "GET /api/v5/trade/order": (60, 2),
+    "POST /api/v5/trade/order": (60, 2),
+    "POST /api/v5/trade/batch-orders": (300, 2),
+    "POST /api/v5/trade/cancel-order": (60, 2),
+    "POST /api/v5/trade/cancel-batch-orders": (300, 2),
+    "POST /api/v5/trade/amend-order": (60, 2),
+    "POST /api/v5/trade/close-position": (20, 2),
+    "POST /api/v5/trade/order-algo": (20, 2),
+    "GET /api/v5/trade/orders-algo-pending": (20, 2),
+    "GET /api/v5/account/balance": (10, 2),
+    "GET /api/v5/account/positions": (10, 2),
+    "POST /api/v5/account/set-leverage": (20, 2),
+}
+BATCH_ENDPOINTS = {"POST /api/v5/trade/batch-orders", "POST /api/v5/trade/cancel-batch-orders"}
+# 行情/公共数据接口按IP计数，带签名的客户端（如账户的 MarketAPI）请求这些接口时也共用同一个桶
+IP_LIMITED_PREFIXES = ("/api/v5/market/", "/api/v5/public/")
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class RateLimiter:
+    """线程安全的令牌桶（进程内），acquire() 在超出限速时阻塞等待，返回等待时长"""
+
+    def __init__(self, rate, per):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.fill_rate
+            time.sleep(wait)
+            waited += wait
+
+
+class FileTokenBucket:
+    """
+    跨进程令牌桶：状态 {"tokens", "updated"} 保存在文件中，每次取令牌时加排他文件锁读改写。
+    令牌不足时先预占（余额记为负数）再在锁外等待，多个进程按到达顺序排队。
+    flock 对同一进程内共享的文件描述符不互斥，进程内另用线程锁串行。
+    """
+
+    def __init__(self, path, rate, per):
+        self.path = path
+        self.capacity = rate
+        self.fill_rate = rate / per
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "a+", encoding="utf-8")
+        return self._file
+
+    def _reserve(self, tokens):
+        """预占令牌（余额可为负，相当于排队），返回需要等待的秒数"""
+        with self._lock:
+            f = self._open()
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                available = min(self.capacity, state.get("tokens", self.capacity)
+                                + max(0.0, now - state.get("updated", now)) * self.fill_rate)
+                available -= tokens
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": available, "updated": now}))
+                f.flush()
+                return max(0.0, -available / self.fill_rate)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, tokens=1):
+        wait = self._reserve(min(tokens, self.capacity))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def _bucket_name(endpoint, key):
+    name = endpoint.replace(" /api/v5/", "_").replace("/", "_").replace("-", "_").lower()
+    if key:
+        # 文件名中不出现API Key原文
+        name += "_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    return name
+
+def get_limiter(endpoint, key=""):
+    """
+    获取 (接口, API Key) 的令牌桶，未配置限额的接口返回None
+
+    Args:
+        endpoint: "GET /api/v5/market/ticker" 形式
+        key: API Key，公共接口为空
+    """
+    if endpoint not in ENDPOINT_LIMITS:
+        return None
+    with _limiters_lock:
+        if (endpoint, key) not in _limiters:
+            rate, per = ENDPOINT_LIMITS[endpoint]
+            if fcntl is not None:
+                _limiters[(endpoint, key)] = FileTokenBucket(
+                    os.path.join(RATE_LIMIT_DIR, f"{_bucket_name(endpoint, key)}.json"), rate, per)
+            else:
+                _limiters[(endpoint, key)] = RateLimiter(rate, per)
+        return _limiters[(endpoint, key)]
+
+def _request_cost(endpoint, request):
+    if endpoint not in BATCH_ENDPOINTS:
+        return 1
+    try:
+        body = json.loads(request.content or b"[]")
+        return max(1, len(body)) if isinstance(body, list) else 1
+    except ValueError:
+        return 1
+
+def throttle(request):
+    """按请求的接口取令牌（交易/账户接口按API Key，行情/公共接口按IP），返回排队时长(秒)"""
+    endpoint = f"{request.method} {request.url.path}"
+    key = request.headers.get("OK-ACCESS-KEY", "")
+    if key == "-1" or request.url.path.startswith(IP_LIMITED_PREFIXES):
+        key = ""
+    limiter = get_limiter(endpoint, key)
+    if limiter is None:
+        return 0.0
+    try:
+        waited = limiter.acquire(_request_cost(endpoint, request))
+    except OSError as e:
+        # 限速文件不可用时不阻塞交易请求
+        print(f"[{get_beijing_time()}] [RATE_LIMIT] 限速状态读写失败，跳过限速: {e}")
+        return 0.0
+    if record_latency is not None:
+        record_latency("rate_limit_wait", waited, endpoint=endpoint)
+    if waited >= WAIT_LOG_THRESHOLD:
+        print(f"[{get_beijing_time()}] [RATE_LIMIT] {endpoint} 排队{waited:.3f}秒")
+    return waited
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """包装底层transport，发出请求前先按接口限额取令牌"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request):
+        if RATE_LIMIT_ENABLED:
+            throttle(request)
+        return self.transport.handle_request(request)
+
+    def close(self):
+        self.transport.close()
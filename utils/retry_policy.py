@@ -0,0 +1,113 @@
+"""
+任务名称
+name: OKX 请求重试策略
+定时规则
+cron: 1 1 1 1 *
+说明：所有REST请求共用的重试规则。按返回区分限速(50011等)、临时故障、网络异常与业务错误：
+业务错误直接返回不重试；限速与临时故障按指数退避+随机抖动重试（接口限速在传输层，见 rate_limiter.py）。
+下单等非幂等请求在"请求可能已到达交易所"的网络异常后不盲目重试，由 order_batch 按 clOrdId 查询订单后再决定是否重新提交。
+"""
+import time
+import random
+from datetime import datetime, timezone, timedelta
+import httpx
+try:
+    from latency_metrics import record as record_latency
+except ImportError:
+    record_latency = None
+
+MAX_RETRIES = 3
+BASE_DELAY = 0.2            # 首次重试的退避上限(秒)，之后按2的幂增长
+MAX_DELAY = 2.0             # 单次退避上限(秒)
+RATE_LIMIT_BASE_DELAY = 0.5  # 被限速时的退避基数(秒)，OKX限速窗口为2秒
+
+# OKX 返回码
+RATE_LIMIT_CODES = {"50011", "50061"}                     # 请求过于频繁 / 子账户请求过于频繁
+TRANSIENT_CODES = {"50001", "50004", "50013", "50026"}    # 服务暂不可用 / 接口请求超时 / 系统繁忙 / 系统错误
+DUPLICATE_CLORDID_CODE = "51016"                          # clOrdId 重复
+ORDER_NOT_EXIST_CODE = "51603"                            # 订单不存在
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def classify(result=None, error=None):
+    """
+    Returns:
+        ok: 成功
+        business: 业务错误（参数、余额、订单状态等），重试无意义
+        rate_limit: 被限速，请求未被处理
+        transient: 交易所临时故障
+        unsent: 连接未建立，请求确定没有发出
+        network: 请求已发出但未拿到响应，交易所可能已经处理
+        error: 非网络类异常（代码错误等），不重试
+    """
+    if error is not None:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return "unsent"
+        if isinstance(error, (httpx.TransportError, ValueError)):  # ValueError: 网关返回非JSON页面
+            return "network"
+        return "error"
+    if not result:
+        return "network"
+    code = str(result.get("code", ""))
+    if code == "0":
+        return "ok"
+    if code in RATE_LIMIT_CODES:
+        return "rate_limit"
+    if code in TRANSIENT_CODES:
+        return "transient"
+    return "business"
+
+def backoff_delay(attempt, rate_limited=False):
+    """指数退避 + 全抖动：在 [0, min(上限, 基数*2^attempt)] 内随机"""
+    base = RATE_LIMIT_BASE_DELAY if rate_limited else BASE_DELAY
+    return random.uniform(0, min(MAX_DELAY, base * (2 ** attempt))) + (base if rate_limited else 0)
+
+def call_with_retry(func, endpoint, tag="REQUEST", account_prefix="", idempotent=True,
+                    max_retries=MAX_RETRIES, deadline=None):
+    """
+    执行一次OKX请求，按返回类型决定是否重试
+
+    Args:
+        func: 无参调用，返回OKX响应dict
+        endpoint: 接口名（python-okx方法名），退避耗时按接口记入延迟指标 retry_backoff
+        idempotent: 非幂等请求（无clOrdId的下单）在请求可能已被处理时不重试
+        deadline: time.time() 截止时间戳，退避后会超过时不再重试
+
+    Returns:
+        tuple: (最后一次响应dict或None, 错误说明)
+    """
+    result, error_msg = None, ""
+    for attempt in range(max_retries + 1):
+        try:
+            result, error = func(), None
+        except Exception as e:
+            result, error = None, e
+        kind = classify(result, error)
+        if kind == "ok":
+            return result, ""
+        if error is not None:
+            error_msg = str(error)
+            print(f"[{get_beijing_time()}] {account_prefix} [{tag}] 请求异常 (尝试 {attempt+1}/{max_retries+1}): {error_msg}")
+        else:
+            error_msg = (result or {}).get("msg", "") or "无响应"
+            if kind != "business":
+                print(f"[{get_beijing_time()}] {account_prefix} [{tag}] 请求失败 (尝试 {attempt+1}/{max_retries+1}): "
+                      f"code={(result or {}).get('code')} {error_msg}")
+        if kind in ("business", "error"):
+            return result, error_msg
+        if not idempotent and kind in ("network", "transient"):
+            print(f"[{get_beijing_time()}] {account_prefix} [{tag}] 请求可能已被处理，非幂等请求不重试")
+            return result, error_msg
+        delay = backoff_delay(attempt, rate_limited=kind == "rate_limit")
+        if attempt >= max_retries or (deadline is not None and time.time() + delay >= deadline):
+            break
+        print(f"[{get_beijing_time()}] {account_prefix} [{tag}] {'被限速，' if kind == 'rate_limit' else ''}"
+              f"{delay:.2f}秒后重试... ({attempt+1}/{max_retries})")
+        if record_latency is not None:
+            record_latency("retry_backoff", delay, endpoint=endpoint, reason=kind)
+        time.sleep(delay)
+    print(f"[{get_beijing_time()}] {account_prefix} [{tag}] 所有尝试失败")
+    return result, error_msg
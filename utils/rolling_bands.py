@@ -0,0 +1,131 @@
+"""
+任务名称
+name: 滚动布林带
+定时规则
+cron: 1 1 1 1 *
+说明：按 (instId, bar, 价格类型) 维护固定窗口的滚动和/平方和，每根新完结K线O(1)更新，随时读取上轨/中轨/下轨；
+bollinger_series 为回测用的批量计算。标准差为总体标准差，与 np.std 及 Pine ta.stdev 一致。
+"""
+import math
+import threading
+from collections import deque
+import numpy as np
+from kline_cache import bar_to_ms, is_confirmed
+
+RESYNC_INTERVAL = 1000  # 每更新N次按窗口重新求和，消除浮点累积误差
+
+
+class RollingBollinger:
+    """
+    滚动布林带：
+    - update(ts, close) 追加一根已完结K线
+    - update_from_klines(klines) 传入OKX格式K线（最新在前），只取比已有数据新的已完结K线，不连续时用传入数据重新填充窗口
+    - bands() 返回 (上轨, 中轨, 下轨)，窗口未满返回None
+    """
+
+    def __init__(self, length=20, mult=2.0, bar=None):
+        self.length = int(length)
+        self.mult = float(mult)
+        self.bar_ms = bar_to_ms(bar) if bar else None
+        self.window = deque(maxlen=self.length)
+        self.last_ts = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._updates = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.window.clear()
+        self.last_ts = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def _resync(self):
+        self._sum = math.fsum(self.window)
+        self._sumsq = math.fsum(x * x for x in self.window)
+
+    def update(self, ts, close):
+        close = float(close)
+        with self._lock:
+            if len(self.window) == self.length:
+                old = self.window[0]
+                self._sum -= old
+                self._sumsq -= old * old
+            self.window.append(close)
+            self._sum += close
+            self._sumsq += close * close
+            self.last_ts = int(ts)
+            self._updates += 1
+            if self._updates % RESYNC_INTERVAL == 0:
+                self._resync()
+
+    def update_from_klines(self, klines):
+        """
+        Returns:
+            int: 本次追加的K线数量
+        """
+        confirmed = sorted((k for k in klines if is_confirmed(k)), key=lambda k: int(k[0]))
+        new_bars = [k for k in confirmed if int(k[0]) > self.last_ts]
+        if not new_bars:
+            return 0
+        if self.last_ts and self.bar_ms is not None and int(new_bars[0][0]) != self.last_ts + self.bar_ms:
+            # 中间缺K线，窗口作废，用传入的K线重新填充
+            self.reset()
+            new_bars = confirmed
+        for k in new_bars[-self.length:]:  # 只有最后length根会留在窗口中
+            self.update(k[0], k[4])
+        return len(new_bars)
+
+    def is_ready(self):
+        return len(self.window) == self.length
+
+    def bands(self):
+        with self._lock:
+            if len(self.window) < self.length:
+                return None
+            basis = self._sum / self.length
+            variance = max(self._sumsq / self.length - basis * basis, 0.0)
+        dev = math.sqrt(variance) * self.mult
+        return basis + dev, basis, basis - dev
+
+
+# 进程内按标的复用的布林带实例，多标的扫描时每个标的只需增量追加新K线
+_bands = {}
+_bands_lock = threading.Lock()
+
+def get_bollinger(inst_id, bar, price_type="last", length=20, mult=2.0):
+    key = (inst_id, bar, price_type, int(length), float(mult))
+    with _bands_lock:
+        if key not in _bands:
+            _bands[key] = RollingBollinger(length, mult, bar)
+        return _bands[key]
+
+def bollinger_series(closes, length=20, mult=2.0):
+    """
+    批量计算布林带序列（回测用）
+
+    Args:
+        closes: 按时间升序的收盘价数组
+
+    Returns:
+        (upper, basis, lower) 三个与closes等长的数组，前 length-1 个为NaN
+    """
+    closes = np.asarray(closes, dtype=float)
+    n = len(closes)
+    upper = np.full(n, np.nan)
+    basis = np.full(n, np.nan)
+    lower = np.full(n, np.nan)
+    if n < length:
+        return upper, basis, lower
+    # 先减去均值再累加，降低大数相减的精度损失
+    shifted = closes - closes.mean()
+    cs = np.concatenate([[0.0], np.cumsum(shifted)])
+    cs2 = np.concatenate([[0.0], np.cumsum(shifted * shifted)])
+    win_sum = cs[length:] - cs[:-length]
+    win_sumsq = cs2[length:] - cs2[:-length]
+    mean = win_sum / length
+    dev = np.sqrt(np.maximum(win_sumsq / length - mean * mean, 0.0)) * mult
+    basis[length - 1:] = mean + closes.mean()
+    upper[length - 1:] = basis[length - 1:] + dev
+    lower[length - 1:] = basis[length - 1:] - dev
+    return upper, basis, lower
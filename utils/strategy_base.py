@@ -0,0 +1,473 @@
+"""
+任务名称
+name: 策略框架基类
+定时规则
+cron: 1 1 1 1 *
+说明：各币种反转策略共用的执行流程：K线获取(共享缓存) -> 信号函数 -> 多账户并发撤单+批量下单 -> 通知/日志/延迟指标。
+新策略只需继承 Strategy 设置参数并实现 analyze()（或传入 signal_func），脚本保留 main() 供青龙定时任务和常驻调度器调用。
+"""
+import json
+import random
+import string
+import time
+from datetime import datetime, timezone, timedelta
+from notification_service import notification_service
+from kline_cache import get_cached_klines, bar_to_ms, is_confirmed
+from latency_metrics import span, record as record_latency
+from order_batch import OrderBatch, cancel_orders
+from order_state import get_order_state
+from trade_journal import get_journal
+from ws_market_data import get_live_price
+from account_fanout import fan_out_accounts
+from accounts import get_account, ENV_STYLE_SUFFIX
+from retry_policy import call_with_retry
+
+PRICE_TOLERANCE = 0.0001  # 价格比较容差（避免因微小价格波动导致的误判）
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+# ========== 通用行情/订单函数 ==========
+def _request_data(func, endpoint, tag, desc, account_prefix=""):
+    """请求成功(code为0)返回data，失败按 retry_policy 退避重试，最终失败返回None"""
+    result, error_msg = call_with_retry(func, endpoint, tag, account_prefix)
+    if result and result.get('code') == '0' and 'data' in result:
+        return result['data']
+    print(f"[{get_beijing_time()}] {account_prefix} [{tag}] {desc}失败: {error_msg}")
+    return None
+
+def get_current_price(market_api, inst_id, account_prefix=""):
+    # 常驻调度模式下优先使用WebSocket推送的最新价
+    live_price = get_live_price(inst_id)
+    if live_price is not None:
+        print(f"[{get_beijing_time()}] {account_prefix} [PRICE] {inst_id} 当前价格(推送): {live_price}")
+        return live_price
+    data = _request_data(lambda: market_api.get_ticker(instId=inst_id), "get_ticker", "PRICE", f"获取{inst_id}价格",
+                         account_prefix)
+    if not data:
+        return None
+    current_price = float(data[0]['last'])
+    print(f"[{get_beijing_time()}] {account_prefix} [PRICE] {inst_id} 当前价格: {current_price}")
+    return current_price
+
+def get_pending_orders(trade_api, inst_id, account_prefix=""):
+    orders = _request_data(lambda: trade_api.get_order_list(instId=inst_id, state="live"), "get_order_list", "ORDERS",
+                           f"获取{inst_id}未成交订单", account_prefix)
+    if orders is None:
+        return []
+    print(f"[{get_beijing_time()}] {account_prefix} [ORDERS] {inst_id} 获取到{len(orders)}个未成交订单")
+    return orders
+
+def order_take_profit(order):
+    """
+    开仓单的方向与止盈触发价
+
+    Returns:
+        tuple: ("long"/"short"/None, 止盈价格或None)；平仓单等方向不明确的订单方向为None
+    """
+    side = order.get('side')  # buy 或 sell
+    pos_side = order.get('posSide', '')  # long 或 short
+    if side == 'buy' and pos_side in ('long', ''):
+        direction = "long"
+    elif side == 'sell' and pos_side in ('short', ''):
+        direction = "short"
+    else:
+        direction = None
+    # 优先从 attachAlgoOrds 获取止盈价，兼容旧的 linkedAlgoOrd
+    attach_algo_ords = order.get('attachAlgoOrds', [])
+    linked_algo = order.get('linkedAlgoOrd', {})
+    if attach_algo_ords and isinstance(attach_algo_ords, list) and attach_algo_ords[0].get('tpTriggerPx'):
+        return direction, float(attach_algo_ords[0]['tpTriggerPx'])
+    if linked_algo and linked_algo.get('tpTriggerPx'):
+        return direction, float(linked_algo['tpTriggerPx'])
+    return direction, None
+
+def cancel_reason(direction, current_price, take_profit_price, price_tolerance=PRICE_TOLERANCE):
+    """当前价格已越过止盈价（行情已走完）时返回撤销原因，否则返回空字符串"""
+    if direction == "long" and current_price > take_profit_price * (1 + price_tolerance):
+        return f"做多订单，当前价格({current_price:.4f})已超过止盈价格({take_profit_price:.4f})"
+    if direction == "short" and current_price < take_profit_price * (1 - price_tolerance):
+        return f"做空订单，当前价格({current_price:.4f})已低于止盈价格({take_profit_price:.4f})"
+    return ""
+
+def should_cancel_order(order, current_price, account_prefix="", price_tolerance=PRICE_TOLERANCE):
+    """
+    判断未成交开仓单是否应该撤销：当前价格已越过该单的止盈价（行情已走完）
+
+    Returns:
+        tuple: (是否撤销, 原因, 止盈价格)
+    """
+    try:
+        ord_id = order['ordId']
+        direction, take_profit_price = order_take_profit(order)
+        if direction is None:
+            print(f"[{get_beijing_time()}] {account_prefix} [CHECK] 订单{ord_id} 方向不明确: side={order['side']}, posSide={order.get('posSide', '')}")
+            return False, "方向不明确", None
+        if take_profit_price is None:
+            print(f"[{get_beijing_time()}] {account_prefix} [CHECK] 订单{ord_id} 无止盈价格信息")
+            return False, "无止盈价格信息", None
+
+        reason = cancel_reason(direction, current_price, take_profit_price, price_tolerance)
+        if reason:
+            print(f"[{get_beijing_time()}] {account_prefix} [CHECK] 订单{ord_id} 需要撤销: {reason}")
+        else:
+            print(f"[{get_beijing_time()}] {account_prefix} [CHECK] 订单{ord_id} 无需撤销: 当前价格={current_price:.4f}, 止盈价格={take_profit_price:.4f}")
+        return bool(reason), reason, take_profit_price
+    except Exception as e:
+        print(f"[{get_beijing_time()}] {account_prefix} [CHECK] 判断订单{order.get('ordId', 'unknown')}时异常: {str(e)}")
+        return False, f"判断异常: {str(e)}", None
+
+def generate_clord_id(prefix):
+    """clOrdId 只能包含字母和数字，最长32位"""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    random_str = ''.join(random.choices(string.ascii_letters + string.digits, k=6))
+    return f"{prefix}{timestamp}{random_str}"[:32]
+
+def last_confirmed_kline(klines):
+    """K线按时间倒序，返回最新一根已完结的K线"""
+    for kline in klines or []:
+        if is_confirmed(kline):
+            return kline
+    return None
+
+
+class Strategy:
+    """
+    反转类策略基类：
+        class AdaStrategy(Strategy):
+            name = "ADA"
+            inst_id = "ADA-USDT-SWAP"
+            ...
+            def analyze(self, klines):
+                return signal, entry_price, info   # signal 为 LONG/SHORT/None，info 需包含分析K线的 ts
+
+            def calc_size(self, entry_price):
+                return qty
+
+        main = AdaStrategy().run
+
+    也可以不写子类，直接传入信号函数：Strategy(signal_func=my_signal)，签名同 analyze。
+    撤单、下单前检查、下单结果处理都可以按需覆盖 before_order / cancel_open_orders / build_orders / on_order_result。
+    """
+
+    # ---------- 交易标的 ----------
+    name = "STRATEGY"            # 日志标签
+    inst_id = None
+    bar = "5m"
+    limit = 2                    # 获取K线数量
+    price_type = "last"
+    kline_flag = None            # K线行情环境，默认使用第一个账户的flag
+
+    # ---------- 账户 ----------
+    account_suffixes = [""]
+    env_style = ENV_STYLE_SUFFIX  # 环境变量命名方式，见 accounts.py
+
+    # ---------- 下单 ----------
+    margin = 5                   # 保证金(USDT)
+    leverage = 10
+    take_profit_percent = None
+    stop_loss_percent = None
+    td_mode = "cross"
+    clord_prefix = "STG"         # clOrdId前缀（字母数字）
+    tp_sl_digits = 5             # 止盈止损价格保留小数位
+
+    # ---------- 通知/日志/指标 ----------
+    notify_group = "OKX自动交易通知"
+    amplitude_threshold = None   # 设置后，分析K线振幅超过该值时发送振幅预警
+    metrics_strategy = None      # 延迟指标中的策略标签，默认为 name
+    journal_strategy = None      # 设置后记录信号/撤单/下单事件到交易日志
+    error_tag = ""               # 下单失败通知中附带的来源标记
+
+    # ---------- 本地订单状态 ----------
+    order_state_strategy = None  # 设置后记录下单时间与未完结clOrdId
+    min_order_interval_minutes = 0
+    legacy_order_history_paths = []  # 旧版JSON下单记录，首次运行时导入
+
+    def __init__(self, signal_func=None, **overrides):
+        if signal_func is not None:
+            self.analyze = signal_func
+        for key, value in overrides.items():
+            if not hasattr(self, key):
+                raise AttributeError(f"{type(self).__name__} 没有参数 {key}")
+            setattr(self, key, value)
+        self.metrics_label = self.metrics_strategy or self.name
+        self.journal = get_journal(self.journal_strategy) if self.journal_strategy else None
+
+    # ========== 需要子类实现 ==========
+    def analyze(self, klines):
+        """klines 按时间倒序，返回 (signal, entry_price, info)"""
+        raise NotImplementedError
+
+    def calc_size(self, entry_price):
+        """根据入场价计算下单数量，返回0表示放弃交易"""
+        raise NotImplementedError
+
+    # ========== 信号 ==========
+    def fetch_klines(self):
+        if self.kline_flag is not None:
+            flag = self.kline_flag
+        else:
+            flag = get_account(self.account_suffixes[0], self.env_style).flag if self.account_suffixes else "0"
+        # 通过共享K线缓存获取，已完结K线只增量拉取
+        try:
+            with span("get_kline_data", strategy=self.metrics_label):
+                data = get_cached_klines(self.inst_id, self.bar, self.limit, price_type=self.price_type, flag=str(flag))
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [MARKET] 获取K线数据异常: {str(e)}")
+            return None
+        if not data:
+            print(f"[{get_beijing_time()}] [ERROR] 获取K线数据失败或数据不足")
+            return None
+        return data
+
+    def get_signal(self):
+        klines = self.fetch_klines()
+        if not klines:
+            return None, None, None
+        signal, entry_price, info = self.analyze(klines)
+        if info is None:
+            return None, None, None
+        if signal:
+            # 信号产生时刻，用于统计 K线收盘->信号、信号->提交 的耗时
+            info['signal_time'] = time.time()
+            if info.get('ts') is not None:
+                record_latency("bar_close_to_signal", info['signal_time'] - (int(info['ts']) + bar_to_ms(self.bar)) / 1000,
+                               strategy=self.metrics_label)
+        self.report_analysis(signal, entry_price, info)
+        return signal, entry_price, info
+
+    def report_analysis(self, signal, entry_price, info):
+        print(f"[{get_beijing_time()}] [KLINE] 分析结果:")
+        print(f"  标的: {self.inst_id} | K线规格: {self.bar}")
+        for key, label in (('open', '开盘价'), ('high', '最高价'), ('low', '最低价'), ('close', '收盘价')):
+            if key in info:
+                print(f"  {label}: {info[key]:.4f}")
+        if 'amplitude' in info:
+            print(f"  振幅: {info['amplitude']*100:.2f}%")
+        if 'is_green' in info:
+            print(f"  是否为阳线: {info['is_green']}")
+            print(f"  是否为阴线: {info['is_red']}")
+        print(f"  信号: {signal if signal else '无信号'}")
+        if 'direction' in info:
+            print(f"  方向: {info['direction'] if info['direction'] else 'N/A'}")
+        print(f"  入场价: {entry_price if entry_price else 'N/A'}")
+        if self.amplitude_threshold is not None and info.get('amplitude', 0) >= self.amplitude_threshold:
+            notification_service.send_amplitude_alert(
+                symbol=self.inst_id,
+                amplitude=info['amplitude']*100,
+                threshold=self.amplitude_threshold*100,
+                open_price=info['open'],
+                latest_price=info['close'],
+                bar_ts=info.get('ts')
+            )
+            print(f"[{get_beijing_time()}] [AMPLITUDE] 发送振幅预警通知")
+
+    # ========== 执行 ==========
+    def run(self):
+        print(f"[{get_beijing_time()}] [INFO] 开始{self.name}自动交易策略")
+        signal, entry_price, info = self.get_signal()
+        if self.journal and info is not None:
+            self.journal.write("signal", inst_id=self.inst_id, signal=signal or "NO_SIGNAL", bar_ts=info.get('ts'),
+                               entry_price=self.format_price(entry_price) if entry_price else None,
+                               sz=self.calc_size(entry_price) if entry_price else None, analysis=info)
+        if not signal:
+            print(f"[{get_beijing_time()}] [INFO] 未检测到交易信号")
+            return None
+        print(f"[{get_beijing_time()}] [INFO] 开始处理所有账户交易")
+        # 各账户并发撤单+下单，单个账户的重试不影响其他账户
+        report = fan_out_accounts(self.process_account, self.account_suffixes, signal, entry_price, info, label=self.name)
+        print(f"[{get_beijing_time()}] [INFO] 所有账户交易处理完成")
+        return report
+
+    def process_account(self, account_suffix, signal, entry_price, info, deadline=None):
+        start_time = time.time()
+        account = get_account(account_suffix or "", self.env_style)
+        if not account.configured:
+            print(f"[{get_beijing_time()}] {account.prefix} [ERROR] 账户信息不完整或未配置")
+            return None
+        try:
+            trade_api = account.trade_api()
+            market_api = account.market_api()
+            print(f"[{get_beijing_time()}] {account.prefix} API初始化成功 - {account.name}")
+        except Exception as e:
+            print(f"[{get_beijing_time()}] {account.prefix} [ERROR] API初始化失败: {str(e)}")
+            if self.journal:
+                self.journal.write("error", account=account.name, inst_id=self.inst_id, stage="init_api", msg=str(e))
+            return None
+
+        if not self.before_order(account, trade_api, market_api, signal, entry_price, info):
+            return None
+        print(f"[{get_beijing_time()}] {account.prefix} [ORDER] 检测到信号，先撤销现有开仓订单")
+        with span("cancel_pending", strategy=self.metrics_label, account=account.name):
+            self.cancel_open_orders(account, trade_api, deadline=deadline)
+
+        orders = self.build_orders(account, signal, entry_price, info)
+        if not orders:
+            return None
+        # 本账户本次信号的订单合并提交，结果按clOrdId取回
+        batch = OrderBatch(trade_api, account.prefix, account.name,
+                           on_reconciled=lambda outcome: self.on_reconciled(account, outcome))
+        for order_params in orders:
+            print(f"[{get_beijing_time()}] {account.prefix} [ORDER] 准备下单参数: {json.dumps(order_params, indent=2)}")
+            batch.add(order_params)
+        if info.get('signal_time'):
+            record_latency("signal_to_submit", time.time() - info['signal_time'], strategy=self.metrics_label, account=account.name)
+        with span("submit_to_ack", strategy=self.metrics_label, account=account.name):
+            results = batch.submit(deadline)
+        latency = time.time() - start_time
+        record_latency("account_trading", latency, strategy=self.metrics_label, account=account.name)
+        print(f"[{get_beijing_time()}] {account.prefix} [LATENCY] 撤单+下单耗时{latency:.3f}秒")
+        for order_params in orders:
+            self.on_order_result(account, signal, order_params, results[order_params['clOrdId']], info, latency)
+        return results
+
+    # ========== 可覆盖的步骤 ==========
+    def before_order(self, account, trade_api, market_api, signal, entry_price, info):
+        """撤单下单前的检查，返回False跳过该账户；默认检查最小下单间隔"""
+        if self.order_state_strategy and self.min_order_interval_minutes:
+            if not self.check_order_interval(account.name):
+                print(f"[{get_beijing_time()}] {account.prefix} 距离上次下单时间不足{self.min_order_interval_minutes}分钟，跳过")
+                return False
+        return True
+
+    def cancel_open_orders(self, account, trade_api, deadline=None):
+        """撤销所有未成交的开仓订单（只撤销开仓方向的订单，平仓单不处理）"""
+        pending_orders = get_pending_orders(trade_api, self.inst_id, account.prefix)
+        ord_ids = [order['ordId'] for order in pending_orders if order.get('posSide', '') in ['long', 'short', '']]
+        cancel_results = cancel_orders(trade_api, self.inst_id, ord_ids, account.prefix, deadline) if ord_ids else {}
+        if self.journal:
+            cl_ord_ids = {o['ordId']: o.get('clOrdId') for o in pending_orders}
+            for ord_id, (ok, msg) in cancel_results.items():
+                self.journal.write("cancel", account=account.name, inst_id=self.inst_id, ord_id=ord_id,
+                                   cl_ord_id=cl_ord_ids.get(ord_id), success=ok, msg=msg, reason="新信号撤销旧开仓单")
+        if self.order_state_strategy:
+            # 按撤单后仍挂着的订单校正本地的未完结clOrdId
+            live = [o.get('clOrdId') for o in pending_orders if not cancel_results.get(o['ordId'], (False,))[0]]
+            get_order_state().sync_open_orders(self.order_state_strategy, account.name, live)
+        return cancel_results
+
+    def format_price(self, entry_price):
+        """委托价格格式化（如截断小数位），默认不处理"""
+        return entry_price
+
+    def tp_sl_prices(self, signal, entry_price):
+        if signal == "LONG":
+            take_profit_price = entry_price * (1 + self.take_profit_percent)
+            stop_loss_price = entry_price * (1 - self.stop_loss_percent)
+        else:
+            take_profit_price = entry_price * (1 - self.take_profit_percent)
+            stop_loss_price = entry_price * (1 + self.stop_loss_percent)
+        return round(take_profit_price, self.tp_sl_digits), round(stop_loss_price, self.tp_sl_digits)
+
+    def limit_order(self, signal, px, size, take_profit_price, stop_loss_price):
+        """带止盈止损的限价开仓单"""
+        attach_algo_ord = {
+            "attachAlgoClOrdId": generate_clord_id(self.clord_prefix),
+            "tpTriggerPx": str(take_profit_price),
+            "tpOrdPx": "-1",
+            "tpOrdKind": "condition",
+            "slTriggerPx": str(stop_loss_price),
+            "slOrdPx": "-1",
+            "tpTriggerPxType": "last",
+            "slTriggerPxType": "last"
+        }
+        return {
+            "instId": self.inst_id,
+            "tdMode": self.td_mode,
+            "side": "buy" if signal == "LONG" else "sell",
+            "ordType": "limit",
+            "px": str(px),
+            "sz": str(size),
+            "clOrdId": generate_clord_id(self.clord_prefix),
+            "posSide": "long" if signal == "LONG" else "short",
+            "attachAlgoOrds": [attach_algo_ord]
+        }
+
+    def build_orders(self, account, signal, entry_price, info):
+        """返回本账户要提交的订单列表，默认一笔带止盈止损的限价单"""
+        qty = self.calc_size(entry_price)
+        if not qty or qty <= 0:
+            print(f"[{get_beijing_time()}] {account.prefix} [ERROR] 下单数量过小，放弃交易")
+            notification_service.send_bark_notification(
+                f"{account.prefix} 交易失败",
+                f"下单数量过小，放弃交易\n入场价格: {entry_price:.4f}\n保证金: {self.margin} USDT\n杠杆: {self.leverage}倍\n计算数量: {qty}",
+                group=self.notify_group
+            )
+            return []
+        print(f"[{get_beijing_time()}] {account.prefix} [SIZE_CALC] 下单数量: {qty}")
+        take_profit_price, stop_loss_price = self.tp_sl_prices(signal, entry_price)
+        return [self.limit_order(signal, self.format_price(entry_price), qty, take_profit_price, stop_loss_price)]
+
+    def on_order_result(self, account, signal, order_params, order_result, info, latency):
+        success = order_result.get('code') == '0'
+        error_msg = "" if success else (order_result.get('msg') or '下单失败，无响应')
+        if order_result.get('unknown'):
+            error_msg = f"结果未知，可能已下单，下次下单前按clOrdId核对: {error_msg}"
+        px = float(order_params['px'])
+        size = float(order_params['sz'])
+        if success and self.order_state_strategy:
+            # 只有下单成功才记录时间（与未完结clOrdId在同一事务中写入）
+            self.save_order_time(account.name, order_params['clOrdId'])
+        if self.journal:
+            result_data = (order_result.get('data') or [{}])[0]
+            self.journal.write(
+                "order", account=account.name, inst_id=self.inst_id, signal=signal,
+                side=order_params.get('side'), pos_side=order_params.get('posSide'), px=px, sz=size,
+                cl_ord_id=order_params['clOrdId'], ord_id=result_data.get('ordId') or None, success=success,
+                code=order_result.get('code'), msg=order_result.get('msg'), latency_ms=round(latency * 1000),
+                order_params=order_params, order_result=order_result, analysis=info,
+                margin=self.margin, leverage=self.leverage
+            )
+        algo = (order_params.get('attachAlgoOrds') or [{}])[0]
+        notification_service.send_trading_notification(
+            account_name=account.name,
+            inst_id=self.inst_id,
+            signal_type=signal,
+            entry_price=px,
+            size=size,
+            margin=self.margin,
+            take_profit_price=float(algo.get('tpTriggerPx', 0)),
+            stop_loss_price=float(algo.get('slTriggerPx', 0)),
+            success=success,
+            error_msg=f"{self.error_tag} {error_msg}" if self.error_tag and error_msg else error_msg,
+            order_params=order_params,
+            order_result=order_result
+        )
+        print(f"[{get_beijing_time()}] {account.prefix} [SIGNAL] {signal}@{px:.4f}")
+        print(f"[{get_beijing_time()}] {account.prefix} [ORDER] {json.dumps(order_params)}")
+        print(f"[{get_beijing_time()}] {account.prefix} [RESULT] {json.dumps(order_result)}")
+
+    def on_reconciled(self, account, outcome):
+        """此前结果未知的订单核对出结果（已受理/未受理），通知已由 order_batch 发送"""
+        if self.journal:
+            self.journal.write("reconcile", account=account.name, inst_id=outcome['inst_id'],
+                               cl_ord_id=outcome['cl_ord_id'], ord_id=outcome['ord_id'], success=outcome['accepted'],
+                               msg=outcome['msg'], state=outcome['state'])
+
+    # ========== 下单间隔 ==========
+    def get_last_order_time(self, account_name):
+        store = get_order_state()
+        last_time = store.get_last_order_time(self.order_state_strategy, account_name)
+        if last_time == 0:
+            # 兼容旧版JSON下单记录，导入后不再读取
+            for log_path in self.legacy_order_history_paths:
+                if store.import_order_history(self.order_state_strategy, log_path):
+                    return store.get_last_order_time(self.order_state_strategy, account_name)
+        return last_time
+
+    def save_order_time(self, account_name, cl_ord_id=None):
+        try:
+            get_order_state().record_order(self.order_state_strategy, account_name, cl_ord_id, self.inst_id)
+            print(f"[{get_beijing_time()}] [LOG] 成功保存下单时间: {account_name}")
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [ERROR] 保存下单时间失败: {e}")
+
+    def check_order_interval(self, account_name):
+        last_time = self.get_last_order_time(account_name)
+        if last_time == 0:
+            print(f"[{get_beijing_time()}] [INFO] 账户 {account_name} 首次下单，无时间间隔限制")
+            return True
+        interval_minutes = (int(time.time()) - last_time) / 60
+        print(f"[{get_beijing_time()}] [INFO] 账户 {account_name} 距离上次下单: {interval_minutes:.1f}分钟")
+        return interval_minutes >= self.min_order_interval_minutes
@@ -0,0 +1,182 @@
+"""
+任务名称
+name: 交易日志(JSON Lines)
+定时规则
+cron: 1 1 1 1 *
+说明：每个事件一行紧凑JSON，按 策略_日期.jsonl 追加写入 logs/journal/；
+事件类型与字段见 EVENT_FIELDS，compact_journal 把已结束日期的文件转换为 Parquet（需要 pyarrow）。
+"""
+import os
+import json
+import time
+import glob
+import threading
+from datetime import datetime, timezone, timedelta
+
+# ========== 配置 ==========
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+JOURNAL_DIR = os.getenv("OKX_JOURNAL_DIR", os.path.join(ROOT_DIR, "logs", "journal"))
+PARQUET_DIR = os.path.join(JOURNAL_DIR, "parquet")
+
+# 所有事件共有的字段
+COMMON_FIELDS = {
+    "ts": "int",          # 毫秒时间戳
+    "time": "str",        # 北京时间
+    "event": "str",
+    "strategy": "str",
+    "account": "str",
+    "inst_id": "str",
+}
+# 事件类型 -> 专有字段；json 类型的字段在列式文件中保存为JSON字符串
+EVENT_FIELDS = {
+    "signal": {"signal": "str", "bar_ts": "int", "entry_price": "float", "sz": "float", "analysis": "json"},
+    "order": {"signal": "str", "side": "str", "pos_side": "str", "px": "float", "sz": "float",
+              "cl_ord_id": "str", "ord_id": "str", "success": "bool", "code": "str", "msg": "str",
+              "latency_ms": "int", "order_params": "json", "order_result": "json", "analysis": "json"},
+    "fill": {"cl_ord_id": "str", "ord_id": "str", "side": "str", "fill_px": "float", "fill_sz": "float",
+             "fee": "float", "pnl": "float"},
+    "cancel": {"ord_id": "str", "cl_ord_id": "str", "success": "bool", "msg": "str", "reason": "str"},
+    "reconcile": {"cl_ord_id": "str", "ord_id": "str", "success": "bool", "msg": "str"},
+    "error": {"stage": "str", "msg": "str"},
+}
+# 未在schema中的字段统一放入 extra
+SCHEMA = dict(COMMON_FIELDS, **{k: v for fields in EVENT_FIELDS.values() for k, v in fields.items()}, extra="json")
+
+def get_beijing_time():
+    beijing_tz = timezone(timedelta(hours=8))
+    return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+def _beijing_date():
+    return datetime.now(timezone(timedelta(hours=8))).strftime("%Y-%m-%d")
+
+
+class TradeJournal:
+    """
+    追加写入的交易日志：
+        journal = TradeJournal("vine_5m_reversal")
+        journal.write("order", account="账户1", inst_id="VINE-USDT-SWAP", cl_ord_id=..., success=True)
+    """
+
+    def __init__(self, strategy, journal_dir=JOURNAL_DIR):
+        self.strategy = strategy
+        self.journal_dir = journal_dir
+        self._lock = threading.Lock()
+
+    def path_for(self, date=None):
+        return os.path.join(self.journal_dir, f"{self.strategy}_{date or _beijing_date()}.jsonl")
+
+    def write(self, event, account="", inst_id="", **fields):
+        if event not in EVENT_FIELDS:
+            raise ValueError(f"未知事件类型: {event}")
+        record = {"ts": int(time.time() * 1000), "time": get_beijing_time(), "event": event,
+                  "strategy": self.strategy, "account": account, "inst_id": inst_id}
+        extra = {}
+        for k, v in fields.items():
+            if v is None:
+                continue
+            if k in EVENT_FIELDS[event]:
+                record[k] = v
+            else:
+                extra[k] = v
+        if extra:
+            record["extra"] = extra
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        try:
+            with self._lock:
+                os.makedirs(self.journal_dir, exist_ok=True)
+                # 单次write追加一整行，多进程同时追加也不会交错
+                with open(self.path_for(), "a", encoding="utf-8") as f:
+                    f.write(line)
+        except Exception as e:
+            print(f"[{get_beijing_time()}] [JOURNAL] 写入交易日志失败: {e}")
+        return record
+
+
+# 进程内按策略复用
+_journals = {}
+
+def get_journal(strategy):
+    if strategy not in _journals:
+        _journals[strategy] = TradeJournal(strategy)
+    return _journals[strategy]
+
+# ========== 列式压缩 ==========
+def read_jsonl(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                print(f"[{get_beijing_time()}] [JOURNAL] 跳过无法解析的行 {path}:{line_no}")
+    return records
+
+def _arrow_schema(pa):
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "bool": pa.bool_(), "json": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in SCHEMA.items()])
+
+def _column(records, name, kind):
+    values = []
+    for r in records:
+        v = r.get(name)
+        if v is None or v == "":
+            values.append(None)
+        elif kind == "json":
+            values.append(json.dumps(v, ensure_ascii=False, default=str))
+        elif kind == "float":
+            values.append(float(v))
+        elif kind == "int":
+            values.append(int(v))
+        elif kind == "bool":
+            values.append(bool(v))
+        else:
+            values.append(str(v))
+    return values
+
+def records_to_table(records):
+    import pyarrow as pa
+    schema = _arrow_schema(pa)
+    return pa.table({name: _column(records, name, kind) for name, kind in SCHEMA.items()}, schema=schema)
+
+def compact_journal(journal_dir=JOURNAL_DIR, parquet_dir=PARQUET_DIR, keep_jsonl=False):
+    """
+    把今天之前的 .jsonl 文件转换为 Parquet（每个文件一个，按列压缩），今天的文件仍在追加，不处理
+
+    Returns:
+        list: 生成的Parquet文件路径
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print(f"[{get_beijing_time()}] [JOURNAL] 未安装pyarrow，无法转换Parquet: pip install pyarrow")
+        return []
+    today = _beijing_date()
+    outputs = []
+    for path in sorted(glob.glob(os.path.join(journal_dir, "*.jsonl"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name.endswith(today):
+            continue
+        records = read_jsonl(path)
+        os.makedirs(parquet_dir, exist_ok=True)
+        out_path = os.path.join(parquet_dir, f"{name}.parquet")
+        tmp_path = f"{out_path}.tmp"
+        pq.write_table(records_to_table(records), tmp_path, compression="zstd")
+        os.replace(tmp_path, out_path)
+        if not keep_jsonl:
+            os.remove(path)
+        print(f"[{get_beijing_time()}] [JOURNAL] {os.path.basename(path)} -> {out_path} ({len(records)}条)")
+        outputs.append(out_path)
+    return outputs
+
+def load_journal(strategy=None, parquet_dir=PARQUET_DIR, columns=None):
+    """读取已压缩的Parquet日志（可按策略筛选、只读部分列），返回 pyarrow.Table"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pattern = f"{strategy}_*.parquet" if strategy else "*.parquet"
+    paths = sorted(glob.glob(os.path.join(parquet_dir, pattern)))
+    if not paths:
+        return _arrow_schema(pa).empty_table()
+    return pa.concat_tables([pq.read_table(p, columns=columns) for p in paths])
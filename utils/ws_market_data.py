@@ -0,0 +1,264 @@
+"""
+任务名称
+name: OKX WebSocket 行情订阅
+定时规则
+cron: 1 1 1 1 *
+说明：订阅K线(candle/mark-price-candle)与tickers频道，在内存中维护每个标的最新的
+已完结K线与最新成交价，K线完结时推送收盘事件，替代策略中的REST轮询。
+"""
+import json
+import time
+import asyncio
+import inspect
+import threading
+import websockets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from kline_cache import get_kline_cache, is_confirmed
+
+# ========== 配置 ==========
+# 实盘/模拟盘地址；K线类频道在business地址，tickers在public地址，订单等私有频道在private地址
+WS_URLS = {
+    "0": {
+        "public": "wss://ws.okx.com:8443/ws/v5/public",
+        "business": "wss://ws.okx.com:8443/ws/v5/business",
+        "private": "wss://ws.okx.com:8443/ws/v5/private",
+    },
+    "1": {
+        "public": "wss://wspap.okx.com:8443/ws/v5/public",
+        "business": "wss://wspap.okx.com:8443/ws/v5/business",
+        "private": "wss://wspap.okx.com:8443/ws/v5/private",
+    },
+}
+PING_INTERVAL = 20          # 心跳间隔(秒)，OKX 30秒无数据会断开连接
+RECONNECT_DELAY = 1         # 首次重连等待(秒)，之后指数退避
+MAX_RECONNECT_DELAY = 30    # 最大重连等待(秒)
+
+# 价格类型 -> K线频道前缀
+CANDLE_CHANNEL_PREFIX = {
+    "last": "candle",
+    "mark": "mark-price-candle",
+    "index": "index-candle",
+}
+
+def get_shanghai_time(fmt="%Y-%m-%d %H:%M:%S"):
+    tz = timezone(timedelta(hours=8))
+    return datetime.now(tz).strftime(fmt)
+
+def parse_candle_channel(channel):
+    """频道名解析为 (价格类型, K线周期)，如 mark-price-candle5m -> ("mark", "5m")"""
+    # 长前缀优先，避免 mark-price-candle 被 candle 误匹配
+    for price_type, prefix in sorted(CANDLE_CHANNEL_PREFIX.items(), key=lambda x: -len(x[1])):
+        if channel.startswith(prefix):
+            return price_type, channel[len(prefix):]
+    return None, None
+
+
+class MarketDataFeed:
+    """
+    WebSocket 行情推送：
+    - subscribe_candles / subscribe_ticker 注册订阅，run() 建立连接并在断线后自动重连重订阅
+    - 每个 (instId, bar, 价格类型) 只在收到新的已完结K线时触发一次 on_bar_close 回调
+    - 推送的K线写入 KlineCache（单独线程按顺序落盘，不阻塞事件循环），REST方式调用 get_cached_klines 的脚本也能直接命中缓存
+    """
+
+    def __init__(self, flag="0", public_url=None, business_url=None, kline_cache=None):
+        self.flag = str(flag)
+        urls = WS_URLS.get(self.flag, WS_URLS["0"])
+        # 地址可注入，便于连接本地模拟服务器
+        self.urls = {
+            "public": public_url or urls["public"],
+            "business": business_url or urls["business"],
+        }
+        self.kline_cache = kline_cache if kline_cache is not None else get_kline_cache(self.flag)
+        self._subscriptions = {"public": [], "business": []}
+        self._bar_close_callbacks = []
+        self._ticker_callbacks = []
+        self._latest_bars = {}       # (instId, bar, price_type) -> 最新已完结K线
+        self._live_bars = {}         # (instId, bar, price_type) -> 当前未完结K线
+        self._tickers = {}           # instId -> (ticker, 接收时间)
+        self._lock = threading.Lock()
+        self._cache_writer = ThreadPoolExecutor(max_workers=1)  # 单线程保证同一标的的K线按推送顺序写入
+        self._stopped = False
+        self._connected = {"public": False, "business": False}
+
+    # ---------- 订阅 ----------
+    def subscribe_candles(self, inst_id, bar, price_type="last"):
+        if price_type not in CANDLE_CHANNEL_PREFIX:
+            raise ValueError(f"不支持的价格类型: {price_type}")
+        arg = {"channel": f"{CANDLE_CHANNEL_PREFIX[price_type]}{bar}", "instId": inst_id}
+        if arg not in self._subscriptions["business"]:
+            self._subscriptions["business"].append(arg)
+
+    def subscribe_ticker(self, inst_id):
+        arg = {"channel": "tickers", "instId": inst_id}
+        if arg not in self._subscriptions["public"]:
+            self._subscriptions["public"].append(arg)
+
+    def on_bar_close(self, callback):
+        """注册K线完结回调 callback(inst_id, bar, price_type, kline)，支持普通函数与协程函数"""
+        self._bar_close_callbacks.append(callback)
+
+    def on_ticker(self, callback):
+        """注册ticker回调 callback(inst_id, ticker)"""
+        self._ticker_callbacks.append(callback)
+
+    # ---------- 查询 ----------
+    def get_latest_bar(self, inst_id, bar, price_type="last"):
+        """最新已完结K线（OKX格式），未收到推送返回None"""
+        with self._lock:
+            return self._latest_bars.get((inst_id, bar, price_type))
+
+    def get_live_bar(self, inst_id, bar, price_type="last"):
+        with self._lock:
+            return self._live_bars.get((inst_id, bar, price_type))
+
+    def get_last_price(self, inst_id, max_age=5):
+        """最新成交价；连接断开或超过max_age秒未更新时返回None，由调用方回退到REST"""
+        if not self._connected["public"]:
+            return None
+        with self._lock:
+            item = self._tickers.get(inst_id)
+        if item is None or time.time() - item[1] > max_age:
+            return None
+        try:
+            return float(item[0]["last"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    # ---------- 消息处理 ----------
+    async def _dispatch(self, callbacks, *args):
+        for callback in callbacks:
+            try:
+                if inspect.iscoroutinefunction(callback):
+                    await callback(*args)
+                else:
+                    callback(*args)
+            except Exception as e:
+                print(f"[{get_shanghai_time()}] [WS] [ERROR] 回调执行异常: {e}")
+
+    async def handle_message(self, message):
+        """处理一条推送消息（可直接喂入模拟数据）"""
+        if message == "pong":
+            return
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            print(f"[{get_shanghai_time()}] [WS] 无法解析的消息: {message}")
+            return
+
+        event = msg.get("event")
+        if event == "error":
+            print(f"[{get_shanghai_time()}] [WS] [ERROR] 订阅错误: {msg.get('code')} {msg.get('msg')}")
+            return
+        if event:
+            if event == "subscribe":
+                print(f"[{get_shanghai_time()}] [WS] 订阅成功: {msg.get('arg')}")
+            return
+
+        arg = msg.get("arg", {})
+        channel = arg.get("channel", "")
+        inst_id = arg.get("instId")
+        data = msg.get("data") or []
+        if channel == "tickers":
+            for ticker in data:
+                with self._lock:
+                    self._tickers[ticker.get("instId", inst_id)] = (ticker, time.time())
+                await self._dispatch(self._ticker_callbacks, ticker.get("instId", inst_id), ticker)
+            return
+
+        price_type, bar = parse_candle_channel(channel)
+        if price_type is None or not data:
+            return
+        key = (inst_id, bar, price_type)
+        closed = []
+        with self._lock:
+            for kline in data:
+                if is_confirmed(kline):
+                    latest = self._latest_bars.get(key)
+                    # 同一根K线完结后可能重复推送，只触发一次
+                    if latest is None or int(kline[0]) > int(latest[0]):
+                        self._latest_bars[key] = kline
+                        closed.append(kline)
+                else:
+                    self._live_bars[key] = kline
+        # 写缓存需要文件锁与磁盘IO，放到写线程执行，期间其他频道的推送照常处理
+        await asyncio.get_running_loop().run_in_executor(self._cache_writer, self._persist, inst_id, bar, data, price_type)
+        for kline in closed:
+            print(f"[{get_shanghai_time()}] [WS] {inst_id} {bar} {price_type} K线完结: ts={kline[0]} close={kline[4]}")
+            await self._dispatch(self._bar_close_callbacks, inst_id, bar, price_type, kline)
+
+    def _persist(self, inst_id, bar, data, price_type):
+        try:
+            self.kline_cache.push_klines(inst_id, bar, data, price_type)
+        except Exception as e:
+            print(f"[{get_shanghai_time()}] [WS] 写入K线缓存失败: {e}")
+
+    # ---------- 连接 ----------
+    async def _keepalive(self, ws):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await ws.send("ping")
+
+    async def _on_open(self, name, ws, args):
+        """连接建立后发送订阅，子类可覆盖（如私有频道先登录）"""
+        await ws.send(json.dumps({"op": "subscribe", "args": args}))
+
+    async def _run_endpoint(self, name):
+        delay = RECONNECT_DELAY
+        while not self._stopped:
+            args = list(self._subscriptions[name])
+            try:
+                async with websockets.connect(self.urls[name], ping_interval=None) as ws:
+                    await self._on_open(name, ws, args)
+                    self._connected[name] = True
+                    delay = RECONNECT_DELAY
+                    print(f"[{get_shanghai_time()}] [WS] 已连接 {self.urls[name]}，订阅{len(args)}个频道")
+                    keepalive = asyncio.ensure_future(self._keepalive(ws))
+                    try:
+                        async for message in ws:
+                            await self.handle_message(message)
+                            if self._stopped:
+                                break
+                    finally:
+                        keepalive.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[{get_shanghai_time()}] [WS] [ERROR] 连接 {self.urls[name]} 异常: {e}")
+            finally:
+                self._connected[name] = False
+            if self._stopped:
+                break
+            print(f"[{get_shanghai_time()}] [WS] {delay}秒后重连 {self.urls[name]}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def run(self):
+        """连接所有有订阅的地址，直到 stop() 被调用"""
+        self._stopped = False
+        tasks = [self._run_endpoint(name) for name, args in self._subscriptions.items() if args]
+        if not tasks:
+            print(f"[{get_shanghai_time()}] [WS] 没有任何订阅，退出")
+            return
+        await asyncio.gather(*tasks)
+
+    def stop(self):
+        self._stopped = True
+
+
+# 进程内共享的行情推送实例（由常驻调度器注册），策略可通过 get_live_price 读取推送价格
+_active_feed = None
+
+def set_active_feed(feed):
+    global _active_feed
+    _active_feed = feed
+
+def get_active_feed():
+    return _active_feed
+
+def get_live_price(inst_id, max_age=5):
+    """便捷函数：从进程内行情推送读取最新成交价，无推送或数据过期时返回None"""
+    if _active_feed is None:
+        return None
+    return _active_feed.get_last_price(inst_id, max_age)
@@ -0,0 +1,99 @@
+"""
+任务名称
+name: OKX WebSocket 订单推送
+定时规则
+cron: 1 1 1 1 *
+说明：登录私有频道并订阅 orders，订单每次状态变化（新挂单、成交、撤销）实时推送，
+替代定时 get_order_list 轮询。每次(重)连接并订阅成功后触发 on_connected 回调，调用方在其中用REST拉取一次快照补齐。
+"""
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+from ws_market_data import MarketDataFeed, get_shanghai_time
+
+LOGIN_TIMEOUT = 10  # 等待登录/订阅结果的最长时间(秒)
+
+
+def login_params(api_key, secret_key, passphrase, timestamp=None):
+    """私有频道登录参数：sign = Base64(HmacSHA256(timestamp + 'GET' + '/users/self/verify'))"""
+    timestamp = str(int(timestamp if timestamp is not None else time.time()))
+    mac = hmac.new(str(secret_key).encode("utf-8"), f"{timestamp}GET/users/self/verify".encode("utf-8"), hashlib.sha256)
+    return {"apiKey": api_key, "passphrase": passphrase, "timestamp": timestamp,
+            "sign": base64.b64encode(mac.digest()).decode("utf-8")}
+
+
+class OrderFeed(MarketDataFeed):
+    """
+    单个账户的订单推送：
+        feed = OrderFeed(account)
+        feed.subscribe_orders("VINE-USDT-SWAP")
+        feed.on_order(callback)          # callback(account, order)，order 与 REST 订单字段一致
+        feed.on_connected(callback)      # callback(account)，每次连接订阅成功后触发
+        await feed.run()
+    """
+
+    def __init__(self, account, private_url=None):
+        super().__init__(account.flag)
+        self.account = account
+        if private_url:
+            self.urls["private"] = private_url
+        self._subscriptions["private"] = []
+        self._connected["private"] = False
+        self._order_callbacks = []
+        self._connected_callbacks = []
+
+    def subscribe_orders(self, inst_id=None, inst_type="SWAP"):
+        arg = {"channel": "orders", "instType": inst_type}
+        if inst_id:
+            arg["instId"] = inst_id
+        if arg not in self._subscriptions["private"]:
+            self._subscriptions["private"].append(arg)
+
+    def on_order(self, callback):
+        self._order_callbacks.append(callback)
+
+    def on_connected(self, callback):
+        self._connected_callbacks.append(callback)
+
+    async def _recv_event(self, ws, event):
+        """等待指定事件的回复，期间收到的其他消息照常处理"""
+        deadline = time.time() + LOGIN_TIMEOUT
+        while True:
+            message = await asyncio.wait_for(ws.recv(), max(0.1, deadline - time.time()))
+            msg = json.loads(message) if message != "pong" else {}
+            if msg.get("event") == "error":
+                raise ConnectionError(f"{msg.get('code')} {msg.get('msg')}")
+            if msg.get("event") == event:
+                return msg
+            await self.handle_message(message)
+
+    async def _on_open(self, name, ws, args):
+        if name != "private":
+            return await super()._on_open(name, ws, args)
+        account = self.account
+        await ws.send(json.dumps({"op": "login", "args": [
+            login_params(account.api_key, account.secret_key, account.passphrase)]}))
+        await self._recv_event(ws, "login")
+        print(f"[{get_shanghai_time()}] [WS] {account.prefix} 私有频道登录成功")
+        await ws.send(json.dumps({"op": "subscribe", "args": args}))
+        for _ in args:
+            await self._recv_event(ws, "subscribe")
+        # 订阅生效后再拉快照（后台执行，不阻塞推送处理），快照与推送按 uTime 取较新者，不会漏掉状态变化
+        asyncio.ensure_future(self._dispatch(self._connected_callbacks, account))
+
+    async def handle_message(self, message):
+        if message == "pong":
+            return
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            print(f"[{get_shanghai_time()}] [WS] 无法解析的消息: {message}")
+            return
+        if msg.get("arg", {}).get("channel") == "orders" and not msg.get("event"):
+            for order in msg.get("data") or []:
+                await self._dispatch(self._order_callbacks, self.account, order)
+            return
+        await super().handle_message(message)
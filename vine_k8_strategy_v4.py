@@ -13,7 +13,6 @@ import time
 import json
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-import pandas as pd
 
 # 添加utils目录到路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
@@ -21,26 +20,24 @@ from okx_utils import (
     get_shanghai_time, get_orders_pending, cancel_pending_open_orders,
     build_order_params, send_bark_notification
 )
+from kline_cache import get_cached_klines
+from okx_clients import get_trade_api
+from ema_state import get_ema_state
 
 # 导入okx库
-import okx.Trade as Trade
-import okx.MarketData as MarketData
 
 def get_kline_data(inst_id: str, bar: str, limit: int, flag: str) -> List:
-    """直接从OKX API获取K线数据 (V4修正：使用get_candlesticks)"""
-    print(f"[DEBUG] 直接从OKX拉取K线: inst_id={inst_id}, bar={bar}, limit={limit}")
+    """通过K线缓存获取K线数据 (get_candlesticks格式，含状态位，已完结K线只增量拉取)"""
+    print(f"[DEBUG] 获取K线: inst_id={inst_id}, bar={bar}, limit={limit}")
     try:
-        marketDataAPI = MarketData.MarketAPI(flag=flag)
-        # V4修正：调用正确的API接口以获取包含状态位的K线数据
-        result = marketDataAPI.get_candlesticks(instId=inst_id, bar=bar, limit=str(limit))
-        if result and result.get('code') == '0' and result.get('data'):
-            print(f"[DEBUG] 成功从OKX拉取到 {len(result['data'])} 条K线")
-            return result['data']
-        else:
-            print(f"[ERROR] 从OKX拉取K线失败: {result}")
-            return []
+        data = get_cached_klines(inst_id, bar, limit, flag=flag)
+        if data:
+            print(f"[DEBUG] 成功获取到 {len(data)} 条K线")
+            return data
+        print(f"[ERROR] 获取K线失败")
+        return []
     except Exception as e:
-        print(f"[ERROR] 拉取K线时发生异常: {e}")
+        print(f"[ERROR] 获取K线时发生异常: {e}")
         return []
 
 class VINEK8StrategyV4:
@@ -91,7 +88,7 @@ class VINEK8StrategyV4:
     
     def init_trade_api(self, api_key, secret_key, passphrase, flag="0"):
         """初始化交易API"""
-        return Trade.TradeAPI(str(api_key), str(secret_key), str(passphrase), False, str(flag))
+        return get_trade_api(api_key, secret_key, passphrase, flag)
     
     def log(self, message: str, account_name: str = ""):
         """日志记录"""
@@ -152,19 +149,19 @@ class VINEK8StrategyV4:
             'same_direction': same_direction
         }
     
-    def check_trend_with_pandas(self, kline_data: List) -> Tuple[bool, bool, Optional[Dict]]:
-        """使用Pandas检查趋势"""
-        if len(kline_data) < self.ema_long:
-            self.log(f"[DEBUG] K线数量 {len(kline_data)} 不足以计算最长EMA周期 {self.ema_long}")
+    def check_trend_with_ema(self, kline_data: List) -> Tuple[bool, bool, Optional[Dict]]:
+        """使用增量EMA状态检查趋势：已完结K线O(1)推进，当前未完结K线按最新价临时计入"""
+        ema_state = get_ema_state(self.inst_id, self.bar, (self.ema_short, self.ema_mid, self.ema_long))
+        ema_state.update(kline_data)
+        if not ema_state.is_ready():
+            self.log(f"[DEBUG] 已完结K线数量 {ema_state.state['count']} 不足以计算最长EMA周期 {self.ema_long}")
             return False, False, None
 
-        df = pd.DataFrame(kline_data, columns=['ts', 'open', 'high', 'low', 'close', 'vol', 'volCcy', 'volCcyQuote', 'confirm'])
-        df['close'] = df['close'].astype(float)
-        df = df.iloc[::-1].reset_index(drop=True)
-
-        ema_short_val = df['close'].ewm(span=self.ema_short, adjust=False).mean().iloc[-1]
-        ema_mid_val = df['close'].ewm(span=self.ema_mid, adjust=False).mean().iloc[-1]
-        ema_long_val = df['close'].ewm(span=self.ema_long, adjust=False).mean().iloc[-1]
+        live_price = float(kline_data[0][4]) if kline_data and kline_data[0][8] != '1' else None
+        ema = ema_state.values(live_price)
+        ema_short_val = ema[self.ema_short]
+        ema_mid_val = ema[self.ema_mid]
+        ema_long_val = ema[self.ema_long]
 
         bullish_trend = ema_short_val > ema_mid_val and ema_mid_val > ema_long_val
         bearish_trend = ema_short_val < ema_mid_val and ema_mid_val < ema_long_val
@@ -291,7 +288,7 @@ class VINEK8StrategyV4:
             self.log("K线分析失败，终止策略")
             return
         
-        bullish_trend, bearish_trend, ema_values = self.check_trend_with_pandas(kline_data)
+        bullish_trend, bearish_trend, ema_values = self.check_trend_with_ema(kline_data)
         if ema_values:
             trend_str = "多头趋势" if bullish_trend else "空头趋势" if bearish_trend else "震荡/无明显趋势"
             self.log(f"[DEBUG] EMA({self.ema_short})={ema_values[f'ema{self.ema_short}']:.5f}, EMA({self.ema_mid})={ema_values[f'ema{self.ema_mid}']:.5f}, EMA({self.ema_long})={ema_values[f'ema{self.ema_long}']:.5f}, 趋势判断: {trend_str}")
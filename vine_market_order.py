@@ -2,12 +2,15 @@
 name: OKX VINE 市价下单脚本
 """
 import os
+import sys
 import json
 import random
 import string
-import time
 from datetime import datetime, timezone, timedelta
-import okx.Trade as Trade
+# 添加utils目录
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+from okx_clients import get_trade_api
+from order_batch import place_orders
 
 # ============== 可配置参数区域 ==============
 INST_ID = "VINE-USDT-SWAP"  # 交易标的
@@ -15,9 +18,6 @@ ORDER_SIZE = 200  # 下单张数
 ORDER_SIDE = "sell"  # "buy" 做多，"sell" 做空
 ACCOUNT_SUFFIXES = ["1", "2"]  # 多账号支持
 
-MAX_RETRIES = 1
-RETRY_DELAY = 1
-
 def get_beijing_time():
     beijing_tz = timezone(timedelta(hours=8))
     return datetime.now(beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
@@ -49,7 +49,7 @@ def market_order(account_suffix, order_size, order_side):
     passphrase = str(passphrase)
     flag = str(flag)
     try:
-        trade_api = Trade.TradeAPI(api_key, secret_key, passphrase, False, flag)
+        trade_api = get_trade_api(api_key, secret_key, passphrase, flag)
         print(f"[{get_beijing_time()}] {account_prefix} API初始化成功 - {account_name}")
     except Exception as e:
         print(f"[{get_beijing_time()}] {account_prefix} [ERROR] API初始化失败: {str(e)}")
@@ -66,29 +66,12 @@ def market_order(account_suffix, order_size, order_side):
         "posSide": "long" if order_side == "buy" else "short"
     }
     print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 市价下单参数: {json.dumps(order_params, indent=2)}")
-    order_result = None
-    success = False
-    error_msg = ""
-    for attempt in range(MAX_RETRIES + 1):
-        try:
-            order_result = trade_api.place_order(**order_params)
-            print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 订单提交结果: {json.dumps(order_result)}")
-            if order_result and 'code' in order_result and order_result['code'] == '0':
-                success = True
-                error_msg = ""
-            else:
-                success = False
-                error_msg = order_result.get('msg', '') if order_result else '下单失败，无响应'
-            break
-        except Exception as e:
-            print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 下单异常 (尝试 {attempt+1}/{MAX_RETRIES+1}): {str(e)}")
-            success = False
-            error_msg = str(e)
-            if attempt < MAX_RETRIES:
-                print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 重试中... ({attempt+1}/{MAX_RETRIES})")
-                time.sleep(RETRY_DELAY)
-            else:
-                print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 所有尝试失败")
+    # 超时后先按clOrdId查询核对，确认交易所没有该订单才用同一clOrdId重新提交，不会重复开仓
+    order_result = place_orders(trade_api, [order_params], account_prefix, account=account_name)[cl_ord_id]
+    success = order_result.get('code') == '0'
+    error_msg = "" if success else (order_result.get('msg', '') or '下单失败，无响应')
+    if not success:
+        print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 市价下单失败: {error_msg}")
     print(f"[{get_beijing_time()}] {account_prefix} [ORDER] 市价下单完成")
 
 if __name__ == "__main__":